@@ -0,0 +1,145 @@
+"""
+Project and permission resolution for a (user, namespace) pair.
+
+The project, its organization, repository and counters, and the caller's
+role (read from the materialized effective permissions) come back from a
+single query, and the result is kept in the cache for a few seconds. Cache
+keys carry two version counters, one per namespace and one per user, which
+the signal handlers bump whenever a project or a permission record changes.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from gitsap.models import Project, EffectiveProjectPermission
+
+MISSING = "missing"
+
+
+class ProjectAccess:
+    def __init__(self, project, organization_role=None, project_role=None):
+        self.project = project
+        self.organization_role = organization_role
+        self.project_role = project_role
+
+
+def _namespace_version_key(namespace):
+    return f"project_access:namespace:{namespace}"
+
+
+def _user_version_key(user_id):
+    return f"project_access:user:{user_id}"
+
+
+def _queryset(user):
+    # The project layout reads the counters, as fresh as the cached access
+    queryset = Project.objects.select_related("organization", "repository", "counters")
+
+    if user.is_authenticated:
+        queryset = queryset.annotate(
+            role=Subquery(
+                EffectiveProjectPermission.objects.filter(
+                    project=OuterRef("pk"), user=user
+                ).values("role")[:1]
+            ),
+        )
+
+    return queryset
+
+
+def _to_access(project):
+    if project is None:
+        return None
+
+    role = getattr(project, "role", None)
+    if project.organization_id:
+        return ProjectAccess(project, organization_role=role)
+    return ProjectAccess(project, project_role=role)
+
+
+def _version_keys(user, namespace):
+    user_id = user.pk if user.is_authenticated else "anonymous"
+    return user_id, [_namespace_version_key(namespace), _user_version_key(user_id)]
+
+
+def _cache_key(namespace, user_id, version_keys, versions):
+    return "project_access:{}:{}:{}:{}".format(
+        namespace,
+        versions.get(version_keys[0], 0),
+        user_id,
+        versions.get(version_keys[1], 0),
+    )
+
+
+def resolve_project_access(user, namespace):
+    """
+    Returns the ProjectAccess of user on the project at namespace, or None
+    when no such project exists.
+    """
+    user_id, version_keys = _version_keys(user, namespace)
+    versions = cache.get_many(version_keys)
+    if len(versions) < len(version_keys):
+        _seed(version_keys)
+        versions = cache.get_many(version_keys)
+    key = _cache_key(namespace, user_id, version_keys, versions)
+
+    access = cache.get(key)
+    if access is None:
+        access = _to_access(_queryset(user).filter(namespace=namespace).first())
+        cache.set(
+            key,
+            MISSING if access is None else access,
+            timeout=settings.PROJECT_ACCESS_CACHE_TIMEOUT,
+        )
+    elif access == MISSING:
+        access = None
+
+    return access
+
+
+async def aresolve_project_access(user, namespace):
+    """Async version of resolve_project_access, user must already be loaded."""
+    user_id, version_keys = _version_keys(user, namespace)
+    versions = await cache.aget_many(version_keys)
+    if len(versions) < len(version_keys):
+        for key in version_keys:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+        versions = await cache.aget_many(version_keys)
+    key = _cache_key(namespace, user_id, version_keys, versions)
+
+    access = await cache.aget(key)
+    if access is None:
+        project = await _queryset(user).filter(namespace=namespace).afirst()
+        access = _to_access(project)
+        await cache.aset(
+            key,
+            MISSING if access is None else access,
+            timeout=settings.PROJECT_ACCESS_CACHE_TIMEOUT,
+        )
+    elif access == MISSING:
+        access = None
+
+    return access
+
+
+def _seed(keys):
+    # Versions start from the clock, so one evicted from the cache is never
+    # confused with an earlier one
+    for key in keys:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def _bump(key):
+    _seed([key])
+    cache.incr(key)
+
+
+def invalidate_namespace(namespace):
+    _bump(_namespace_version_key(namespace))
+
+
+def invalidate_user(user_id):
+    _bump(_user_version_key(user_id))
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gitsap.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, the transport touches the models
+from gitsap.git.transport import GitHTTPApplication  # noqa: E402
+
+application = GitHTTPApplication(django_application)
@@ -0,0 +1,240 @@
+"""
+Archive downloads, streamed while they are generated and cached on disk.
+
+An archive depends only on its tree, its format and the name of its top
+level directory, so finished ones are kept under GIT_ARCHIVE_CACHE_DIR as
+
+    <tree[:2]>/<tree>.<prefix hash>.<format>
+
+and served as plain files. The cache is bounded by GIT_ARCHIVE_CACHE_MAX_SIZE,
+least recently served first.
+
+A missing archive is written by git archive to "<name>.partial", flocked
+by the one process generating it. Every request for it, the first included,
+follows that file as it grows, so concurrent requests share one generation
+and the first bytes go out at once. On success the file is renamed into
+place while still locked; on failure it is unlinked first, so a follower
+that gets the lock can tell the two apart. A partial file left by a process
+that died is regenerated by the next request.
+"""
+
+import asyncio
+import fcntl
+import hashlib
+import os
+import subprocess
+import threading
+
+from django.conf import settings
+
+from gitsap.git.executor import run_git
+
+FORMATS = {
+    "tar.gz": "application/gzip",
+    "zip": "application/zip",
+}
+# Seconds between reads of an archive that has not grown
+FOLLOW_INTERVAL = 0.05
+
+
+class ArchiveError(Exception):
+    """The generation an archive was followed from failed."""
+
+
+def split_format(spec):
+    """(rev, format) of "<rev>.<format>", None for unknown formats."""
+    for archive_format in FORMATS:
+        if spec.endswith(f".{archive_format}"):
+            return spec[: -len(archive_format) - 1], archive_format
+    return None
+
+
+def _try_lock(fd, operation=fcntl.LOCK_EX):
+    try:
+        fcntl.flock(fd, operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class ArchiveCache:
+    def __init__(self, root=None):
+        self.root = root or settings.GIT_ARCHIVE_CACHE_DIR
+
+    def path_for(self, tree_oid, archive_format, prefix):
+        prefix_hash = hashlib.sha1(prefix.encode()).hexdigest()[:8]
+        return os.path.join(
+            self.root, tree_oid[:2], f"{tree_oid}.{prefix_hash}.{archive_format}"
+        )
+
+    def open(self, repo_path, tree_oid, archive_format, prefix):
+        """
+        ("file", path) of a finished archive, or ("stream", ArchiveFollower)
+        of one being generated, starting the generation when none runs.
+        """
+        path = self.path_for(tree_oid, archive_format, prefix)
+        partial_path = f"{path}.partial"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        while True:
+            if self._touch(path):
+                return "file", path
+
+            fd = os.open(partial_path, os.O_RDWR | os.O_CREAT, 0o644)
+            if not _try_lock(fd):
+                return "stream", ArchiveFollower(fd, path)
+
+            # Between the open and the lock the file may have been finished
+            # (renamed to path) or failed (unlinked): look again
+            if os.fstat(fd).st_nlink == 0 or self._touch(path):
+                os.close(fd)
+                continue
+
+            # Its own open file: a dup would share the lock
+            follower = ArchiveFollower(os.open(partial_path, os.O_RDONLY), path)
+            self._generate(fd, repo_path, tree_oid, archive_format, prefix, path)
+            return "stream", follower
+
+    def _touch(self, path):
+        """True when path is cached, marking it as recently served."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _generate(self, fd, repo_path, tree_oid, archive_format, prefix, path):
+        os.ftruncate(fd, 0)
+        process = subprocess.Popen(
+            [
+                settings.GIT_BINARY,
+                "archive",
+                f"--format={archive_format}",
+                f"--prefix={prefix}/",
+                tree_oid,
+            ],
+            cwd=repo_path,
+            stdin=subprocess.DEVNULL,
+            stdout=fd,
+            stderr=subprocess.DEVNULL,
+        )
+
+        def finish():
+            try:
+                if process.wait() == 0:
+                    os.fsync(fd)
+                    os.rename(f"{path}.partial", path)
+                else:
+                    os.unlink(f"{path}.partial")
+            finally:
+                os.close(fd)
+            self.evict()
+
+        # Outlives the request that started it, followers only read the file
+        threading.Thread(target=finish, daemon=True).start()
+
+    def evict(self):
+        """Removes the least recently served archives over the size limit."""
+        files = []
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith(".partial"):
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= settings.GIT_ARCHIVE_CACHE_MAX_SIZE:
+                break
+            # Requests already reading it keep their open file
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class ArchiveFollower:
+    """
+    Reads an archive being generated, waiting for more whenever it catches
+    up, until the generation ends. Iterating is asynchronous, like
+    BlobReader. Raises ArchiveError when the generation failed, which ends
+    the response without its last chunk, so the client sees the download
+    fail rather than a truncated archive.
+    """
+
+    def __init__(self, fd, path):
+        self.fd = fd
+        self.path = path
+        self._closed = False
+
+    def _finished(self):
+        """True once nothing writes the file any more."""
+        if not _try_lock(self.fd, fcntl.LOCK_SH):
+            return False
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        # Finished only when renamed into place, not unlinked after a failure
+        # or left behind by a generating process that died
+        try:
+            finished = os.stat(self.path).st_ino == os.fstat(self.fd).st_ino
+        except FileNotFoundError:
+            finished = False
+        if not finished:
+            raise ArchiveError(self.path)
+        return True
+
+    def read(self, offset):
+        return os.pread(self.fd, settings.GIT_HTTP_CHUNK_SIZE, offset)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            os.close(self.fd)
+
+    async def __aiter__(self):
+        offset = 0
+        finished = False
+        while True:
+            chunk = await run_git(self.read, offset)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+            elif finished:
+                return
+            else:
+                # Read once more after the end, the last write may have
+                # landed after the empty read
+                finished = self._finished()
+                if not finished:
+                    await asyncio.sleep(FOLLOW_INTERVAL)
+
+
+class ArchiveFile:
+    """
+    Reads a finished archive in chunks on the git executor. Django would
+    collect a file object given to an ASGI response into one list first;
+    iterating is asynchronous instead, like ArchiveFollower.
+    """
+
+    def __init__(self, path):
+        # Open from here on, whatever prunes the cache meanwhile
+        self.fd = os.open(path, os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+        self._closed = False
+
+    def read(self, offset):
+        return os.pread(self.fd, settings.GIT_HTTP_CHUNK_SIZE, offset)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            os.close(self.fd)
+
+    async def __aiter__(self):
+        offset = 0
+        while chunk := await run_git(self.read, offset):
+            offset += len(chunk)
+            yield chunk
@@ -0,0 +1,344 @@
+"""
+Cached, incremental blame.
+
+Blame follows the first-parent history of the file, like ``git blame
+--first-parent``. The history is walked in batches of revisions (commits
+changing the file), and each batch is blamed with one git call bounded by
+the commit below it. Lines the batch did not change are blamed on that
+boundary, at their position in its version, and carried to the next batch.
+
+The blame of (commit, path) never changes, so it is kept in the "blame"
+cache under both the requested commit and the commit that last changed the
+file. A later commit's walk stops at the first such revision it reaches and
+takes the remaining lines from its result, so only the newer revisions are
+blamed.
+
+A walk runs for a time budget. When the budget runs out, the lines
+attributed so far and the position of the rest are stored as a partial
+result, which the page shows while the next run continues from there.
+
+    blame:v1:<commit>:<path hash>            complete result
+    blame:v1:<commit>:<path hash>:partial    partial result
+"""
+
+import hashlib
+import json
+import subprocess
+import time
+import zlib
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import caches
+
+FORMAT_VERSION = 1
+# Revisions walked, looked up in the cache and blamed per git call
+WALK_BATCH_SIZE = 1000
+# With more pending ranges than this the whole version is blamed
+MAX_LINE_RANGES = 200
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _unpack(value):
+    return json.loads(zlib.decompress(value))
+
+
+def count_lines(data):
+    """Number of lines in data, the way diffs count them."""
+    if not data:
+        return 0
+    return data.count(b"\n") + (0 if data.endswith(b"\n") else 1)
+
+
+def _blob_id(commit, path):
+    try:
+        entry = commit.tree[path]
+    except KeyError:
+        return None
+    return entry.id if entry.type_str == "blob" else None
+
+
+def _first_parent(repo, commit):
+    return repo[commit.parent_ids[0]] if commit.parent_ids else None
+
+
+def _overlapping(starts, lengths, pos, count):
+    """
+    Yields (i, lo, hi) for each range i (sorted by start) that overlaps
+    [pos, pos + count), lo and hi bounding the overlap.
+    """
+    end = pos + count
+    i = max(bisect_right(starts, pos) - 1, 0)
+    while i < len(starts) and starts[i] < end:
+        lo, hi = max(starts[i], pos), min(starts[i] + lengths[i], end)
+        if lo < hi:
+            yield i, lo, hi
+        i += 1
+
+
+def _line_ranges(pending):
+    """Pending positions merged into (start, end) ranges for git blame -L."""
+    ranges = []
+    for _, count, pos in sorted(pending, key=lambda run: run[2]):
+        if ranges and ranges[-1][1] == pos:
+            ranges[-1][1] += count
+        else:
+            ranges.append([pos, pos + count])
+    return ranges
+
+
+def _porcelain_groups(output):
+    """
+    (commit_oid, orig_line, final_line, count) of each group in git blame
+    --porcelain output, lines 0-based.
+    """
+    for line in output.split(b"\n"):
+        # Group headers are "<oid> <orig> <final> <count>", content lines
+        # start with a tab
+        parts = line.split(b" ")
+        if len(parts) == 4 and len(parts[0]) == 40 and parts[3].isdigit():
+            yield parts[0].decode(), int(parts[1]) - 1, int(parts[2]) - 1, int(parts[3])
+
+
+class BlameCache:
+    def __init__(self, commit_oid, path):
+        self.cache = caches["blame"]
+        self.commit_oid = commit_oid
+        self.path = path
+        self.path_hash = hashlib.sha1(path.encode()).hexdigest()[:16]
+        self.key = self.key_for(commit_oid)
+
+    def key_for(self, commit_oid):
+        return f"blame:v{FORMAT_VERSION}:{commit_oid}:{self.path_hash}"
+
+    def get(self):
+        value = self.cache.get(self.key)
+        return None if value is None else _unpack(value)
+
+    def get_partial(self):
+        value = self.cache.get(f"{self.key}:partial")
+        return None if value is None else _unpack(value)
+
+    def get_many(self, commit_oids):
+        """Complete results of the file at each of commit_oids, when cached."""
+        keys = {self.key_for(oid): oid for oid in commit_oids}
+        values = self.cache.get_many(keys)
+        return {keys[key]: _unpack(value) for key, value in values.items()}
+
+    def claim(self):
+        """
+        True for the one caller that should schedule the computation, while
+        no other is pending.
+        """
+        return self.cache.add(
+            f"{self.key}:pending", 1, timeout=settings.GIT_BLAME_PENDING_TIMEOUT
+        )
+
+    def extend_claim(self):
+        self.cache.set(
+            f"{self.key}:pending", 1, timeout=settings.GIT_BLAME_PENDING_TIMEOUT
+        )
+
+    def store(self, result, revision_oid):
+        # revision_oid last changed the file, later commits reach it first
+        value = _pack(result)
+        self.cache.set_many({self.key: value, self.key_for(revision_oid): value})
+        self.cache.delete_many([f"{self.key}:partial", f"{self.key}:pending"])
+
+    def store_partial(self, state):
+        self.cache.set(f"{self.key}:partial", _pack(state))
+
+
+class BlameBuilder:
+    """
+    Blame of path at commit_oid, computed in steps. State is JSON
+    serializable so a run can stop at a deadline and the next one resume:
+
+        runs        [final_line, count, commit_index, orig_line] attributed
+        pending     [final_line, count, line_in_cursor]          unattributed
+        commits     commit OIDs that runs point into
+        cursor      commit whose version pending positions refer to
+        revision    commit that last changed the file as of commit_oid
+        revisions   revisions walked so far
+
+    Lines are 0-based.
+    """
+
+    def __init__(self, repo, cache, commit_oid, path, state=None):
+        self.repo = repo
+        self.cache = cache
+        self.path = path
+
+        if state is None:
+            commit = repo[commit_oid]
+            blob_id = _blob_id(commit, path)
+            if blob_id is None:
+                raise KeyError(path)
+            lines = count_lines(repo[blob_id].data)
+            state = {
+                "runs": [],
+                "pending": [[0, lines, 0]] if lines else [],
+                "commits": [],
+                "cursor": commit_oid,
+                "revision": None,
+                "revisions": 0,
+            }
+        self.state = state
+        self.commit_indexes = {oid: i for i, oid in enumerate(state["commits"])}
+
+    def commit_index(self, oid):
+        oid = str(oid)
+        index = self.commit_indexes.get(oid)
+        if index is None:
+            index = self.commit_indexes[oid] = len(self.state["commits"])
+            self.state["commits"].append(oid)
+        return index
+
+    def run(self, deadline=None):
+        """
+        Walks until every line is attributed or deadline (time.monotonic)
+        passes, at least one step so every run makes progress. Returns True
+        once complete.
+        """
+        while self.state["pending"]:
+            self.step()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return not self.state["pending"]
+
+    def _collect(self):
+        """
+        Walks the first-parent history below the cursor. Returns the next
+        revisions (commits changing the file), newest first, and the commit
+        below the last one, or None when that one added the file.
+        """
+        commit = self.repo[self.state["cursor"]]
+        blob_id = _blob_id(commit, self.path)
+        revisions = []
+        while len(revisions) < WALK_BATCH_SIZE:
+            parent = _first_parent(self.repo, commit)
+            parent_blob_id = _blob_id(parent, self.path) if parent else None
+            if parent_blob_id != blob_id:
+                revisions.append(str(commit.id))
+                if parent_blob_id is None:
+                    return revisions, None
+            commit, blob_id = parent, parent_blob_id
+        return revisions, str(commit.id)
+
+    def step(self):
+        """
+        Attributes the pending lines changed by the next batch of revisions,
+        with one git blame call bounded by the batch. The rest move to the
+        commit below it, or come from its cached result when one of the
+        revisions has one.
+        """
+        state = self.state
+        revisions, boundary = self._collect()
+        if state["revision"] is None:
+            state["revision"] = revisions[0]
+
+        cached = None
+        results = self.cache.get_many(revisions)
+        for n, oid in enumerate(revisions):
+            if oid in results:
+                revisions, boundary, cached = revisions[:n], oid, results[oid]
+                break
+
+        if revisions:
+            state["pending"] = self._blame(boundary)
+            state["revisions"] += len(revisions)
+            state["cursor"] = boundary
+        if cached is not None:
+            self._take(cached)
+            state["pending"] = []
+
+    def _blame(self, boundary):
+        """
+        Runs git blame on the pending lines from the cursor down to boundary.
+        Appends the attributed lines to runs and returns the others, moved to
+        their position at boundary.
+        """
+        state = self.state
+        pending = state["pending"]
+        pending.sort(key=lambda run: run[2])
+        starts = [run[2] for run in pending]
+        lengths = [run[1] for run in pending]
+
+        args = [settings.GIT_BINARY, "blame", "--porcelain", "--first-parent"]
+        ranges = _line_ranges(pending)
+        if len(ranges) <= MAX_LINE_RANGES:
+            for start, end in ranges:
+                args += ["-L", f"{start + 1},{end}"]
+        cursor = state["cursor"]
+        args += [f"{boundary}..{cursor}" if boundary else cursor, "--", self.path]
+
+        output = subprocess.run(
+            args, cwd=self.repo.path, capture_output=True, check=True
+        ).stdout
+
+        carried = []
+        for oid, orig, pos, count in _porcelain_groups(output):
+            for i, lo, hi in _overlapping(starts, lengths, pos, count):
+                final = pending[i][0] + lo - starts[i]
+                # Lines unchanged below the range are blamed on its boundary
+                if oid == boundary:
+                    carried.append([final, hi - lo, orig + lo - pos])
+                else:
+                    state["runs"].append(
+                        [final, hi - lo, self.commit_index(oid), orig + lo - pos]
+                    )
+
+        carried.sort(key=lambda run: run[2])
+        return carried
+
+    def _take(self, result):
+        """Attributes the pending lines from the complete result of the cursor."""
+        runs = result["runs"]
+        starts = [run[0] for run in runs]
+        lengths = [run[1] for run in runs]
+        for final, count, pos in self.state["pending"]:
+            for i, lo, hi in _overlapping(starts, lengths, pos, count):
+                _, _, commit, orig = runs[i]
+                index = self.commit_index(result["commits"][commit]["oid"])
+                self.state["runs"].append(
+                    [final + lo - pos, hi - lo, index, orig + lo - starts[i]]
+                )
+
+    def result(self, partial=False):
+        """
+        The result to cache and render: runs sorted by final line, adjacent
+        ones from the same commit merged, and the commits they point into.
+        """
+        runs = []
+        for run in sorted(self.state["runs"]):
+            last = runs[-1] if runs else None
+            if (
+                last
+                and last[2] == run[2]
+                and last[0] + last[1] == run[0]
+                and last[3] + last[1] == run[3]
+            ):
+                last[1] += run[1]
+            else:
+                runs.append(list(run))
+
+        commits = []
+        for oid in self.state["commits"]:
+            commit = self.repo[oid]
+            commits.append(
+                {
+                    "oid": oid,
+                    "author": commit.author.name,
+                    "time": commit.commit_time,
+                    "summary": commit.message.split("\n", 1)[0],
+                }
+            )
+
+        result = {"runs": runs, "commits": commits}
+        if partial:
+            result["pending"] = self.state["pending"]
+            result["revisions"] = self.state["revisions"]
+        return result
@@ -0,0 +1,106 @@
+"""
+Revision walks feeding the commit index.
+"""
+
+from datetime import datetime, timezone
+from itertools import islice
+
+import pygit2
+from pygit2.enums import SortMode
+
+from gitsap.git.refs import ZERO_OID
+
+
+def _walker(repo, tips, hidden=()):
+    walker = repo.walk(None, SortMode.TOPOLOGICAL | SortMode.TIME)
+    for tip in tips:
+        walker.push(tip)
+    for oid in hidden:
+        walker.hide(oid)
+    return walker
+
+
+def _commit_tips(repo, oids):
+    """Peels oids (annotated tags included) to commits, dropping anything else."""
+    tips = set()
+    for oid in oids:
+        try:
+            tips.add(repo[oid].peel(pygit2.Commit).id)
+        except (KeyError, ValueError, pygit2.GitError):
+            continue
+    return tips
+
+
+def iter_pushed_commits(repo, updates, previous_tips=None):
+    """
+    Yields the commits a push introduced: reachable from the new tips of the
+    updated refs but from none of the refs as they were before the push.
+    previous_tips are the tips of those refs, recorded before the push moved
+    them; left out, the refs of repo are read as they are now (old tips of
+    updated refs plus every ref the push left untouched), which is only
+    right while the push has not been applied yet.
+    """
+    updated = {ref_name for _, _, ref_name in updates}
+    new_tips = _commit_tips(repo, [new for _, new, _ in updates if new != ZERO_OID])
+    if not new_tips:
+        return
+
+    previous = [old for old, _, _ in updates if old != ZERO_OID]
+    if previous_tips is not None:
+        previous.extend(previous_tips)
+    else:
+        for ref in repo.references.iterator():
+            if ref.name not in updated and isinstance(ref.target, pygit2.Oid):
+                previous.append(ref.target)
+
+    yield from _walker(repo, new_tips, _commit_tips(repo, previous))
+
+
+def iter_dropped_commits(repo, updates):
+    """
+    Yields the commits a push left unreachable: reachable from the old tips
+    of the updated refs, e.g. force-pushed or deleted branches, but from no
+    ref as the refs are now.
+    """
+    old_tips = _commit_tips(repo, [old for old, _, _ in updates if old != ZERO_OID])
+    if not old_tips:
+        return
+
+    current = [
+        ref.target
+        for ref in repo.references.iterator()
+        if isinstance(ref.target, pygit2.Oid)
+    ]
+    yield from _walker(repo, old_tips, _commit_tips(repo, current))
+
+
+def ref_tips(repo):
+    """Hex oids of every commit pointed to by a branch or tag."""
+    oids = [
+        ref.target
+        for ref in repo.references.iterator()
+        if isinstance(ref.target, pygit2.Oid)
+    ]
+    return sorted(str(oid) for oid in _commit_tips(repo, oids))
+
+
+def iter_history(repo, tips, offset=0):
+    """
+    Yields every commit reachable from tips in a deterministic order, skipping
+    the first offset commits. Walking the same tips again yields the same
+    sequence, which is what makes a backfill resumable from a count.
+    """
+    yield from islice(_walker(repo, tips), offset, None)
+
+
+def commit_time(signature):
+    return datetime.fromtimestamp(signature.time, tz=timezone.utc)
+
+
+def tip_committed_at(repo, oid):
+    """Committer time of the commit oid peels to, None when it is no commit."""
+    try:
+        commit = repo[oid].peel(pygit2.Commit)
+    except (KeyError, ValueError, pygit2.GitError):
+        return None
+    return commit_time(commit.committer)
@@ -0,0 +1,175 @@
+"""
+Cached diffs between two commits.
+
+A diff is fully determined by the two commit OIDs and the diff options, so
+it is computed once (in a Celery worker) and shared by every reviewer and
+every reload, across repositories holding the same objects. It is stored in
+the "diffs" cache, which evicts least recently used entries:
+
+    diff:v1:<base>:<head>:<options>          manifest — merge base, totals and
+                                             per-file stats
+    diff:v1:<base>:<head>:<options>:<n>      hunks of file n
+
+so a page lists thousands of files from one key and loads each file's hunks
+on its own. Values are JSON compressed with zlib.
+"""
+
+import json
+import zlib
+
+import pygit2
+from django.conf import settings
+from django.core.cache import caches
+from pygit2.enums import DiffOption
+
+from gitsap.models.choices import GitFileChangeTypeChoice
+
+FORMAT_VERSION = 1
+DEFAULT_CONTEXT_LINES = 3
+MAX_CONTEXT_LINES = 20
+STORE_BATCH_SIZE = 500
+
+STATUSES = {
+    "A": GitFileChangeTypeChoice.ADDED,
+    "D": GitFileChangeTypeChoice.DELETED,
+    "R": GitFileChangeTypeChoice.RENAMED,
+}
+
+
+def normalize_options(context=None, ignore_whitespace=False):
+    """Diff options as a dict with every key set, e.g. from query parameters."""
+    try:
+        context = int(context)
+    except (TypeError, ValueError):
+        context = DEFAULT_CONTEXT_LINES
+    return {
+        "context": min(max(context, 0), MAX_CONTEXT_LINES),
+        "ignore_whitespace": bool(ignore_whitespace),
+    }
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode())
+
+
+def _unpack(value):
+    return json.loads(zlib.decompress(value))
+
+
+def _patch_hunks(patch, max_lines):
+    """[[header, [[origin, old_lineno, new_lineno, content], ...]], ...]"""
+    hunks = []
+    count = 0
+    for hunk in patch.hunks:
+        lines = []
+        hunks.append([hunk.header.rstrip("\n"), lines])
+        for line in hunk.lines:
+            if count >= max_lines:
+                return hunks, True
+            content = line.raw_content.decode("utf-8", "replace").rstrip("\n")
+            lines.append([line.origin, line.old_lineno, line.new_lineno, content])
+            count += 1
+    return hunks, False
+
+
+def compute_diff(repo, base_oid, head_oid, options):
+    """
+    Diffs head against its merge base with base, like a pull request shows
+    it. Returns (manifest, files) where files[n] holds the hunks of
+    manifest["files"][n].
+    """
+    base = repo[base_oid].peel(pygit2.Commit)
+    head = repo[head_oid].peel(pygit2.Commit)
+    merge_base = repo.merge_base(base.id, head.id)
+    # Unrelated histories diff against the base itself
+    old = repo[merge_base] if merge_base else base
+
+    flags = DiffOption.NORMAL
+    if options["ignore_whitespace"]:
+        flags |= DiffOption.IGNORE_WHITESPACE
+
+    diff = repo.diff(
+        old.tree, head.tree, flags=flags, context_lines=options["context"]
+    )
+    diff.find_similar()
+
+    manifest = {
+        "merge_base": str(old.id),
+        "additions": 0,
+        "deletions": 0,
+        "files": [],
+    }
+    files = []
+    for patch in diff:
+        delta = patch.delta
+        _, additions, deletions = patch.line_stats
+
+        if delta.is_binary:
+            hunks, truncated = [], False
+        else:
+            hunks, truncated = _patch_hunks(patch, settings.GIT_DIFF_MAX_FILE_LINES)
+
+        manifest["additions"] += additions
+        manifest["deletions"] += deletions
+        manifest["files"].append(
+            {
+                "path": delta.new_file.path,
+                "old_path": delta.old_file.path,
+                "status": STATUSES.get(
+                    delta.status_char(), GitFileChangeTypeChoice.MODIFIED
+                ),
+                "additions": additions,
+                "deletions": deletions,
+                "binary": delta.is_binary,
+                "truncated": truncated,
+            }
+        )
+        files.append(hunks)
+
+    return manifest, files
+
+
+class DiffCache:
+    def __init__(self, base_oid, head_oid, options):
+        self.cache = caches["diffs"]
+        self.base_oid = base_oid
+        self.head_oid = head_oid
+        self.options = options
+
+        flags = "w" if options["ignore_whitespace"] else ""
+        self.key = (
+            f"diff:v{FORMAT_VERSION}:{base_oid}:{head_oid}:"
+            f"u{options['context']}{flags}"
+        )
+
+    def get_manifest(self):
+        value = self.cache.get(self.key)
+        return None if value is None else _unpack(value)
+
+    def get_file(self, index):
+        value = self.cache.get(f"{self.key}:{index}")
+        return None if value is None else _unpack(value)
+
+    def claim(self):
+        """
+        True for the one caller that should schedule the computation, while
+        no other is pending.
+        """
+        return self.cache.add(
+            f"{self.key}:pending", 1, timeout=settings.GIT_DIFF_PENDING_TIMEOUT
+        )
+
+    def store(self, manifest, files):
+        # Files first: once the manifest is visible its files are too, until
+        # the cache evicts some of them, which readers handle by storing the
+        # diff again
+        for start in range(0, len(files), STORE_BATCH_SIZE):
+            batch = files[start : start + STORE_BATCH_SIZE]
+            self.cache.set_many(
+                {
+                    f"{self.key}:{start + offset}": _pack(hunks)
+                    for offset, hunks in enumerate(batch)
+                }
+            )
+        self.cache.set(self.key, _pack(manifest))
+        self.cache.delete(f"{self.key}:pending")
@@ -0,0 +1,39 @@
+"""
+Bounded thread pool for blocking libgit2 calls made from async views.
+
+pygit2 calls block the thread they run on. Async views hand them to this
+pool instead of running them on the event loop, and its size caps how many
+run at once per process however many requests are in flight.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_executor = None
+_pid = None
+
+
+def get_executor():
+    global _executor, _pid
+    with _lock:
+        # Threads do not survive a fork, start over in the child
+        if _executor is None or _pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GIT_EXECUTOR_WORKERS, thread_name_prefix="git"
+            )
+            _pid = os.getpid()
+        return _executor
+
+
+async def run_git(func, *args, **kwargs):
+    """Runs func(*args, **kwargs) on the git executor and returns its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
@@ -0,0 +1,181 @@
+"""
+Scheduled maintenance of bare repositories.
+
+Every push leaves a pack (or loose objects, for small ones) behind, so left
+alone a busy repository ends up with hundreds of packs that every object
+lookup searches in turn, and with no commit-graph, so history walks parse
+each commit from its object. maintain() runs, in order:
+
+- git pack-refs --all, folding loose refs into packed-refs;
+- git repack -d --geometric=2 --write-midx --write-bitmap-index, which
+  rolls loose objects and the smallest packs together until pack sizes
+  form a geometric progression, so each run rewrites recent data only, and
+  writes a multi-pack-index over the remaining packs with the reachability
+  bitmaps that fetches and clones count objects from;
+- git commit-graph write --reachable --split --changed-paths, which adds a
+  layer for new commits to the commit-graph chain, with the changed-path
+  Bloom filters that git log -- <path> (blame, last commits of a directory)
+  uses to skip commits without opening their trees.
+
+Maintenance and pushes exclude each other through a flock on PUSH_LOCK in
+the repository: receive-pack holds it shared, maintenance exclusively and
+without waiting, so a repository being pushed to is left for the next run.
+The number of repositories maintained at once on a host is bounded by
+GIT_MAINTENANCE_HOST_CONCURRENCY slot files under GIT_MAINTENANCE_SLOT_DIR.
+"""
+
+import contextlib
+import fcntl
+import os
+import struct
+import subprocess
+
+from django.conf import settings
+
+from gitsap.git.archives import _try_lock
+
+PUSH_LOCK = "gitsap-push.lock"
+# Loose objects are counted in one of the 256 fan-out directories and
+# scaled up, like git gc --auto does
+LOOSE_SAMPLE_DIR = "17"
+# multi-pack-index header: signature, version, hash version, chunk count,
+# base file count, pack count
+MIDX_HEADER = struct.Struct(">4sBBBBI")
+# Score of a repository: pushes since its last maintenance, plus this much
+# per pack outside the multi-pack-index and per loose object
+PACK_WEIGHT = 10
+LOOSE_WEIGHT = 0.01
+MISSING_COMMIT_GRAPH_WEIGHT = 100
+
+
+class RepositoryLock:
+    """flock on PUSH_LOCK, shared by pushes and exclusive for maintenance."""
+
+    def __init__(self, repo_path):
+        self.path = os.path.join(repo_path, PUSH_LOCK)
+        self.fd = None
+
+    def acquire(self, shared=False):
+        """True once locked, False when it is held in the other mode."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not _try_lock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX):
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+@contextlib.contextmanager
+def host_slot():
+    """
+    Holds one of the GIT_MAINTENANCE_HOST_CONCURRENCY maintenance slots of
+    this host for the duration of a with block. Yields None when all are
+    taken.
+    """
+    os.makedirs(settings.GIT_MAINTENANCE_SLOT_DIR, exist_ok=True)
+    for slot in range(settings.GIT_MAINTENANCE_HOST_CONCURRENCY):
+        path = os.path.join(settings.GIT_MAINTENANCE_SLOT_DIR, f"slot-{slot}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if _try_lock(fd):
+            try:
+                yield slot
+            finally:
+                os.close(fd)
+            return
+        os.close(fd)
+    yield None
+
+
+def _midx_pack_count(pack_dir):
+    try:
+        with open(os.path.join(pack_dir, "multi-pack-index"), "rb") as midx:
+            header = midx.read(MIDX_HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(header) < MIDX_HEADER.size:
+        return 0
+    signature, *_, packs = MIDX_HEADER.unpack(header)
+    return packs if signature == b"MIDX" else 0
+
+
+def fragmentation(repo_path):
+    """
+    Cheap measures of how much a repository needs maintenance, from a few
+    directory listings:
+
+        {"packs", "new_packs" (outside the multi-pack-index), "loose_objects"
+         (estimated), "commit_graph" (whether one exists)}
+    """
+    objects = os.path.join(repo_path, "objects")
+    pack_dir = os.path.join(objects, "pack")
+    try:
+        packs = sum(1 for name in os.listdir(pack_dir) if name.endswith(".pack"))
+    except FileNotFoundError:
+        packs = 0
+    try:
+        loose = len(os.listdir(os.path.join(objects, LOOSE_SAMPLE_DIR))) * 256
+    except FileNotFoundError:
+        loose = 0
+    info = os.path.join(objects, "info")
+    return {
+        "packs": packs,
+        "new_packs": max(packs - _midx_pack_count(pack_dir), 0),
+        "loose_objects": loose,
+        "commit_graph": os.path.exists(os.path.join(info, "commit-graph"))
+        or os.path.exists(os.path.join(info, "commit-graphs", "commit-graph-chain")),
+    }
+
+
+def score(stats, pushes):
+    """
+    How urgently a repository with these fragmentation stats and this many
+    pushes since its last maintenance needs it, 0 when it does not.
+    """
+    if (
+        stats["new_packs"] == 0
+        and stats["loose_objects"] < settings.GIT_MAINTENANCE_MIN_LOOSE_OBJECTS
+        and (stats["commit_graph"] or stats["packs"] == 0)
+    ):
+        return 0
+    return (
+        pushes
+        + stats["new_packs"] * PACK_WEIGHT
+        + stats["loose_objects"] * LOOSE_WEIGHT
+        + (0 if stats["commit_graph"] else MISSING_COMMIT_GRAPH_WEIGHT)
+    )
+
+
+def _git(repo_path, *args):
+    subprocess.run(
+        [settings.GIT_BINARY, *args],
+        cwd=repo_path,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+
+
+def maintain(repo_path):
+    """
+    Repacks repo_path and writes its commit-graph and bitmaps. The caller
+    holds the repository's lock exclusively.
+    """
+    _git(repo_path, "pack-refs", "--all")
+    _git(
+        repo_path,
+        "repack",
+        "-d",
+        "--geometric=2",
+        "--write-midx",
+        "--write-bitmap-index",
+        "--quiet",
+    )
+    _git(
+        repo_path, "commit-graph", "write", "--reachable", "--split", "--changed-paths"
+    )
@@ -0,0 +1,31 @@
+"""
+Mergeability checks without a working tree.
+
+libgit2 merges the two commits' trees against their merge base entirely in
+memory (git_merge_commits, i.e. merge_trees on the computed base); nothing
+is written to the repository or to disk.
+"""
+
+import pygit2
+
+from gitsap.git.refs import BRANCH_PREFIX
+
+
+def branch_tip(repo, branch):
+    """Hex OID branch points to, None when it does not exist."""
+    ref = repo.references.get(f"{BRANCH_PREFIX}{branch}")
+    if ref is None or not isinstance(ref.target, pygit2.Oid):
+        return None
+    return str(ref.target)
+
+
+def find_conflicts(repo, target_oid, source_oid):
+    """Sorted paths that conflict when merging source into target, [] when clean."""
+    index = repo.merge_commits(target_oid, source_oid)
+    if index.conflicts is None:
+        return []
+
+    paths = set()
+    for ancestor, ours, theirs in index.conflicts:
+        paths.add((ours or theirs or ancestor).path)
+    return sorted(paths)
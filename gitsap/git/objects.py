@@ -0,0 +1,123 @@
+"""
+Object lookups for code browsing.
+
+Trees and blobs are addressed by the OID of the commit (or tag) they are read
+from plus a path, which names the same content forever. Branch and tag names
+are resolved against the cached ref snapshot, without opening the repository.
+"""
+
+import re
+
+import pygit2
+
+from gitsap.git.executor import run_git
+from gitsap.git.pool import get_pool
+
+OID_RE = re.compile(r"^[0-9a-f]{40}$")
+
+
+def split_rev(spec, snapshot):
+    """
+    Splits "<rev>/<path>" into (target_oid, path, is_oid). rev is a full OID,
+    a branch or a tag; names may contain slashes, the longest one matching a
+    leading part of spec wins and branches shadow tags. Returns None when
+    rev names nothing.
+    """
+    rev, _, path = spec.partition("/")
+    if OID_RE.match(rev):
+        return rev, path, True
+
+    names = {**snapshot["tags"], **snapshot["branches"]}
+    parts = spec.split("/")
+    for i in range(len(parts), 0, -1):
+        target = names.get("/".join(parts[:i]))
+        if target is not None:
+            return target, "/".join(parts[i:]), False
+    return None
+
+
+def lookup(repo, oid, path):
+    """
+    Returns (commit, object) for path (a Tree or a Blob) in the commit oid
+    peels to, or (None, None) when either does not exist. An empty path is
+    the root tree.
+    """
+    try:
+        commit = repo[oid].peel(pygit2.Commit)
+    except (KeyError, ValueError, pygit2.GitError):
+        return None, None
+
+    path = path.strip("/")
+    if not path:
+        return commit, commit.tree
+
+    try:
+        obj = commit.tree[path]
+    except KeyError:
+        return commit, None
+
+    # Submodule entries point at commits of another repository
+    if not isinstance(obj, (pygit2.Tree, pygit2.Blob)):
+        return commit, None
+    return commit, obj
+
+
+def list_tree(tree, path):
+    """Entries of tree as dicts, directories first, each group sorted by name."""
+    prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+    entries = [
+        {
+            "name": entry.name,
+            "path": f"{prefix}{entry.name}",
+            "oid": str(entry.id),
+            "is_tree": entry.type_str == "tree",
+        }
+        for entry in tree
+        if entry.type_str in ("tree", "blob")
+    ]
+    entries.sort(key=lambda entry: (not entry["is_tree"], entry["name"]))
+    return entries
+
+
+class BlobReader:
+    """
+    Reads a blob in chunks through pygit2.BlobIO, so the content is never
+    copied into Python as a whole. The first chunk is read up front to tell
+    binary from text (git's heuristic: a NUL byte in the first 8000 bytes).
+
+    Holds a pooled handle of the repository until close(). Reads may come
+    from different threads, but never from two at once. Iterating is
+    asynchronous, so Django's ASGI handler forwards each chunk as it is read
+    instead of collecting the whole body first.
+    """
+
+    def __init__(self, repo_path, oid, chunk_size):
+        self.chunk_size = chunk_size
+        self._lease = get_pool().acquire(repo_path)
+        repo = self._lease.__enter__()
+        try:
+            self._io = pygit2.BlobIO(repo[oid])
+            self.first_chunk = self._io.read(chunk_size)
+        except BaseException:
+            self._lease.__exit__(None, None, None)
+            raise
+        self.is_binary = b"\0" in self.first_chunk[:8000]
+        self._closed = False
+
+    def read(self):
+        return self._io.read(self.chunk_size)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._io.close()
+        finally:
+            self._lease.__exit__(None, None, None)
+
+    async def __aiter__(self):
+        chunk = self.first_chunk
+        while chunk:
+            yield chunk
+            chunk = await run_git(self.read)
@@ -0,0 +1,172 @@
+"""
+Per-process pool of open pygit2 repository handles.
+
+Opening a repository is cheap, but every fresh handle starts with cold
+libgit2 ODB, pack-index and object caches. The pool keeps idle handles keyed
+by repo path in LRU order and lends them out one caller at a time, so a
+handle is never used by two threads at once while the caches stay warm
+across requests.
+
+A handle is considered stale once the repository's pack directory or
+packed-refs file changes (a push bringing a pack, a repack, a ref pack) and
+is reopened on its next checkout.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pygit2
+from django.conf import settings
+
+
+def _stamp(path):
+    stamp = []
+    for name in ("objects/pack", "packed-refs"):
+        try:
+            stamp.append(os.stat(os.path.join(path, name)).st_mtime_ns)
+        except FileNotFoundError:
+            stamp.append(0)
+    return tuple(stamp)
+
+
+class RepositoryPool:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = OrderedDict()  # repo_path -> [(handle, stamp), ...]
+        self._generations = {}  # repo_path -> bumped by invalidate()
+        self._idle_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @contextmanager
+    def acquire(self, path):
+        handle, stamp = self._checkout(path)
+        try:
+            yield handle
+        finally:
+            self._checkin(path, handle, stamp)
+
+    def invalidate(self, path):
+        """
+        Drops the idle handles of path. Handles lent out right now are
+        dropped when they come back.
+        """
+        with self._lock:
+            self._generations[path] = self._generations.get(path, 0) + 1
+            entries = self._idle.pop(path, [])
+            self._idle_count -= len(entries)
+
+        for handle, _ in entries:
+            handle.free()
+
+    def clear(self):
+        with self._lock:
+            entries = [entry for entries in self._idle.values() for entry in entries]
+            self._reset()
+
+        for handle, _ in entries:
+            handle.free()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self._idle_count,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "cached_memory": pygit2.settings.cached_memory[0],
+            }
+
+    def _checkout(self, path):
+        disk_stamp = _stamp(path)
+        discarded = []
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: handles inherited from the parent are unusable
+                self._reset()
+
+            stamp = (disk_stamp, self._generations.get(path, 0))
+
+            entries = self._idle.get(path, [])
+            handle = None
+            while entries:
+                candidate, candidate_stamp = entries.pop()
+                self._idle_count -= 1
+                if candidate_stamp == stamp:
+                    handle = candidate
+                    break
+                self.stale += 1
+                discarded.append(candidate)
+
+            if not entries:
+                self._idle.pop(path, None)
+
+            if handle is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        for candidate in discarded:
+            candidate.free()
+
+        if handle is None:
+            handle = pygit2.Repository(path)
+
+        return handle, stamp
+
+    def _checkin(self, path, handle, stamp):
+        evicted = []
+
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+
+            if stamp[1] != self._generations.get(path, 0):
+                # Invalidated while it was lent out
+                self.stale += 1
+                evicted.append(handle)
+            else:
+                self._idle.setdefault(path, []).append((handle, stamp))
+                self._idle.move_to_end(path)
+                self._idle_count += 1
+
+            while self._idle_count > self.max_size:
+                oldest_path, entries = next(iter(self._idle.items()))
+                evicted.append(entries.pop(0)[0])
+                if not entries:
+                    del self._idle[oldest_path]
+                self._idle_count -= 1
+                self.evictions += 1
+
+        for candidate in evicted:
+            candidate.free()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # libgit2 memory limits are process wide, not per handle
+                pygit2.settings.cache_max_size(settings.GIT_OBJECT_CACHE_MAX_SIZE)
+                pygit2.settings.mwindow_mapped_limit = settings.GIT_MWINDOW_MAPPED_LIMIT
+                _pool = RepositoryPool(settings.GIT_REPO_POOL_SIZE)
+
+    return _pool
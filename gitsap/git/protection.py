@@ -0,0 +1,198 @@
+"""
+Branch and tag protection.
+
+The ProtectionRule rows of a project are compiled into a RuleSet: for each
+restriction, the patterns carrying it are joined into one regex, and those
+without wildcards into a set of ref names. Matching a ref costs a lookup and
+a regex match per restriction however many rules there are, so a push
+updating thousands of refs, e.g. a tag import, is checked in one pass with
+no query per ref.
+
+Compiled rule sets are kept per process under a per-project rules version
+stored in the Django cache, which the signal handlers bump whenever a rule
+changes. Pushes are checked by receive-pack's pre-receive hook, which relays
+the updates to the process serving the push (see gitsap.git.transport).
+
+History restrictions only look at what the push changes: a branch update is
+forced when the old tip is no ancestor of the new one, and linear history
+rejects merge commits among the commits an update adds to the ref, old..new,
+including those other refs already reach.
+"""
+
+import functools
+import os
+import re
+import time
+
+import pygit2
+from django.core.cache import cache
+
+from gitsap.git.commits import iter_pushed_commits
+from gitsap.git.refs import BRANCH_PREFIX, TAG_PREFIX, ZERO_OID
+from gitsap.models import GitRefTypeChoice, ProtectionRule
+
+# core.hooksPath of receive-pack when the pushed project has rules
+HOOKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hooks")
+
+RESTRICT_PUSHES = "restrict_pushes"
+NO_FORCE_PUSHES = "no_force_pushes"
+NO_DELETIONS = "no_deletions"
+LINEAR_HISTORY = "linear_history"
+
+REF_PREFIXES = {
+    GitRefTypeChoice.BRANCH: BRANCH_PREFIX,
+    GitRefTypeChoice.TAG: TAG_PREFIX,
+}
+# Compiled rule sets kept per process
+RULE_SET_CACHE_SIZE = 1024
+
+GLOB_TOKEN_RE = re.compile(r"\*\*|\*|\?")
+
+
+def glob_to_regex(pattern):
+    """Regex source of a ref glob: * and ? stay within a segment, ** does not."""
+    tokens = {"**": ".*", "*": "[^/]*", "?": "[^/]"}
+    source, position = [], 0
+    for match in GLOB_TOKEN_RE.finditer(pattern):
+        source.append(re.escape(pattern[position : match.start()]))
+        source.append(tokens[match.group()])
+        position = match.end()
+    source.append(re.escape(pattern[position:]))
+    return "".join(source)
+
+
+def rule_restrictions(rule):
+    """The restrictions a ProtectionRule puts on the refs it matches."""
+    restrictions = {NO_FORCE_PUSHES, NO_DELETIONS}
+    if rule.restrict_pushes:
+        restrictions.add(RESTRICT_PUSHES)
+    if rule.allow_force_pushes:
+        restrictions.discard(NO_FORCE_PUSHES)
+    if rule.allow_deletions:
+        restrictions.discard(NO_DELETIONS)
+    if rule.require_linear_history:
+        restrictions.add(LINEAR_HISTORY)
+    return restrictions
+
+
+class RuleSet:
+    """The rules of a project, compiled for matching full ref names."""
+
+    def __init__(self, rules):
+        self.names = {}
+        globs = {}
+        for rule in rules:
+            name = REF_PREFIXES[rule.ref_type] + rule.pattern
+            for restriction in rule_restrictions(rule):
+                if GLOB_TOKEN_RE.search(rule.pattern):
+                    globs.setdefault(restriction, []).append(glob_to_regex(name))
+                else:
+                    self.names.setdefault(restriction, set()).add(name)
+
+        self.regexes = {
+            restriction: re.compile("|".join(f"(?:{source})" for source in sources))
+            for restriction, sources in globs.items()
+        }
+
+    def __bool__(self):
+        return bool(self.names or self.regexes)
+
+    def restrictions(self, ref_name):
+        restrictions = {
+            restriction
+            for restriction, names in self.names.items()
+            if ref_name in names
+        }
+        for restriction, regex in self.regexes.items():
+            if restriction not in restrictions and regex.fullmatch(ref_name):
+                restrictions.add(restriction)
+        return frozenset(restrictions)
+
+
+def _version_key(project_id):
+    return f"protection:{project_id}:version"
+
+
+def _version(project_id):
+    # Versions start from the clock, so one evicted from the cache is never
+    # confused with an earlier one
+    key = _version_key(project_id)
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def invalidate(project_id):
+    key = _version_key(project_id)
+    cache.add(key, time.time_ns(), timeout=None)
+    cache.incr(key)
+
+
+@functools.lru_cache(maxsize=RULE_SET_CACHE_SIZE)
+def _compile(project_id, version):
+    return RuleSet(ProtectionRule.objects.filter(project_id=project_id))
+
+
+def get_rule_set(project_id):
+    """The compiled rules of project_id, queried once per rules version."""
+    return _compile(project_id, _version(project_id))
+
+
+def _is_fast_forward(repo, old, new):
+    try:
+        old_tip = repo[old].peel(pygit2.Commit).id
+        new_tip = repo[new].peel(pygit2.Commit).id
+    except (KeyError, ValueError, pygit2.GitError):
+        return False
+    return old_tip == new_tip or repo.descendant_of(new_tip, old_tip)
+
+
+def check_push(repo, rule_set, updates, can_manage):
+    """
+    Returns why updates, [(old, new, ref_name)], break rule_set, one message
+    per refused ref, or [] when the push is allowed. can_manage is whether
+    the pusher manages the project. repo has to see the pushed objects and
+    the refs as they were before the push.
+    """
+    errors = []
+    for old, new, ref_name in updates:
+        restrictions = rule_set.restrictions(ref_name)
+        if not restrictions:
+            continue
+
+        if RESTRICT_PUSHES in restrictions and not can_manage:
+            errors.append(f"{ref_name}: only maintainers can push to it")
+        elif new == ZERO_OID:
+            if NO_DELETIONS in restrictions:
+                errors.append(f"{ref_name}: it cannot be deleted")
+        elif old != ZERO_OID and NO_FORCE_PUSHES in restrictions and (
+            ref_name.startswith(TAG_PREFIX) or not _is_fast_forward(repo, old, new)
+        ):
+            errors.append(f"{ref_name}: it cannot be force-pushed or moved")
+        elif LINEAR_HISTORY in restrictions:
+            # Only old is hidden: a merge pushed to another ref first would
+            # otherwise reach this one by a fast-forward
+            update = [(old, new, ref_name)]
+            for commit in iter_pushed_commits(repo, update, previous_tips=[]):
+                if len(commit.parent_ids) > 1:
+                    errors.append(
+                        f"{ref_name}: merge commit {commit.id} breaks the "
+                        "required linear history"
+                    )
+                    break
+    return errors
+
+
+def check_quarantined_push(
+    repo_path, object_directory, rule_set, updates, can_manage
+):
+    """
+    check_push() from a pre-receive hook: the pushed objects are still in
+    object_directory, receive-pack's quarantine, next to the repository's.
+    """
+    repo = pygit2.Repository(repo_path)
+    try:
+        if object_directory:
+            repo.odb.add_disk_alternate(object_directory)
+        return check_push(repo, rule_set, updates, can_manage)
+    finally:
+        repo.free()
@@ -0,0 +1,89 @@
+"""
+Ref snapshot cache.
+
+A snapshot holds every branch, tag and HEAD of a repository. It is stored in
+the Django cache (Redis) under a key carrying a per-repository ref-state
+version, so invalidating after a push is a single counter bump: readers
+switch to the new version key and load it lazily on the first miss, while
+the old snapshot simply ages out.
+"""
+
+import time
+
+import pygit2
+from django.conf import settings
+from django.core.cache import cache
+
+BRANCH_PREFIX = "refs/heads/"
+TAG_PREFIX = "refs/tags/"
+ZERO_OID = "0" * 40
+
+
+def read_ref_snapshot(repo):
+    """
+    Walks the refs of repo once and returns a snapshot dict:
+        head     — short name of the branch HEAD points to (None when detached)
+        branches — {short_name: target_oid}, sorted by name
+        tags     — {short_name: target_oid}, sorted by name
+    """
+    branches = {}
+    tags = {}
+
+    for ref in repo.references.iterator():
+        if not isinstance(ref.target, pygit2.Oid):
+            continue
+
+        if ref.name.startswith(BRANCH_PREFIX):
+            branches[ref.name.removeprefix(BRANCH_PREFIX)] = str(ref.target)
+        elif ref.name.startswith(TAG_PREFIX):
+            tags[ref.name.removeprefix(TAG_PREFIX)] = str(ref.target)
+
+    head = None
+    head_ref = repo.references.get("HEAD")
+    if head_ref is not None and isinstance(head_ref.target, str):
+        head = head_ref.target.removeprefix(BRANCH_PREFIX)
+
+    return {
+        "head": head,
+        "branches": dict(sorted(branches.items())),
+        "tags": dict(sorted(tags.items())),
+    }
+
+
+class RefCache:
+    def __init__(self, repository):
+        self.repository = repository
+        self.key = f"refs:{repository.pk}"
+
+    @property
+    def version_key(self):
+        return f"{self.key}:version"
+
+    def snapshot_key(self, version):
+        return f"{self.key}:v{version}"
+
+    def _version(self):
+        # Versions start from the clock, so one evicted from the cache is
+        # never confused with an earlier one
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self):
+        version = self._version()
+        snapshot = cache.get(self.snapshot_key(version))
+        if snapshot is None:
+            with self.repository.open() as repo:
+                snapshot = read_ref_snapshot(repo)
+            cache.set(
+                self.snapshot_key(version),
+                snapshot,
+                timeout=settings.GIT_REF_CACHE_TIMEOUT,
+            )
+        return snapshot
+
+    def invalidate(self):
+        cache.add(self.version_key, time.time_ns(), timeout=None)
+        cache.incr(self.version_key)
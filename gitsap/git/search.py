@@ -0,0 +1,568 @@
+"""
+Trigram code search over the default branch.
+
+Every repository keeps its index next to its objects, in <repo>/search:
+
+    manifest.json     indexed commit, live segments and the next file id
+    docs.sqlite3      one row per indexed file: id, path and blob OID
+    seg-<n>.idx       immutable segment
+    lock              held by the one process updating the index
+
+A segment maps every trigram (three bytes, ASCII lowercased) found in its
+files to the ids of those files. It holds a sorted table of trigrams, the
+length and offset of each one's posting list, and the posting lists as
+delta encoded uint32 arrays compressed with zlib. Segments are read
+through mmap, so a query only touches the pages of the trigrams it needs.
+
+An update diffs the indexed tree against the new one and writes the files
+whose blob changed to a new segment. Ids only grow, so segments are
+simply appended. Removed and replaced files leave docs.sqlite3 at once and
+the posting lists at the next merge, which rewrites every segment into one
+when there are too many of them or too many dead ids.
+
+A query is a regular expression. The literal strings any match must
+contain become an AND/OR tree of trigrams, which is evaluated on the
+posting lists, rarest trigram first and only until few candidates are
+left. Only those files are read and matched.
+"""
+
+import fcntl
+import heapq
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+
+# The stdlib regular expression parser, to see which literals a pattern needs
+from re import _constants as sre
+from re import _parser as sre_parse
+
+import pygit2
+from django.conf import settings
+
+INDEX_DIR = "search"
+MAGIC = b"GSTRI001"
+HEADER = struct.Struct("=8sI4x")
+# git's heuristic: a NUL byte in the first 8000 bytes means binary
+BINARY_CHECK_SIZE = 8000
+FILE_MODES = (pygit2.GIT_FILEMODE_BLOB, pygit2.GIT_FILEMODE_BLOB_EXECUTABLE)
+# Candidate ids looked up in docs.sqlite3 per statement
+ID_BATCH_SIZE = 500
+# Intersecting stops at this many candidates, reading them beats decoding
+# the longer posting lists left
+CANDIDATE_TARGET = 1000
+MAX_LINES_PER_FILE = 5
+# Reads of the manifest by a search whose segments a merge keeps deleting
+OPEN_ATTEMPTS = 3
+
+
+class QueryTooBroad(ValueError):
+    """The pattern requires no trigram, so every file would be a candidate."""
+
+
+def _trigrams(data):
+    data = data.lower()
+    # Slicing first keeps the conversion to the distinct trigrams
+    grams = {data[i : i + 3] for i in range(len(data) - 2)}
+    return [int.from_bytes(gram, "big") for gram in grams]
+
+
+def _encode(ids):
+    deltas = array("I", ids)
+    for i in range(len(deltas) - 1, 0, -1):
+        deltas[i] -= deltas[i - 1]
+    return zlib.compress(deltas.tobytes())
+
+
+def _decode(data):
+    deltas = array("I")
+    deltas.frombytes(zlib.decompress(data))
+    return accumulate(deltas)
+
+
+class _SegmentWriter:
+    """Writes a segment from posting lists added in trigram order."""
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = array("I")
+        self.counts = array("I")
+        self.offsets = array("Q", [0])
+        self.postings = tempfile.TemporaryFile(dir=os.path.dirname(path))
+
+    def add(self, trigram, ids):
+        data = _encode(ids)
+        self.keys.append(trigram)
+        self.counts.append(len(ids))
+        self.offsets.append(self.offsets[-1] + len(data))
+        self.postings.write(data)
+
+    def close(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as segment:
+            segment.write(HEADER.pack(MAGIC, len(self.keys)))
+            # Two uint32 tables keep the offsets table 8-byte aligned
+            segment.write(self.keys.tobytes())
+            segment.write(self.counts.tobytes())
+            segment.write(self.offsets.tobytes())
+            self.postings.seek(0)
+            while chunk := self.postings.read(1024 * 1024):
+                segment.write(chunk)
+            segment.flush()
+            os.fsync(segment.fileno())
+        self.postings.close()
+        os.rename(tmp_path, self.path)
+
+
+class _Segment:
+    def __init__(self, path):
+        with open(path, "rb") as segment:
+            self._map = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a search segment: {path}")
+
+        self._view = memoryview(self._map)
+        start = HEADER.size
+        self.keys = self._view[start : start + 4 * count].cast("I")
+        start += 4 * count
+        self.counts = self._view[start : start + 4 * count].cast("I")
+        start += 4 * count
+        self.offsets = self._view[start : start + 8 * (count + 1)].cast("Q")
+        self.base = start + 8 * (count + 1)
+
+    def _find(self, trigram):
+        i = bisect_left(self.keys, trigram)
+        return i if i < len(self.keys) and self.keys[i] == trigram else None
+
+    def size(self, trigram):
+        """Length of the posting list, read without decoding it."""
+        i = self._find(trigram)
+        return 0 if i is None else self.counts[i]
+
+    def raw(self, i):
+        return self._map[self.base + self.offsets[i] : self.base + self.offsets[i + 1]]
+
+    def postings(self, trigram):
+        i = self._find(trigram)
+        return () if i is None else _decode(self.raw(i))
+
+    def close(self):
+        self.keys.release()
+        self.counts.release()
+        self.offsets.release()
+        self._view.release()
+        self._map.close()
+
+
+def trigram_query(pattern, ignore_case=False):
+    """
+    The trigrams a match of pattern must contain, as a tree of ("tri", int),
+    ("and", [...]) and ("or", [...]) nodes. ("and", []) requires nothing.
+    Raises re.error for invalid patterns.
+    """
+    parsed = sre_parse.parse(pattern)
+    return _query(parsed, ignore_case or bool(parsed.state.flags & re.IGNORECASE))
+
+
+def _query(items, ignore_case):
+    ands = []
+    literal = bytearray()
+
+    def flush():
+        if len(literal) >= 3:
+            grams = {bytes(literal[i : i + 3]).lower() for i in range(len(literal) - 2)}
+            ands.extend(("tri", int.from_bytes(gram, "big")) for gram in grams)
+        literal.clear()
+
+    for op, av in items:
+        if op is sre.LITERAL:
+            char = chr(av)
+            # Only ASCII is lowercased in the index, other letters may differ
+            if ignore_case and not char.isascii() and char.lower() != char.upper():
+                flush()
+            else:
+                literal.extend(char.encode())
+        elif op is sre.AT:
+            # Anchors match no characters, so literals continue across them
+            continue
+        elif op is sre.SUBPATTERN:
+            flush()
+            _, add_flags, _, sub = av
+            ands.append(_query(sub, ignore_case or bool(add_flags & re.IGNORECASE)))
+        elif op is sre.ATOMIC_GROUP:
+            flush()
+            ands.append(_query(av, ignore_case))
+        elif op is sre.BRANCH:
+            flush()
+            ands.append(("or", [_query(branch, ignore_case) for branch in av[1]]))
+        elif op in (sre.MAX_REPEAT, sre.MIN_REPEAT, sre.POSSESSIVE_REPEAT):
+            flush()
+            low, _, sub = av
+            if low >= 1:
+                ands.append(_query(sub, ignore_case))
+        else:
+            flush()
+    flush()
+
+    return _simplify(("and", ands))
+
+
+def _simplify(node):
+    kind, value = node
+    if kind == "tri":
+        return node
+
+    children = [_simplify(child) for child in value]
+    if kind == "or":
+        # A branch requiring nothing lets the whole alternation match anything
+        if any(child == ("and", []) for child in children):
+            return ("and", [])
+        return children[0] if len(children) == 1 else ("or", children)
+
+    flat = []
+    for child in children:
+        flat.extend(child[1] if child[0] == "and" else [child])
+    return flat[0] if len(flat) == 1 else ("and", flat)
+
+
+def _evaluate(node, segment):
+    """Ids of segment matching node, or None when node requires nothing."""
+    kind, value = node
+    if kind == "tri":
+        return set(segment.postings(value))
+
+    if kind == "or":
+        ids = set()
+        for child in value:
+            child_ids = _evaluate(child, segment)
+            if child_ids is None:
+                return None
+            ids |= child_ids
+        return ids
+
+    # Rarest trigrams first, so the intersection shrinks early
+    ids = None
+    children = sorted(
+        value,
+        key=lambda child: segment.size(child[1]) if child[0] == "tri" else float("inf"),
+    )
+    for child in children:
+        child_ids = _evaluate(child, segment)
+        if child_ids is None:
+            continue
+        ids = child_ids if ids is None else ids & child_ids
+        if len(ids) <= CANDIDATE_TARGET:
+            break
+    return ids
+
+
+class SearchIndex:
+    def __init__(self, root):
+        self.root = root
+
+    @classmethod
+    def for_repository(cls, repository):
+        return cls(os.path.join(repository.repo_path, INDEX_DIR))
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._path("manifest.json")) as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            return {
+                "commit": None,
+                "segments": [],
+                "next_segment": 1,
+                "next_id": 1,
+                "postings": 0,
+            }
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._path("manifest.json.tmp")
+        with open(tmp_path, "w") as tmp:
+            json.dump(manifest, tmp)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.rename(tmp_path, self._path("manifest.json"))
+
+    def _connect(self):
+        db = sqlite3.connect(self._path("docs.sqlite3"))
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS docs "
+            "(id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, oid BLOB NOT NULL)"
+        )
+        return db
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path("lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def update(self, repo, commit_oid):
+        """
+        Brings the index to commit_oid, reindexing only the files whose blob
+        changed since the indexed commit. Returns (indexed, removed) file
+        counts.
+        """
+        with self._lock():
+            manifest = self.read_manifest()
+            if manifest["commit"] == commit_oid:
+                return 0, 0
+
+            tree = repo[commit_oid].peel(pygit2.Commit).tree
+            old_tree = None
+            if manifest["commit"]:
+                try:
+                    old_tree = repo[manifest["commit"]].peel(pygit2.Commit).tree
+                except KeyError:
+                    # Force-pushed away and garbage collected since, nothing
+                    # to diff against: every file is indexed again
+                    pass
+
+            db = self._connect()
+            try:
+                if old_tree is not None:
+                    removed, added = self._changes(old_tree, tree)
+                else:
+                    removed = [path for path, in db.execute("SELECT path FROM docs")]
+                    added = self._files(tree)
+                for start in range(0, len(removed), ID_BATCH_SIZE):
+                    db.executemany(
+                        "DELETE FROM docs WHERE path = ?",
+                        [(path,) for path in removed[start : start + ID_BATCH_SIZE]],
+                    )
+                indexed = self._index(repo, db, manifest, added)
+                # Rows first: a segment listed in the manifest has its files
+                db.commit()
+                manifest["commit"] = commit_oid
+                self._write_manifest(manifest)
+
+                live = db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+                if (
+                    len(manifest["segments"]) > settings.GIT_SEARCH_MAX_SEGMENTS
+                    or live < manifest["postings"] * 0.75
+                ):
+                    self._merge(db, manifest)
+            finally:
+                db.close()
+
+            self._remove_unlisted(manifest)
+            return indexed, len(removed)
+
+    def _changes(self, old_tree, tree):
+        """Paths to drop and (path, oid) to index between two trees."""
+        removed, added = [], []
+        for delta in old_tree.diff_to_tree(tree).deltas:
+            if delta.old_file.mode in FILE_MODES:
+                removed.append(delta.old_file.path)
+            if delta.new_file.mode in FILE_MODES:
+                added.append((delta.new_file.path, delta.new_file.id))
+        return removed, added
+
+    def _files(self, tree):
+        files = []
+        stack = [("", tree)]
+        while stack:
+            prefix, tree = stack.pop()
+            for entry in tree:
+                if entry.type_str == "tree":
+                    stack.append((f"{prefix}{entry.name}/", entry))
+                elif entry.filemode in FILE_MODES:
+                    files.append((f"{prefix}{entry.name}", entry.id))
+        return files
+
+    def _index(self, repo, db, manifest, files):
+        """Indexes files into new segments of up to GIT_SEARCH_SEGMENT_SIZE files."""
+        indexed = 0
+        for start in range(0, len(files), settings.GIT_SEARCH_SEGMENT_SIZE):
+            postings = {}
+            rows = []
+            for path, oid in files[start : start + settings.GIT_SEARCH_SEGMENT_SIZE]:
+                _, size = repo.odb.read_header(oid)
+                if size > settings.GIT_SEARCH_MAX_FILE_SIZE:
+                    continue
+                data = repo[oid].data
+                if b"\0" in data[:BINARY_CHECK_SIZE]:
+                    continue
+
+                doc_id = manifest["next_id"]
+                manifest["next_id"] += 1
+                rows.append((doc_id, path, oid.raw))
+                for trigram in _trigrams(data):
+                    ids = postings.get(trigram)
+                    if ids is None:
+                        ids = postings[trigram] = array("I")
+                    ids.append(doc_id)
+
+            if not rows:
+                continue
+
+            name = self._next_segment(manifest)
+            writer = _SegmentWriter(self._path(name))
+            for trigram in sorted(postings):
+                writer.add(trigram, postings[trigram])
+            writer.close()
+
+            # A path indexed before and not removed is replaced
+            db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?)", rows)
+            manifest["segments"].append(name)
+            manifest["postings"] += len(rows)
+            indexed += len(rows)
+        return indexed
+
+    def _merge(self, db, manifest):
+        """Rewrites every segment into one, dropping the ids of removed files."""
+        live = {row[0] for row in db.execute("SELECT id FROM docs")}
+        segments = [_Segment(self._path(name)) for name in manifest["segments"]]
+        name = self._next_segment(manifest)
+        try:
+            writer = _SegmentWriter(self._path(name))
+            # Ids grow from one segment to the next, so concatenating their
+            # lists in segment order keeps every list sorted
+            keys = heapq.merge(
+                *(_keys(n, segment) for n, segment in enumerate(segments))
+            )
+            current, ids = None, []
+            for key, n, i in keys:
+                if key != current:
+                    if ids:
+                        writer.add(current, ids)
+                    current, ids = key, []
+                ids.extend(id for id in _decode(segments[n].raw(i)) if id in live)
+            if ids:
+                writer.add(current, ids)
+            writer.close()
+        finally:
+            for segment in segments:
+                segment.close()
+
+        manifest["segments"] = [name]
+        manifest["postings"] = len(live)
+        self._write_manifest(manifest)
+
+    def _next_segment(self, manifest):
+        manifest["next_segment"] += 1
+        return f"seg-{manifest['next_segment'] - 1:06d}.idx"
+
+    def _remove_unlisted(self, manifest):
+        """Deletes merged segments and those of interrupted updates."""
+        listed = set(manifest["segments"])
+        for name in os.listdir(self.root):
+            if name.startswith("seg-") and name not in listed:
+                os.remove(self._path(name))
+
+    def _open_segments(self):
+        """
+        The manifest and its segments, opened. Searches do not take the
+        lock, so a merge can delete the segments of the manifest read
+        before they are opened: the manifest is then read again, listing
+        the merged segment. Once open, a segment stays readable.
+        """
+        for attempt in range(OPEN_ATTEMPTS):
+            manifest = self.read_manifest()
+            segments = []
+            try:
+                for name in manifest["segments"]:
+                    segments.append(_Segment(self._path(name)))
+                return manifest, segments
+            except FileNotFoundError:
+                for segment in segments:
+                    segment.close()
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+
+    def search(self, repo, pattern, ignore_case=False, limit=50):
+        """
+        Files at the indexed commit matching pattern: the first limit found
+        in index order, sorted by path. Returns None before the first
+        update. Raises re.error for invalid patterns and QueryTooBroad when
+        the index cannot narrow the candidates.
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        regex = re.compile(pattern, flags)
+        query = trigram_query(pattern, ignore_case)
+        if query == ("and", []):
+            raise QueryTooBroad(pattern)
+
+        manifest, segments = self._open_segments()
+        # The index is checked before any blob is read
+        candidates = set()
+        try:
+            if manifest["commit"] is None:
+                return None
+            for segment in segments:
+                candidates |= _evaluate(query, segment) or set()
+        finally:
+            for segment in segments:
+                segment.close()
+
+        results = {
+            "commit": manifest["commit"],
+            "candidates": len(candidates),
+            "files": [],
+            "truncated": False,
+        }
+        # Files are read in index order until limit match, then sorted
+        for path, oid in self._docs(sorted(candidates)):
+            if len(results["files"]) >= limit:
+                results["truncated"] = True
+                break
+            lines = _match_lines(regex, repo[pygit2.Oid(raw=oid)].data)
+            if lines:
+                results["files"].append({"path": path, "lines": lines})
+        results["files"].sort(key=lambda file: file["path"])
+        return results
+
+    def _docs(self, ids):
+        """(path, oid) of the live files among ids, in id order."""
+        db = self._connect()
+        try:
+            for start in range(0, len(ids), ID_BATCH_SIZE):
+                batch = ids[start : start + ID_BATCH_SIZE]
+                yield from db.execute(
+                    "SELECT path, oid FROM docs WHERE id IN "
+                    f"({', '.join('?' * len(batch))}) ORDER BY id",
+                    batch,
+                )
+        finally:
+            db.close()
+
+
+def _keys(n, segment):
+    """(trigram, n, i) of the keys of segment n, for merging segments."""
+    for i, key in enumerate(segment.keys):
+        yield key, n, i
+
+
+def _match_lines(regex, data):
+    """(line number, line) of the first lines of data regex matches in."""
+    text = data.decode("utf-8", "replace")
+    lines = []
+    number, position = 1, 0
+    for match in regex.finditer(text):
+        number += text.count("\n", position, match.start())
+        position = match.start()
+        if lines and lines[-1][0] == number:
+            continue
+        start = text.rfind("\n", 0, match.start()) + 1
+        end = text.find("\n", match.start())
+        lines.append((number, text[start : end if end != -1 else len(text)]))
+        if len(lines) >= MAX_LINES_PER_FILE:
+            break
+    return lines
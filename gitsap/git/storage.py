@@ -0,0 +1,216 @@
+"""
+On-disk layout of bare repositories across the storage shards.
+
+Every shard in GIT_STORAGE_SHARDS is a root directory, usually a volume of
+its own. A new repository goes to the shard picked by GIT_STORAGE_PLACEMENT
+and lives at <root>/<id[-2:]>/<project id>.git, so renaming its namespace
+never touches the disk. Repositories created before sharding keep their
+<GIT_REPO_BASE>/<namespace>.git path in the "default" shard until moved.
+
+Initializing a repository (directory tree, config, HEAD, hooks) costs
+several filesystem round trips, so a few spares are kept ready under
+<root>/.spare of every shard and claimed with a single rename(2) into their
+final location. A spare is only visible once fully initialized: it is built
+under a temporary name and renamed into the spare directory as the last
+step, so a claim never sees a half-written repository.
+
+A repository is moved between shards by copying it into <root>/.moving of
+the target while it stays online, then copying what changed meanwhile and
+renaming it into place while pushes are locked out (Repository.move_to).
+"""
+
+import os
+import random
+import shutil
+import time
+
+import pygit2
+from django.conf import settings
+
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.utils.generator import generate_ulid
+
+SPARE_DIR = ".spare"
+MOVING_DIR = ".moving"
+TMP_PREFIX = "tmp-"
+# Paths of a repository holding its refs: small files rewritten on every
+# push, possibly to the same size within one timestamp tick
+REF_PATHS = ("HEAD", "packed-refs", "refs")
+# A spare still under its temporary name after this long was abandoned
+STALE_SPARE_AGE = 60 * 60
+
+
+def shard_root(shard):
+    return settings.GIT_STORAGE_SHARDS[shard]["path"]
+
+
+def spare_root(shard):
+    return os.path.join(shard_root(shard), SPARE_DIR)
+
+
+def repo_path_for(shard, project_id):
+    return os.path.join(shard_root(shard), project_id[-2:], f"{project_id}.git")
+
+
+def choose_shard():
+    """
+    The shard a new repository goes to. With GIT_STORAGE_PLACEMENT
+    "free_space", the one with the most free bytes times its weight,
+    otherwise a random one in proportion to the weights. Shards of weight 0
+    take no new repositories.
+    """
+    shards = {
+        name: shard["weight"]
+        for name, shard in settings.GIT_STORAGE_SHARDS.items()
+        if shard["weight"] > 0
+    }
+    if settings.GIT_STORAGE_PLACEMENT == "free_space":
+        return max(
+            shards,
+            key=lambda name: shutil.disk_usage(shard_root(name)).free * shards[name],
+        )
+    return random.choices(list(shards), weights=list(shards.values()))[0]
+
+
+def init_bare(path, default_branch):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return pygit2.init_repository(
+        path, bare=True, initial_head=f"{BRANCH_PREFIX}{default_branch}"
+    )
+
+
+def _set_head(path, default_branch):
+    # HEAD of a fresh repository is unborn, so write the symbolic ref directly
+    with open(os.path.join(path, "HEAD"), "w") as head:
+        head.write(f"ref: {BRANCH_PREFIX}{default_branch}\n")
+
+
+def create_spare(shard):
+    """Initializes one spare repository in shard and returns its path."""
+    root = spare_root(shard)
+    name = generate_ulid().lower()
+    tmp_path = os.path.join(root, f"{TMP_PREFIX}{name}")
+    path = os.path.join(root, f"{name}.git")
+
+    os.makedirs(root, exist_ok=True)
+    pygit2.init_repository(tmp_path, bare=True)
+    os.rename(tmp_path, path)
+    return path
+
+
+def list_spares(shard):
+    try:
+        names = os.listdir(spare_root(shard))
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.endswith(".git"))
+
+
+def claim_spare(shard, path, default_branch):
+    """
+    Moves a spare repository of shard to path. Returns False when no spare
+    is left, in which case the caller initializes path itself.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    for name in list_spares(shard):
+        try:
+            # Spares and repositories share a filesystem, so this is atomic
+            # and two workers can never claim the same spare
+            os.rename(os.path.join(spare_root(shard), name), path)
+        except FileNotFoundError:
+            continue
+        _set_head(path, default_branch)
+        return True
+
+    return False
+
+
+def iter_repo_paths(shard):
+    """
+    Yields the path of every repository on disk in shard, spares and
+    repositories being moved in excluded.
+    """
+    base = shard_root(shard)
+    for dirpath, dirnames, _ in os.walk(base):
+        if dirpath == base:
+            for name in (SPARE_DIR, MOVING_DIR):
+                if name in dirnames:
+                    dirnames.remove(name)
+
+        repos = [name for name in dirnames if name.endswith(".git")]
+        for name in repos:
+            yield os.path.join(dirpath, name)
+            # Never descend into a repository
+            dirnames.remove(name)
+
+
+def remove_stale_spares(shard):
+    """Deletes spares of shard left half-built by an interrupted worker."""
+    removed = 0
+    try:
+        names = os.listdir(spare_root(shard))
+    except FileNotFoundError:
+        return removed
+
+    cutoff = time.time() - STALE_SPARE_AGE
+    for name in names:
+        path = os.path.join(spare_root(shard), name)
+        if name.startswith(TMP_PREFIX) and os.stat(path).st_mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def moving_path_for(shard, project_id):
+    return os.path.join(shard_root(shard), MOVING_DIR, f"{project_id}.git")
+
+
+def sync_tree(source, target, always=()):
+    """
+    Makes target a copy of the directory source, copying only the files
+    whose size or modification time differ and deleting the ones source no
+    longer has. Files under the paths always, relative to source, are
+    copied whatever their size and time. Returns the number of files
+    copied. Files that vanish while source is being copied are skipped, a
+    later pass catches up.
+    """
+    copied = 0
+    os.makedirs(target, exist_ok=True)
+    for dirpath, dirnames, filenames in os.walk(source):
+        relative = os.path.relpath(dirpath, source)
+        target_dir = os.path.normpath(os.path.join(target, relative))
+        forced = any(
+            relative == path or relative.startswith(path + os.sep) for path in always
+        )
+        os.makedirs(target_dir, exist_ok=True)
+
+        for name in set(os.listdir(target_dir)) - set(dirnames) - set(filenames):
+            path = os.path.join(target_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+
+        for name in filenames:
+            source_path = os.path.join(dirpath, name)
+            target_path = os.path.join(target_dir, name)
+            path = os.path.normpath(os.path.join(relative, name))
+            compare = not forced and path not in always
+            try:
+                stat = os.stat(source_path)
+                try:
+                    current = os.stat(target_path)
+                    if compare and (current.st_size, current.st_mtime_ns) == (
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    ):
+                        continue
+                except FileNotFoundError:
+                    pass
+                # Keeps the modification time, which the next pass compares
+                shutil.copy2(source_path, target_path)
+            except FileNotFoundError:
+                continue
+            copied += 1
+    return copied
@@ -0,0 +1,581 @@
+"""
+Smart HTTP transport for Git.
+
+Serves ``{namespace}.git/info/refs``, ``git-upload-pack`` and
+``git-receive-pack`` at the ASGI layer, in front of Django, so pack data is
+piped between the client and a ``git --stateless-rpc`` subprocess chunk by
+chunk. Every write waits for the other side to drain, which gives
+backpressure in both directions and keeps memory flat regardless of pack size.
+
+Pushes to a project with protection rules run receive-pack with the
+pre-receive hook of gitsap/git/hooks, which relays the ref updates back over
+a Unix socket served for the duration of the push, and gets the verdict of
+gitsap.git.protection.
+"""
+
+import asyncio
+import base64
+import contextlib
+import json
+import logging
+import os
+import re
+import tempfile
+import zlib
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+
+from gitsap.access import resolve_project_access
+from gitsap.git import protection
+from gitsap.git.commits import ref_tips
+from gitsap.git.executor import run_git
+from gitsap.git.maintenance import RepositoryLock
+from gitsap.mixins import ProjectAccessMixin, can_manage, can_write
+from gitsap.models import User, Repository
+from gitsap.signals import post_receive
+
+logger = logging.getLogger(__name__)
+
+GIT_PATH_RE = re.compile(
+    r"^/(?P<namespace>[^/]+/[^/]+)\.git/"
+    r"(?P<endpoint>info/refs|git-upload-pack|git-receive-pack)$"
+)
+
+UPLOAD_PACK = "git-upload-pack"
+RECEIVE_PACK = "git-receive-pack"
+SERVICES = (UPLOAD_PACK, RECEIVE_PACK)
+
+NO_CACHE_HEADERS = [
+    (b"cache-control", b"no-cache, max-age=0, must-revalidate"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"Fri, 01 Jan 1980 00:00:00 GMT"),
+]
+
+MAX_STDERR_BYTES = 64 * 1024
+# Environment variable telling the pre-receive hook where to relay updates
+PRE_RECEIVE_SOCKET_ENV = "GITSAP_PRE_RECEIVE_SOCKET"
+# Seconds between attempts to lock a repository under maintenance for a push
+PUSH_LOCK_INTERVAL = 0.5
+
+
+class GitRequest:
+    """
+    Request stand-in handed to ProjectAccessMixin.check_project_access, which
+    only reads ``user`` and attaches the permission context.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.organization_role = None
+        self.project_role = None
+
+    @property
+    def can_write(self):
+        return can_write(self)
+
+    @property
+    def can_manage(self):
+        return can_manage(self)
+
+
+class RefUpdateParser:
+    """
+    Collects the ``<old> <new> <ref>`` commands that head a receive-pack
+    request. Bytes are only inspected, never held back: once the flush packet
+    ending the command list is seen, the parser ignores the pack that follows.
+    """
+
+    def __init__(self):
+        self.updates = []
+        self.done = False
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        if self.done:
+            return
+
+        self._buffer += data
+        while len(self._buffer) >= 4:
+            try:
+                length = int(self._buffer[:4], 16)
+            except ValueError:
+                length = -1
+
+            if length < 4:
+                # Flush packet (or garbage) terminates the command list
+                self.done = True
+                self._buffer.clear()
+                return
+
+            if len(self._buffer) < length:
+                return
+
+            line = bytes(self._buffer[4:length])
+            del self._buffer[:length]
+            self._parse_line(line)
+
+    def _parse_line(self, line):
+        command = line.split(b"\0", 1)[0].rstrip(b"\n")
+        parts = command.split(b" ")
+        if len(parts) != 3 or len(parts[0]) != len(parts[1]):
+            # shallow / push-cert lines
+            return
+
+        old, new, ref = (part.decode("utf-8", "replace") for part in parts)
+        self.updates.append((old, new, ref))
+
+
+def _authenticate(headers):
+    authorization = headers.get(b"authorization", b"")
+    if not authorization.startswith(b"Basic "):
+        return AnonymousUser()
+
+    try:
+        credentials = base64.b64decode(authorization[6:]).decode()
+    except (ValueError, UnicodeDecodeError):
+        return AnonymousUser()
+
+    username, _, password = credentials.partition(":")
+    user = User.objects.filter(username=username, deactivated_at__isnull=True).first()
+    if user is None or not user.check_password(password):
+        return AnonymousUser()
+
+    return user
+
+
+def _authorize(headers, namespace, service):
+    """
+    Resolves the repository behind namespace and checks that the caller may
+    run service against it. Returns (status, repository, request), request
+    being the GitRequest carrying the caller's roles.
+    """
+    user = _authenticate(headers)
+    access = resolve_project_access(user, namespace)
+    if access is None:
+        return HTTPStatus.NOT_FOUND, None, None
+
+    try:
+        repository = access.project.repository
+    except Repository.DoesNotExist:
+        return HTTPStatus.NOT_FOUND, None, None
+
+    request = GitRequest(user)
+    allowed = ProjectAccessMixin.check_project_access(request, access)
+    if allowed is None:
+        return HTTPStatus.UNAUTHORIZED, None, None
+    if not allowed:
+        return HTTPStatus.FORBIDDEN, None, None
+
+    if service == RECEIVE_PACK and not request.can_write:
+        if not request.user.is_authenticated:
+            return HTTPStatus.UNAUTHORIZED, None, None
+        return HTTPStatus.FORBIDDEN, None, None
+
+    # Only once access is settled, so this does not reveal private projects
+    if not repository.is_provisioned:
+        return HTTPStatus.SERVICE_UNAVAILABLE, None, None
+
+    return HTTPStatus.OK, repository, request
+
+
+def _ref_tips(repository):
+    with repository.open() as repo:
+        return ref_tips(repo)
+
+
+def _post_receive(repository, updates, previous_tips):
+    """
+    Keeps the updates receive-pack actually applied (hooks or a stale old oid
+    can reject some) and announces them through the post_receive signal,
+    along with previous_tips, the ref tips recorded before the push.
+    """
+    applied = []
+    with repository.open() as repo:
+        for old, new, ref_name in updates:
+            ref = repo.references.get(ref_name)
+            current = str(ref.target) if ref is not None else Repository.ZERO_OID
+            if current == new:
+                applied.append((old, new, ref_name))
+
+    if applied:
+        post_receive.send(
+            sender=Repository,
+            repository=repository,
+            updates=applied,
+            previous_tips=previous_tips,
+        )
+
+
+async def _lock_for_push(repository):
+    """
+    The repository's lock, held shared, once no maintenance or move holds
+    it. None when one still does after GIT_MAINTENANCE_PUSH_WAIT seconds. A
+    repository moved to another shard meanwhile is followed there.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.GIT_MAINTENANCE_PUSH_WAIT
+    while True:
+        lock = RepositoryLock(repository.repo_path)
+        if lock.acquire(shared=True):
+            repo_path = await Repository.objects.values_list(
+                "repo_path", flat=True
+            ).aget(pk=repository.pk)
+            if repo_path == repository.repo_path:
+                return lock
+            lock.release()
+            repository.repo_path = repo_path
+            continue
+        if loop.time() >= deadline:
+            return None
+        await asyncio.sleep(PUSH_LOCK_INTERVAL)
+
+
+@contextlib.asynccontextmanager
+async def _pre_receive_gate(repository, rule_set, can_manage):
+    """
+    Serves the pre-receive hook of one push on a Unix socket, whose path it
+    yields. The hook sends a JSON header naming the quarantine directory of
+    the pushed objects, then its ref updates; it gets back {"errors": [...]},
+    the refused refs, and refuses the whole push when there are any.
+    """
+
+    async def check(reader, writer):
+        try:
+            header = json.loads(await reader.readline())
+            updates = []
+            while line := await reader.readline():
+                parts = line.decode("utf-8", "replace").split()
+                if len(parts) == 3:
+                    updates.append(tuple(parts))
+            errors = await run_git(
+                protection.check_quarantined_push,
+                repository.repo_path,
+                header.get("object_directory"),
+                rule_set,
+                updates,
+                can_manage,
+            )
+        except Exception:
+            logger.exception("Checking the protection rules of a push failed")
+            errors = ["the protection rules could not be checked"]
+        try:
+            writer.write(json.dumps({"errors": errors}).encode())
+            await writer.drain()
+        finally:
+            writer.close()
+
+    with tempfile.TemporaryDirectory(prefix="gitsap-push-") as directory:
+        path = os.path.join(directory, "pre-receive.sock")
+        server = await asyncio.start_unix_server(check, path)
+        try:
+            yield path
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+def _pkt_line(data):
+    return f"{len(data) + 4:04x}".encode() + data
+
+
+async def _drain(stream, limit=MAX_STDERR_BYTES):
+    """Reads stream to EOF, keeping only its last limit bytes."""
+    tail = b""
+    while chunk := await stream.read(limit):
+        tail = (tail + chunk)[-limit:]
+    return tail
+
+
+def _kill(process):
+    with contextlib.suppress(ProcessLookupError):
+        process.kill()
+
+
+class GitHTTPApplication:
+    """
+    ASGI application answering the Git smart HTTP endpoints and delegating
+    every other request to the wrapped Django application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            match = GIT_PATH_RE.match(scope["path"])
+            if match:
+                return await self.handle(scope, receive, send, **match.groupdict())
+
+        return await self.application(scope, receive, send)
+
+    async def handle(self, scope, receive, send, namespace, endpoint):
+        method = scope["method"]
+        headers = dict(scope["headers"])
+
+        if endpoint == "info/refs":
+            if method not in ("GET", "HEAD"):
+                return await self.send_status(send, HTTPStatus.METHOD_NOT_ALLOWED)
+            query = parse_qs(scope["query_string"].decode())
+            service = query.get("service", [None])[0]
+            if service not in SERVICES:
+                # The dumb protocol is not supported
+                return await self.send_status(send, HTTPStatus.FORBIDDEN)
+        else:
+            if method != "POST":
+                return await self.send_status(send, HTTPStatus.METHOD_NOT_ALLOWED)
+            service = endpoint
+
+        status, repository, request = await sync_to_async(_authorize)(
+            headers, namespace, service
+        )
+        if status != HTTPStatus.OK:
+            return await self.send_status(send, status)
+
+        env = os.environ.copy()
+        git_protocol = headers.get(b"git-protocol", b"").decode()
+        if git_protocol:
+            env["GIT_PROTOCOL"] = git_protocol
+
+        if endpoint == "info/refs":
+            await self.advertise_refs(receive, send, repository, service, env)
+        else:
+            await self.run_service(
+                receive, send, headers, repository, request, service, env
+            )
+
+    async def advertise_refs(self, receive, send, repository, service, env):
+        # Protocol v2 clients expect the capability advertisement straight away
+        preamble = b""
+        if "version=2" not in env.get("GIT_PROTOCOL", ""):
+            preamble = _pkt_line(f"# service={service}\n".encode()) + b"0000"
+
+        await self.run(
+            receive,
+            send,
+            [repository.repo_path, "--advertise-refs"],
+            service,
+            env,
+            f"application/x-{service}-advertisement",
+            preamble=preamble,
+        )
+
+    async def run_service(
+        self, receive, send, headers, repository, request, service, env
+    ):
+        if service != RECEIVE_PACK:
+            return await self.serve(receive, send, headers, repository, service, env)
+
+        rule_set = await sync_to_async(protection.get_rule_set)(
+            repository.project_id
+        )
+
+        # Held until the push is recorded, so maintenance never overlaps it
+        lock = await _lock_for_push(repository)
+        if lock is None:
+            return await self.send_status(send, HTTPStatus.SERVICE_UNAVAILABLE)
+        try:
+            if not rule_set:
+                return await self.serve(
+                    receive, send, headers, repository, service, env
+                )
+            async with _pre_receive_gate(
+                repository, rule_set, request.can_manage
+            ) as socket_path:
+                env[PRE_RECEIVE_SOCKET_ENV] = socket_path
+                await self.serve(
+                    receive,
+                    send,
+                    headers,
+                    repository,
+                    service,
+                    env,
+                    options=["-c", f"core.hooksPath={protection.HOOKS_DIR}"],
+                )
+        finally:
+            lock.release()
+
+    async def serve(
+        self, receive, send, headers, repository, service, env, options=()
+    ):
+        parser = previous_tips = None
+        if service == RECEIVE_PACK:
+            parser = RefUpdateParser()
+            # Read before receive-pack moves the refs, the commits the push
+            # introduces are those none of them reach
+            previous_tips = await run_git(_ref_tips, repository)
+        gzipped = headers.get(b"content-encoding", b"").lower() in (
+            b"gzip",
+            b"x-gzip",
+        )
+
+        returncode = await self.run(
+            receive,
+            send,
+            [repository.repo_path],
+            service,
+            env,
+            f"application/x-{service}-result",
+            stdin=True,
+            gzipped=gzipped,
+            parser=parser,
+            options=options,
+        )
+
+        if parser is not None and parser.updates and returncode == 0:
+            await sync_to_async(_post_receive)(
+                repository, parser.updates, previous_tips
+            )
+
+    async def run(
+        self,
+        receive,
+        send,
+        args,
+        service,
+        env,
+        content_type,
+        preamble=b"",
+        stdin=False,
+        gzipped=False,
+        parser=None,
+        options=(),
+    ):
+        """
+        Runs ``git <options> <service> --stateless-rpc`` and pipes the request
+        body into it (when stdin is set) while its output is streamed back to
+        the client. Returns the exit status of git.
+        """
+        process = await asyncio.create_subprocess_exec(
+            settings.GIT_BINARY,
+            *options,
+            service.removeprefix("git-"),
+            "--stateless-rpc",
+            *args,
+            stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+        )
+
+        if stdin:
+            feeder = self.feed_input(receive, process, gzipped, parser)
+        else:
+            feeder = self.watch_disconnect(receive, process)
+
+        feeder = asyncio.create_task(feeder)
+        stderr = asyncio.create_task(_drain(process.stderr))
+        try:
+            await self.stream_output(send, process, content_type, preamble)
+        except BaseException:
+            _kill(process)
+            raise
+        finally:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+            returncode = await process.wait()
+
+        if returncode != 0:
+            logger.warning(
+                "%s exited with %s: %s",
+                service,
+                returncode,
+                (await stderr).decode("utf-8", "replace").strip(),
+            )
+        else:
+            stderr.cancel()
+
+        return returncode
+
+    async def feed_input(self, receive, process, gzipped, parser):
+        """
+        Copies the request body into the subprocess' stdin, waiting for the
+        pipe to drain after every chunk so a slow git never makes us buffer
+        the client's upload.
+        """
+        stdin = process.stdin
+        chunk_size = settings.GIT_HTTP_CHUNK_SIZE
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+
+        async def write(data):
+            if parser is not None:
+                parser.feed(data)
+            stdin.write(data)
+            await stdin.drain()
+
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    _kill(process)
+                    return
+
+                body = message.get("body", b"")
+                if decoder is None:
+                    if body:
+                        await write(body)
+                else:
+                    # Inflate in bounded pieces so a small gzip body can't
+                    # expand into one huge buffer
+                    data = decoder.decompress(body, chunk_size)
+                    while data:
+                        await write(data)
+                        data = decoder.decompress(decoder.unconsumed_tail, chunk_size)
+
+                if not message.get("more_body", False):
+                    break
+
+            stdin.close()
+            await stdin.wait_closed()
+        except zlib.error:
+            logger.warning("Discarding request with a corrupt gzip body")
+            _kill(process)
+            return
+        except (BrokenPipeError, ConnectionResetError):
+            # git gave up early; its exit status and stderr tell the story
+            pass
+
+        await self.watch_disconnect(receive, process)
+
+    async def watch_disconnect(self, receive, process):
+        """Kills git when the client goes away before the response is done."""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                _kill(process)
+                return
+
+    async def stream_output(self, send, process, content_type, preamble=b""):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": HTTPStatus.OK,
+                "headers": [(b"content-type", content_type.encode()), *NO_CACHE_HEADERS],
+            }
+        )
+
+        if preamble:
+            await send({"type": "http.response.body", "body": preamble, "more_body": True})
+
+        chunk_size = settings.GIT_HTTP_CHUNK_SIZE
+        while chunk := await process.stdout.read(chunk_size):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send_status(self, send, status):
+        body = status.phrase.encode()
+        headers = [
+            (b"content-type", b"text/plain"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if status == HTTPStatus.UNAUTHORIZED:
+            headers.append((b"www-authenticate", b'Basic realm="Gitsap"'))
+        elif status == HTTPStatus.SERVICE_UNAVAILABLE:
+            headers.append((b"retry-after", b"1"))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
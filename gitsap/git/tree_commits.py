@@ -0,0 +1,320 @@
+"""
+Last commit per tree entry.
+
+A directory listing shows, for each entry, the last commit that changed it,
+following first-parent history like blame. The result for (commit, path)
+never changes, so it is kept in the "blame" cache under both the commit and
+the commit that last changed the directory, which is where walks from later
+commits arrive first.
+
+A result is found, cheapest first:
+
+- in the cache, under the commit;
+- from the cached result of the first parent, replacing only the entries the
+  commit changed (how new commits are added after a push);
+- by one pass over the history of the directory with git log, stopping at
+  the first revision with a cached result or once every entry is resolved.
+
+    tree_commits:v1:<commit>:<path hash>
+"""
+
+import hashlib
+import subprocess
+
+from django.conf import settings
+from django.core.cache import caches
+
+from gitsap.git.blame import _pack, _unpack
+
+FORMAT_VERSION = 1
+# Revisions parsed from git log before their cached results are looked up
+WALK_BATCH_SIZE = 100
+
+
+def _tree(commit, path):
+    """The directory path in commit, None when there is none."""
+    if not path:
+        return commit.tree
+    try:
+        entry = commit.tree[path]
+    except KeyError:
+        return None
+    return entry if entry.type_str == "tree" else None
+
+
+def _commit_info(repo, oid):
+    commit = repo[oid]
+    return {
+        "oid": str(oid),
+        "author": commit.author.name,
+        "time": commit.commit_time,
+        "summary": commit.message.split("\n", 1)[0],
+    }
+
+
+def _read_records(stream):
+    """
+    Lists of the (commit_oid, changed paths) records of git log output read
+    so far, as soon as each chunk arrives.
+    """
+    buffer = bytearray()
+    while chunk := stream.read1(65536):
+        # Only complete records, the last one may continue in the next chunk
+        start = chunk.rfind(b"\x01")
+        if start > 0 or (start == 0 and buffer):
+            end = len(buffer) + start
+            buffer += chunk
+            yield list(_log_records(bytes(buffer[:end])))
+            del buffer[:end]
+        else:
+            buffer += chunk
+    yield list(_log_records(bytes(buffer)))
+
+
+def _log_records(output):
+    """
+    (commit_oid, changed paths) of each record of git log --format=%x01%H
+    --name-only -z output.
+    """
+    for record in output.split(b"\x01"):
+        if not record:
+            continue
+        oid, _, names = record.partition(b"\0")
+        yield oid.decode(), [name for name in names.lstrip(b"\n").split(b"\0") if name]
+
+
+class TreeCommitsCache:
+    def __init__(self, path):
+        self.cache = caches["blame"]
+        self.path = path
+        self.path_hash = hashlib.sha1(path.encode()).hexdigest()[:16]
+
+    def key_for(self, commit_oid):
+        return f"tree_commits:v{FORMAT_VERSION}:{commit_oid}:{self.path_hash}"
+
+    def get(self, commit_oid):
+        value = self.cache.get(self.key_for(commit_oid))
+        return None if value is None else _unpack(value)
+
+    def get_many(self, commit_oids):
+        keys = {self.key_for(oid): oid for oid in commit_oids}
+        values = self.cache.get_many(keys)
+        return {keys[key]: _unpack(value) for key, value in values.items()}
+
+    def claim(self, commit_oid):
+        """
+        True for the one caller that should schedule the history walk, while
+        no other is pending.
+        """
+        return self.cache.add(
+            f"{self.key_for(commit_oid)}:pending",
+            1,
+            timeout=settings.GIT_TREE_COMMITS_PENDING_TIMEOUT,
+        )
+
+    def store(self, result, commit_oids):
+        value = _pack(result)
+        self.cache.set_many({self.key_for(oid): value for oid in commit_oids})
+        self.cache.delete_many([f"{self.key_for(oid)}:pending" for oid in commit_oids])
+
+
+class TreeCommits:
+    """
+    Last commits of the entries of path at commit_oid. Results look like
+
+        {
+            "entries": {name: commit_index},
+            "commits": [{oid, author, time, summary}],
+            "revision": commit that last changed the directory,
+        }
+
+    with no index for entries the walk could not resolve.
+    """
+
+    def __init__(self, repo, commit_oid, path):
+        self.repo = repo
+        self.commit_oid = commit_oid
+        self.path = path
+        self.cache = TreeCommitsCache(path)
+
+    def get(self):
+        """
+        The cached result, or one derived from the first parent's cached
+        result. None when it takes a history walk.
+        """
+        commit = self.repo[self.commit_oid]
+        parent_ids = [str(oid) for oid in commit.parent_ids[:1]]
+        results = self.cache.get_many([self.commit_oid, *parent_ids])
+        if self.commit_oid in results:
+            return results[self.commit_oid]
+        if not parent_ids or parent_ids[0] not in results:
+            return None
+
+        result = self.derive(commit, results[parent_ids[0]])
+        if result is not None:
+            self.store(result)
+        return result
+
+    def derive(self, commit, parent_result):
+        """
+        The result of commit from parent_result, the result of its first
+        parent: entries the commit added or changed are its own. None when
+        the directory does not exist in commit.
+        """
+        tree = _tree(commit, self.path)
+        if tree is None:
+            return None
+        parent_tree = _tree(self.repo[commit.parent_ids[0]], self.path)
+        if parent_tree is not None and parent_tree.id == tree.id:
+            return parent_result
+
+        parent_entries = {}
+        if parent_tree is not None:
+            parent_entries = {entry.name: entry.id for entry in parent_tree}
+        indexes = parent_result["entries"]
+        own = _commit_info(self.repo, commit.id)
+        resolved = {}
+        for entry in tree:
+            if parent_entries.get(entry.name) != entry.id:
+                resolved[entry.name] = own
+            elif entry.name in indexes:
+                resolved[entry.name] = parent_result["commits"][indexes[entry.name]]
+        return self._result(resolved, str(commit.id))
+
+    def compute(self):
+        """The result, walking the history of the directory when needed."""
+        result = self.get()
+        if result is not None:
+            return result
+
+        tree = _tree(self.repo[self.commit_oid], self.path)
+        if tree is None:
+            raise KeyError(self.path)
+
+        resolved, revision = self._walk({entry.name for entry in tree})
+        result = self._result(resolved, revision or self.commit_oid)
+        self.store(result)
+        return result
+
+    def store(self, result):
+        self.cache.store(result, {self.commit_oid, result["revision"]})
+
+    def _result(self, resolved, revision):
+        """The result from {name: commit OID or commit info}."""
+        result = {"entries": {}, "commits": [], "revision": revision}
+        indexes = {}
+        for name, commit in resolved.items():
+            oid = commit["oid"] if isinstance(commit, dict) else commit
+            index = indexes.get(oid)
+            if index is None:
+                index = indexes[oid] = len(result["commits"])
+                if not isinstance(commit, dict):
+                    commit = _commit_info(self.repo, oid)
+                result["commits"].append(commit)
+            result["entries"][name] = index
+        return result
+
+    def _walk(self, pending):
+        """
+        Resolves the names in pending in one pass over the first-parent
+        history of the directory. Returns ({name: commit oid, or the commit
+        info of a cached result}, the revision that last changed the
+        directory).
+        """
+        prefix = f"{self.path}/" if self.path else ""
+        args = [
+            settings.GIT_BINARY,
+            "--literal-pathspecs",
+            "log",
+            "--first-parent",
+            "--root",
+            "--diff-merges=first-parent",
+            "--no-renames",
+            "--format=%x01%H",
+            "--name-only",
+            "-z",
+            self.commit_oid,
+            "--",
+        ]
+        if self.path:
+            args.append(self.path)
+
+        resolved = {}
+        revision = None
+        process = subprocess.Popen(
+            args, cwd=self.repo.path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            for records in _read_records(process.stdout):
+                for start in range(0, len(records), WALK_BATCH_SIZE):
+                    batch = records[start : start + WALK_BATCH_SIZE]
+                    cached = self.cache.get_many([oid for oid, _ in batch])
+                    for oid, paths in batch:
+                        revision = revision or oid
+                        if oid in cached:
+                            self._take(cached[oid], pending, resolved)
+                            return resolved, revision
+                        for changed in paths:
+                            name = changed.decode("utf-8", "surrogateescape")
+                            name = name[len(prefix) :].split("/", 1)[0]
+                            if name in pending:
+                                pending.discard(name)
+                                resolved[name] = oid
+                        if not pending:
+                            return resolved, revision
+        finally:
+            process.kill()
+            process.wait()
+        return resolved, revision
+
+    def _take(self, result, pending, resolved):
+        for name in list(pending):
+            index = result["entries"].get(name)
+            if index is not None:
+                resolved[name] = result["commits"][index]
+            pending.discard(name)
+
+
+def carry_forward(repo, old_oid, new_oid):
+    """
+    Carries the cached results of the directories changed between old_oid
+    and new_oid through each first-parent commit from one to the other, so
+    their pages at the new commits need no walk. Returns the number of
+    results stored, 0 unless new_oid descends from old_oid within
+    GIT_TREE_COMMITS_PUSH_DEPTH first parents.
+    """
+    chain = []
+    commit = repo[new_oid]
+    while str(commit.id) != old_oid:
+        if not commit.parent_ids or len(chain) >= settings.GIT_TREE_COMMITS_PUSH_DEPTH:
+            return 0
+        chain.append(commit)
+        commit = repo[commit.parent_ids[0]]
+    if not chain:
+        return 0
+
+    # commit is now old_oid, chain[0] new_oid
+    paths = {""}
+    for delta in commit.tree.diff_to_tree(chain[0].tree).deltas:
+        for changed in (delta.old_file.path, delta.new_file.path):
+            parts = changed.split("/")[:-1]
+            paths.update("/".join(parts[:n]) for n in range(1, len(parts) + 1))
+
+    results = {}
+    for path in paths:
+        result = TreeCommitsCache(path).get(old_oid)
+        if result is not None:
+            results[path] = result
+
+    stored = 0
+    for commit in reversed(chain):
+        for path, parent_result in list(results.items()):
+            tree_commits = TreeCommits(repo, str(commit.id), path)
+            result = tree_commits.derive(commit, parent_result)
+            if result is None:
+                del results[path]
+                continue
+            tree_commits.store(result)
+            results[path] = result
+            stored += 1
+    return stored
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from gitsap.models import Repository
+from gitsap.tasks import backfill_commit_index
+
+
+class Command(BaseCommand):
+    help = "Index the commit history of repositories that predate the commit index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "namespaces",
+            nargs="*",
+            help="Project namespaces to backfill (default: every repository not indexed yet)",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run in this process instead of queueing Celery tasks",
+        )
+
+    def handle(self, *args, **options):
+        repositories = Repository.objects.filter(is_empty=False)
+        if options["namespaces"]:
+            repositories = repositories.filter(
+                project__namespace__in=options["namespaces"]
+            )
+        else:
+            repositories = repositories.filter(commits_indexed_at__isnull=True)
+
+        for repository_id in repositories.values_list("pk", flat=True):
+            if options["sync"]:
+                backfill_commit_index(repository_id)
+                self.stdout.write(f"Indexed {repository_id}")
+            else:
+                backfill_commit_index.delay(repository_id)
+                self.stdout.write(f"Queued {repository_id}")
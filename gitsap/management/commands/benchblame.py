@@ -0,0 +1,204 @@
+import random
+import subprocess
+import time
+
+import pygit2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.git.blame import BlameBuilder, BlameCache
+from gitsap.git.objects import split_rev
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.models import Project
+
+BENCH_BRANCH = "bench/blame"
+BENCH_PATH = "bench-blame.txt"
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: time blame of a file — first partial result, full cold "
+        "walk, cached read and incremental blame of one newer commit — and "
+        "check it against git blame --first-parent"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument("--path", default=BENCH_PATH, help="File to blame")
+        parser.add_argument(
+            "--rev", default=None, help="Branch, tag or commit (default: HEAD)"
+        )
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            help="First commit this many revisions of --path to a scratch branch",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=0.5,
+            help="Seconds the first partial run may take",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch branch"
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        repository = project.repository
+        path = options["path"]
+        if options["synthetic"]:
+            oid = self.create_synthetic(repository, path, options["synthetic"])
+        else:
+            refs = repository.refs
+            match = split_rev(options["rev"] or refs["head"] or "", refs)
+            if match is None:
+                raise CommandError("Unknown revision")
+            oid = match[0]
+
+        try:
+            with repository.open() as repo:
+                oid = str(repo[oid].peel(pygit2.Commit).id)
+                self.bench(repo, repository, oid, path, options["budget"])
+        finally:
+            if options["synthetic"] and not options["keep"]:
+                with repository.open() as repo:
+                    repo.branches.delete(BENCH_BRANCH)
+
+    def bench(self, repo, repository, oid, path, budget):
+        blame = BlameCache(oid, path)
+        try:
+            builder = BlameBuilder(repo, blame, oid, path)
+        except KeyError:
+            raise CommandError(f"No file {path} at {oid}")
+        lines = sum(count for _, count, _ in builder.state["pending"])
+
+        started = time.perf_counter()
+        builder.run(time.monotonic() + budget)
+        partial = time.perf_counter() - started
+        resolved = lines - sum(count for _, count, _ in builder.state["pending"])
+        self.stdout.write(
+            f"first run   {partial * 1000:8.1f} ms  {builder.state['revisions']} "
+            f"revisions, {resolved}/{lines} lines blamed"
+        )
+
+        builder.run()
+        cold = time.perf_counter() - started
+        result = builder.result()
+        blame.store(result, builder.state["revision"] or oid)
+        self.stdout.write(
+            f"cold        {cold * 1000:8.1f} ms  {builder.state['revisions']} "
+            f"revisions, {len(result['runs'])} runs, {len(result['commits'])} commits"
+        )
+
+        started = time.perf_counter()
+        blame.get()
+        self.stdout.write(
+            f"cached      {(time.perf_counter() - started) * 1000:8.1f} ms"
+        )
+
+        child = self.commit_change(repo, repo[oid], path, random.Random(0))
+        started = time.perf_counter()
+        incremental = BlameBuilder(repo, BlameCache(child, path), child, path)
+        incremental.run()
+        incremental.result()
+        self.stdout.write(
+            f"incremental {(time.perf_counter() - started) * 1000:8.1f} ms  "
+            f"{incremental.state['revisions']} revisions walked"
+        )
+
+        self.compare(repository, oid, path, result)
+
+    def compare(self, repository, oid, path, result):
+        started = time.perf_counter()
+        try:
+            output = subprocess.run(
+                [
+                    settings.GIT_BINARY,
+                    "blame",
+                    "--first-parent",
+                    "--porcelain",
+                    oid,
+                    "--",
+                    path,
+                ],
+                cwd=repository.repo_path,
+                capture_output=True,
+                check=True,
+            ).stdout
+        except (OSError, subprocess.CalledProcessError) as error:
+            self.stdout.write(f"git blame   unavailable ({error})")
+            return
+        elapsed = time.perf_counter() - started
+
+        # Porcelain headers are "<oid> <orig line> <final line> [<count>]"
+        expected = {}
+        for line in output.split(b"\n"):
+            parts = line.split(b" ")
+            if len(parts) in (3, 4) and len(parts[0]) == 40 and parts[1].isdigit():
+                expected[int(parts[2]) - 1] = parts[0].decode()
+
+        actual = {}
+        for start, count, commit, _ in result["runs"]:
+            for final in range(start, start + count):
+                actual[final] = result["commits"][commit]["oid"]
+
+        matching = sum(1 for line, oid in expected.items() if actual.get(line) == oid)
+        self.stdout.write(
+            f"git blame   {elapsed * 1000:8.1f} ms  {matching}/{len(expected)} "
+            f"lines agree"
+        )
+
+    def commit_change(self, repo, parent, path, rng):
+        """Commits a random one-line change of path on top of parent."""
+        lines = repo[parent.tree[path].id].data.split(b"\n")
+        position = rng.randrange(len(lines))
+        if rng.random() < 0.5:
+            lines[position] = f"changed {rng.random()}".encode()
+        else:
+            lines.insert(position, f"added {rng.random()}".encode())
+
+        signature = pygit2.Signature("Gitsap Bench", "bench@gitsap.invalid")
+        builder = repo.TreeBuilder(parent.tree)
+        builder.insert(
+            path, repo.create_blob(b"\n".join(lines)), pygit2.GIT_FILEMODE_BLOB
+        )
+        return str(
+            repo.create_commit(
+                None,
+                signature,
+                signature,
+                f"Change {path}",
+                builder.write(),
+                [parent.id],
+            )
+        )
+
+    def create_synthetic(self, repository, path, revisions):
+        if "/" in path:
+            raise CommandError("--synthetic needs a top level --path")
+
+        rng = random.Random(revisions)
+        with repository.open() as repo:
+            head = repository.refs["head"]
+            if head is None:
+                raise CommandError("The repository has no default branch")
+            commit = repo[repo.branches[head].target]
+
+            signature = pygit2.Signature("Gitsap Bench", "bench@gitsap.invalid")
+            builder = repo.TreeBuilder(commit.tree)
+            content = "".join(f"line {n}\n" for n in range(1000)).encode()
+            builder.insert(path, repo.create_blob(content), pygit2.GIT_FILEMODE_BLOB)
+            oid = repo.create_commit(
+                None, signature, signature, f"Add {path}", builder.write(), [commit.id]
+            )
+
+            for _ in range(revisions - 1):
+                oid = self.commit_change(repo, repo[oid], path, rng)
+
+            repo.references.create(f"{BRANCH_PREFIX}{BENCH_BRANCH}", oid, force=True)
+        return str(oid)
@@ -0,0 +1,132 @@
+import time
+
+import httpx
+import pygit2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.git.objects import split_rev
+from gitsap.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: benchmark code browsing — conditional request hit rates on "
+        "tree/blob pages and time to first byte of large raw files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/linux)")
+        parser.add_argument(
+            "--rev", default=None, help="Branch, tag or commit (default: HEAD)"
+        )
+        parser.add_argument(
+            "--base-url",
+            default=settings.APP_BASE_URL,
+            help="Server to send requests to",
+        )
+        parser.add_argument(
+            "--pages", type=int, default=200, help="Maximum tree/blob pages to request"
+        )
+        parser.add_argument(
+            "--large",
+            type=int,
+            default=1024 * 1024,
+            help="Blobs at least this many bytes count as large files",
+        )
+        parser.add_argument("--username", help="Username for HTTP basic auth")
+        parser.add_argument("--password", help="Password for HTTP basic auth")
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        repository = project.repository
+        refs = repository.refs
+        match = split_rev(options["rev"] or refs["head"] or "", refs)
+        if match is None:
+            raise CommandError("Unknown revision")
+        oid = match[0]
+
+        pages, large = self.collect(repository, oid, options["pages"], options["large"])
+        base = f"{options['base_url'].rstrip('/')}/{project.namespace}"
+
+        auth = None
+        if options["username"]:
+            auth = (options["username"], options["password"] or "")
+
+        with httpx.Client(auth=auth, timeout=60) as client:
+            self.bench_conditional(client, [f"{base}/{page}" for page in pages])
+            self.bench_large(
+                client, [(f"{base}/raw/{oid}/{path}", size) for path, size in large]
+            )
+
+    def collect(self, repository, oid, max_pages, large_size):
+        """Tree and blob page paths under oid (breadth first) and the large blobs."""
+        pages = []
+        large = []
+        with repository.open() as repo:
+            queue = [("", repo[oid].peel(pygit2.Commit).tree)]
+            while queue and len(pages) < max_pages:
+                path, tree = queue.pop(0)
+                pages.append(f"tree/{oid}/{path}".rstrip("/"))
+                for entry in tree:
+                    entry_path = f"{path}/{entry.name}".lstrip("/")
+                    if entry.type_str == "tree":
+                        queue.append((entry_path, entry))
+                    elif entry.type_str == "blob":
+                        if len(pages) < max_pages:
+                            pages.append(f"blob/{oid}/{entry_path}")
+                        if entry.size >= large_size:
+                            large.append((entry_path, entry.size))
+        return pages, large
+
+    def bench_conditional(self, client, urls):
+        etags = {}
+        for label, conditional in (("cold", False), ("revalidate", True)):
+            statuses = {}
+            started = time.perf_counter()
+            for url in urls:
+                headers = {}
+                if conditional and url in etags:
+                    headers["If-None-Match"] = etags[url]
+                response = client.get(url, headers=headers)
+                statuses[response.status_code] = (
+                    statuses.get(response.status_code, 0) + 1
+                )
+                if "etag" in response.headers:
+                    etags[url] = response.headers["etag"]
+            elapsed = time.perf_counter() - started
+
+            hits = statuses.get(304, 0)
+            self.stdout.write(
+                f"{label:<11} {len(urls)} pages  {elapsed:.2f}s  "
+                f"{elapsed / max(len(urls), 1) * 1000:.1f} ms/page  "
+                f"304 hit rate {hits / max(len(urls), 1):.0%}  "
+                + " ".join(
+                    f"[{status}]={count}" for status, count in sorted(statuses.items())
+                )
+            )
+
+    def bench_large(self, client, files):
+        if not files:
+            self.stdout.write("No large files under this revision")
+            return
+
+        for url, size in files:
+            started = time.perf_counter()
+            first_byte = None
+            received = 0
+            with client.stream("GET", url) as response:
+                for chunk in response.iter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    received += len(chunk)
+            total = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{url.rsplit('/', 1)[-1]:<30} {size / 2**20:8.1f} MiB  "
+                f"ttfb {(first_byte or total) * 1000:7.1f} ms  total {total * 1000:8.1f} ms  "
+                f"{received / 2**20 / total:.0f} MiB/s"
+            )
@@ -0,0 +1,100 @@
+import asyncio
+import base64
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+
+class Command(BaseCommand):
+    help = "Dev utility: benchmark smart HTTP clone throughput with many concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url",
+            help="Clone URL served by the ASGI app (e.g. http://127.0.0.1:8000/acme/linux.git)",
+        )
+        parser.add_argument(
+            "--clients", type=int, default=8, help="Concurrent clones per round"
+        )
+        parser.add_argument("--rounds", type=int, default=1, help="Number of rounds")
+        parser.add_argument("--username", help="Username for HTTP basic auth")
+        parser.add_argument("--password", help="Password for HTTP basic auth")
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["rounds"] < 1:
+            raise CommandError("--clients and --rounds must be positive")
+
+        git_config = []
+        if options["username"]:
+            token = base64.b64encode(
+                f"{options['username']}:{options['password'] or ''}".encode()
+            ).decode()
+            git_config = ["-c", f"http.extraHeader=Authorization: Basic {token}"]
+
+        for round_number in range(1, options["rounds"] + 1):
+            results, elapsed = asyncio.run(
+                self.run_round(options["url"], options["clients"], git_config)
+            )
+
+            failed = [r for r in results if r["returncode"] != 0]
+            total_bytes = sum(r["bytes"] for r in results)
+            durations = sorted(r["seconds"] for r in results)
+
+            self.stdout.write(f"Round {round_number}: {options['clients']} clients")
+            self.stdout.write(f"  wall time:   {elapsed:.2f}s")
+            self.stdout.write(
+                f"  per clone:   min {durations[0]:.2f}s  "
+                f"median {durations[len(durations) // 2]:.2f}s  max {durations[-1]:.2f}s"
+            )
+            self.stdout.write(f"  transferred: {total_bytes / 2**20:.1f} MiB")
+            self.stdout.write(
+                f"  throughput:  {total_bytes / 2**20 / elapsed:.1f} MiB/s aggregate"
+            )
+            if failed:
+                self.stdout.write(self.style.ERROR(f"  failed:      {len(failed)}"))
+                for result in failed[:3]:
+                    self.stdout.write(f"    {result['stderr']}")
+
+    async def run_round(self, url, clients, git_config):
+        with tempfile.TemporaryDirectory(prefix="benchclone-") as workdir:
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    self.clone(
+                        url, os.path.join(workdir, f"client-{i}.git"), git_config
+                    )
+                    for i in range(clients)
+                )
+            )
+            return results, time.perf_counter() - started
+
+    async def clone(self, url, dest, git_config):
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            settings.GIT_BINARY,
+            *git_config,
+            "clone",
+            "--bare",
+            "--quiet",
+            url,
+            dest,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        seconds = time.perf_counter() - started
+
+        # The received pack is what went over the wire
+        size = 0
+        for root, _, files in os.walk(dest):
+            size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+
+        return {
+            "returncode": process.returncode,
+            "seconds": seconds,
+            "bytes": size,
+            "stderr": stderr.decode("utf-8", "replace").strip(),
+        }
@@ -0,0 +1,203 @@
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from gitsap.models import Issue, IssueStateChoice, Label, Project, User
+
+BENCH_LABEL_PREFIX = "bench-"
+LABELS = 20
+VOCABULARY = 5000
+SYLLABLES = [
+    "ka", "lo", "mi", "nu", "pe", "ra", "si", "to", "va", "ze",
+    "bri", "dan", "fel", "gor", "hul", "jin", "kes", "lum", "mor", "tav",
+]  # fmt: skip
+COPY_BATCH_SIZE = 50000
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: benchmark issue search — seed a project with generated "
+        "issues, then time filtered, searched and deep pages"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument(
+            "--issues",
+            type=int,
+            default=1000000,
+            help="Generated issues the project should have (default: 1000000)",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs of each query")
+        parser.add_argument(
+            "--clean",
+            action="store_true",
+            help="Delete the generated issues and labels afterwards",
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        rng = random.Random(0)
+        words = self.vocabulary(rng)
+        labels = self.labels(project)
+        users = list(User.objects.order_by("pk")[:10])
+        try:
+            missing = options["issues"] - Issue.objects.filter(project=project).count()
+            if missing > 0:
+                self.seed(project, missing, words, labels, users, rng)
+            self.bench(project, words, labels, users, options["repeat"])
+        finally:
+            if options["clean"]:
+                Issue.objects.filter(
+                    project=project, issue_labels__label__in=labels
+                ).delete()
+                Label.objects.filter(pk__in=[label.pk for label in labels]).delete()
+
+    def vocabulary(self, rng):
+        words = set()
+        while len(words) < VOCABULARY:
+            words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+        return sorted(words)
+
+    def labels(self, project):
+        for n in range(LABELS):
+            Label.objects.get_or_create(
+                project=project, name=f"{BENCH_LABEL_PREFIX}{n}"
+            )
+        return list(
+            Label.objects.filter(
+                project=project, name__startswith=BENCH_LABEL_PREFIX
+            ).order_by("created_at")
+        )
+
+    def seed(self, project, count, words, labels, users, rng):
+        # Word frequencies follow Zipf's law, as in prose
+        weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        label_weights = list(accumulate(1 / rank for rank in range(1, len(labels) + 1)))
+        first = (
+            Issue.objects.filter(project=project)
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .first()
+        ) or 0
+        now = timezone.now()
+
+        started = time.perf_counter()
+        done = 0
+        while done < count:
+            batch = min(COPY_BATCH_SIZE, count - done)
+            ids = Issue.generate_ids(batch)
+            issues, issue_labels = [], []
+            for n, issue_id in enumerate(ids, start=first + done + 1):
+                state = (
+                    IssueStateChoice.OPEN
+                    if rng.random() < 0.25
+                    else IssueStateChoice.CLOSED
+                )
+                assignee = None
+                if rng.random() < 0.5:
+                    assignee = rng.choice(users).pk
+                issues.append(
+                    (
+                        issue_id,
+                        now,
+                        now,
+                        project.pk,
+                        n,
+                        rng.choice(users).pk,
+                        assignee,
+                        " ".join(rng.choices(words, cum_weights=weights, k=6)),
+                        " ".join(rng.choices(words, cum_weights=weights, k=30)),
+                        state,
+                    )
+                )
+                for label in set(
+                    rng.choices(labels, cum_weights=label_weights, k=rng.randint(0, 2))
+                ):
+                    issue_labels.append((issue_id, label.pk, state, n))
+
+            with connection.cursor() as cursor:
+                with cursor.copy(
+                    "COPY issues (id, created_at, updated_at, project_id, number, "
+                    "author_id, assignee_id, title, description, state) FROM STDIN"
+                ) as copy:
+                    for row in issues:
+                        copy.write_row(row)
+                with cursor.copy(
+                    "COPY issue_labels (issue_id, label_id, state, number) FROM STDIN"
+                ) as copy:
+                    for row in issue_labels:
+                        copy.write_row(row)
+            done += batch
+            self.stdout.write(f"seeded {done}/{count}")
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE issues")
+            cursor.execute("ANALYZE issue_labels")
+        self.stdout.write(
+            f"seed        {time.perf_counter() - started:8.1f} s   {count} issues"
+        )
+
+    def bench(self, project, words, labels, users, repeat):
+        open_ = IssueStateChoice.OPEN
+        total = Issue.objects.filter(project=project).count()
+        # A common, an uncommon and a rare word
+        common, uncommon, rare = words[9], words[199], words[3999]
+        cases = [
+            ("open", {"state": open_}),
+            ("all, deep page", {"after": total // 2}),
+            ("open, label", {"state": open_, "label": labels[0]}),
+            ("open, rare label", {"state": open_, "label": labels[-1]}),
+            ("open, assignee", {"state": open_, "assignee": users[0]}),
+            ("open, label, assignee", {
+                "state": open_, "label": labels[0], "assignee": users[0]
+            }),
+            (f"text {common!r}", {"text": common}),
+            (f"text {uncommon!r}", {"text": uncommon}),
+            (f"text {rare!r}", {"text": rare}),
+            (f"open, text {common!r}", {"text": common, "state": open_}),
+            (f"open, label, text {uncommon!r}", {
+                "text": uncommon, "state": open_, "label": labels[0]
+            }),
+            (f"text '{common} {uncommon}'", {"text": f"{common} {uncommon}"}),
+            (f"title prefix {rare[:4]!r}", {"text": rare[:4]}),
+        ]  # fmt: skip
+
+        for name, filters in cases:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                issues, has_next = Issue.search_page(
+                    project, limit=settings.ISSUE_PAGE_SIZE, **filters
+                )
+                timings.append(time.perf_counter() - started)
+
+            # The page after, through the keyset of the last issue
+            next_timing = None
+            if has_next:
+                started = time.perf_counter()
+                Issue.search_page(
+                    project,
+                    limit=settings.ISSUE_PAGE_SIZE,
+                    **{**filters, "after": issues[-1].number},
+                )
+                next_timing = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{name:<36} {statistics.median(timings) * 1000:8.1f} ms  "
+                f"{len(issues)}{'+' if has_next else ''} issues"
+                + (
+                    f", next page {next_timing * 1000:.1f} ms"
+                    if next_timing is not None
+                    else ""
+                )
+            )
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.models import Project
+
+PAGES = ("", "tree/{head}", "commits/", "branches/", "settings/")
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: load test the project pages with concurrent clients and "
+        "report throughput and latency percentiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument(
+            "--base-url",
+            default=settings.APP_BASE_URL,
+            help="Server to send requests to",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=50, help="Requests in flight at once"
+        )
+        parser.add_argument(
+            "--duration", type=float, default=10.0, help="Seconds to run for"
+        )
+        parser.add_argument("--username", help="Username for HTTP basic auth")
+        parser.add_argument("--password", help="Password for HTTP basic auth")
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        head = project.repository.refs["head"] or ""
+        base = f"{options['base_url'].rstrip('/')}/{project.namespace}"
+        urls = [f"{base}/{page.format(head=head)}" for page in PAGES]
+
+        auth = None
+        if options["username"]:
+            auth = (options["username"], options["password"] or "")
+
+        latencies, statuses, elapsed = asyncio.run(
+            self.run(urls, auth, options["concurrency"], options["duration"])
+        )
+        if not latencies:
+            raise CommandError("No request completed")
+
+        latencies.sort()
+        self.stdout.write(
+            f"{len(latencies)} requests  {elapsed:.1f}s  "
+            f"{len(latencies) / elapsed:.0f} req/s  "
+            f"p50 {self.percentile(latencies, 0.50) * 1000:.1f} ms  "
+            f"p99 {self.percentile(latencies, 0.99) * 1000:.1f} ms  "
+            + " ".join(
+                f"[{status}]={count}"
+                for status, count in sorted(statuses.items(), key=str)
+            )
+        )
+
+    async def run(self, urls, auth, concurrency, duration):
+        latencies = []
+        statuses = {}
+        limits = httpx.Limits(max_connections=concurrency)
+
+        async with httpx.AsyncClient(
+            auth=auth, timeout=60, limits=limits, follow_redirects=True
+        ) as client:
+            started = time.perf_counter()
+            deadline = started + duration
+
+            async def worker(offset):
+                n = offset
+                while time.perf_counter() < deadline:
+                    sent = time.perf_counter()
+                    try:
+                        response = await client.get(urls[n % len(urls)])
+                        status = response.status_code
+                    except httpx.TransportError:
+                        status = "error"
+                    latencies.append(time.perf_counter() - sent)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    n += 1
+
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        return latencies, statuses, elapsed
+
+    def percentile(self, values, fraction):
+        return values[min(int(len(values) * fraction), len(values) - 1)]
@@ -0,0 +1,120 @@
+import time
+
+import pygit2
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.models import Project, PullRequest
+from gitsap.tasks import check_pull_request_merges
+
+BENCH_PREFIX = "bench/merge-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: time the mergeability rescan of every open pull request "
+        "into the default branch, as after a force-push to it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            help="Create this many scratch branches and pull requests first",
+        )
+        parser.add_argument(
+            "--depth-step",
+            type=int,
+            default=10,
+            help="Scratch branch n forks n * depth-step commits below the tip",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=None,
+            help="Fail when the rescan takes longer than this many seconds",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch branches and PRs"
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        repository = project.repository
+        default_branch = repository.head
+        if default_branch is None:
+            raise CommandError("The repository has no default branch")
+
+        if options["synthetic"]:
+            self.create_synthetic(
+                project, default_branch, options["synthetic"], options["depth_step"]
+            )
+
+        try:
+            started = time.perf_counter()
+            checked = check_pull_request_merges(
+                repository.pk, [default_branch], force=True
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            if options["synthetic"] and not options["keep"]:
+                self.remove_synthetic(project)
+
+        self.stdout.write(
+            f"Rescanned {checked} pull requests into {default_branch} in "
+            f"{elapsed:.2f}s ({elapsed / max(checked, 1) * 1000:.1f} ms each)"
+        )
+        if options["budget"] is not None and elapsed > options["budget"]:
+            raise CommandError(f"Rescan exceeded the {options['budget']:.1f}s budget")
+
+    def create_synthetic(self, project, default_branch, count, depth_step):
+        signature = pygit2.Signature("Gitsap Bench", "bench@gitsap.invalid")
+        with project.repository.open() as repo:
+            history = [
+                commit.id
+                for _, commit in zip(
+                    range(count * depth_step + 1),
+                    repo.walk(repo.branches[default_branch].target),
+                )
+            ]
+
+            for n in range(count):
+                parent = repo[history[min(n * depth_step, len(history) - 1)]]
+                builder = repo.TreeBuilder(parent.tree)
+                blob = repo.create_blob(f"scratch change {n}\n".encode())
+                builder.insert(f"bench-merge-{n}.txt", blob, pygit2.GIT_FILEMODE_BLOB)
+                repo.create_commit(
+                    f"{BRANCH_PREFIX}{BENCH_PREFIX}{n}",
+                    signature,
+                    signature,
+                    f"Scratch change {n}",
+                    builder.write(),
+                    [parent.id],
+                )
+
+        PullRequest.objects.bulk_create(
+            [
+                PullRequest(
+                    project=project,
+                    author=project.created_by,
+                    title=f"Scratch change {n}",
+                    source_branch=f"{BENCH_PREFIX}{n}",
+                    target_branch=default_branch,
+                )
+                for n in range(count)
+            ]
+        )
+
+    def remove_synthetic(self, project):
+        PullRequest.objects.filter(
+            project=project, source_branch__startswith=BENCH_PREFIX
+        ).delete()
+        with project.repository.open() as repo:
+            for name in list(repo.branches.local):
+                if name.startswith(BENCH_PREFIX):
+                    repo.branches.delete(name)
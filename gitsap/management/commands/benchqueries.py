@@ -0,0 +1,96 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from gitsap.models import User, Project
+from gitsap.urls import project_urlpatterns
+
+# Placeholder values for the URL arguments other than namespace
+SAMPLE_KWARGS = {
+    "issue_id": "1",
+    "pr_id": "1",
+    "pipeline_id": "1",
+    "spec": "main",
+    "index": "0",
+}
+
+
+class Command(BaseCommand):
+    help = "Dev utility: count the SQL queries every project URL runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "namespace", help="Project namespace to render (e.g. acme/api)"
+        )
+        parser.add_argument(
+            "--username", help="Render as this user (default: anonymous)"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=2,
+            help="Requests per URL; later ones show the effect of warm caches",
+        )
+
+    def handle(self, *args, **options):
+        namespace = options["namespace"]
+        if not Project.objects.filter(namespace=namespace).exists():
+            raise CommandError(f"Unknown project: {namespace}")
+
+        user = AnonymousUser()
+        if options["username"]:
+            user = User.objects.get(username=options["username"])
+
+        factory = RequestFactory()
+        total = [0] * options["repeat"]
+
+        for pattern in project_urlpatterns:
+            kwargs = {"namespace": namespace}
+            kwargs.update(
+                {key: SAMPLE_KWARGS[key] for key in pattern.pattern.converters}
+            )
+            path = reverse(pattern.name, kwargs=kwargs)
+            match = resolve(path)
+
+            counts = []
+            for _ in range(options["repeat"]):
+                request = factory.get(path)
+                request.user = user
+                request.auser = self.auser(user)
+                with CaptureQueriesContext(connection) as queries:
+                    try:
+                        response = match.func(request, *match.args, **match.kwargs)
+                        if asyncio.iscoroutine(response):
+                            response = async_to_sync(self.finish)(response)
+                        status = response.status_code
+                    except Http404:
+                        status = 404
+                counts.append(len(queries))
+
+            for i, count in enumerate(counts):
+                total[i] += count
+
+            self.stdout.write(
+                f"{pattern.name:<24} {status}  "
+                + "  ".join(f"{count:>3}" for count in counts)
+            )
+
+        self.stdout.write(
+            f"{'total':<24}      " + "  ".join(f"{count:>3}" for count in total)
+        )
+
+    async def finish(self, coroutine):
+        return await coroutine
+
+    def auser(self, user):
+        async def auser():
+            return user
+
+        return auser
@@ -0,0 +1,233 @@
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import pygit2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.git import storage
+from gitsap.git.merges import branch_tip
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.git.search import SearchIndex
+from gitsap.models import Project
+
+BENCH_BRANCH = "bench/search"
+FILES_PER_DIR = 1000
+QUERIES = [
+    ("needle_4242", False),
+    ("def handle_alpha", False),
+    (r"class (Alpha|Omega)Service", False),
+    ("OMEGA_LIMIT", True),
+    (r"needle_42\d\d\b", False),
+    (r"return self\.\w+_alpha", False),
+]
+WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+    "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey",
+    "xray", "yankee", "zulu", "omega", "sigma", "kappa", "lambda",
+]  # fmt: skip
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: benchmark code search — index build and incremental "
+        "update times, index size and query latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            help="Index a scratch commit with this many generated files instead",
+        )
+        parser.add_argument(
+            "--changes",
+            type=int,
+            default=100,
+            help="Files changed by the scratch commit timing an incremental update",
+        )
+        parser.add_argument(
+            "--query",
+            action="append",
+            default=None,
+            help="Pattern to time, repeatable (default: a fixed mix)",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs of each query")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch branch and index"
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        repository = project.repository
+        root = tempfile.mkdtemp(
+            prefix="benchsearch-", dir=storage.shard_root(repository.shard)
+        )
+        index = SearchIndex(root)
+        try:
+            if options["synthetic"]:
+                oid = self.create_synthetic(repository, options["synthetic"])
+            else:
+                with repository.open() as repo:
+                    oid = branch_tip(repo, project.default_git_branch)
+                if oid is None:
+                    raise CommandError("The default branch does not exist")
+
+            with repository.open() as repo:
+                self.bench_build(repo, index, oid)
+                if options["synthetic"]:
+                    child = self.change_synthetic(
+                        repository, oid, options["synthetic"], options["changes"]
+                    )
+                    self.bench_update(repo, index, child)
+
+                queries = QUERIES
+                if options["query"]:
+                    queries = [(query, False) for query in options["query"]]
+                self.bench_queries(repo, index, queries, options["repeat"])
+                self.bench_scan(repo, index, queries[0][0])
+        finally:
+            if not options["keep"]:
+                shutil.rmtree(root, ignore_errors=True)
+                if options["synthetic"]:
+                    with repository.open() as repo:
+                        if BENCH_BRANCH in repo.branches.local:
+                            repo.branches.delete(BENCH_BRANCH)
+            else:
+                self.stdout.write(f"Index kept at {root}")
+
+    def bench_build(self, repo, index, oid):
+        started = time.perf_counter()
+        indexed, _ = index.update(repo, oid)
+        elapsed = time.perf_counter() - started
+
+        size = sum(
+            os.path.getsize(os.path.join(index.root, name))
+            for name in os.listdir(index.root)
+        )
+        self.stdout.write(
+            f"build       {elapsed:8.1f} s   {indexed} files, index "
+            f"{size / 2**20:.1f} MiB, {len(index.read_manifest()['segments'])} segment(s)"
+        )
+
+    def bench_update(self, repo, index, oid):
+        started = time.perf_counter()
+        indexed, removed = index.update(repo, oid)
+        self.stdout.write(
+            f"update      {(time.perf_counter() - started) * 1000:8.1f} ms  "
+            f"{indexed} files reindexed, {removed} old versions dropped"
+        )
+
+    def bench_queries(self, repo, index, queries, repeat):
+        for pattern, ignore_case in queries:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                results = index.search(
+                    repo, pattern, ignore_case, limit=settings.GIT_SEARCH_MAX_RESULTS
+                )
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{pattern!r:<32}{' (i)' if ignore_case else '    '} "
+                f"{statistics.median(timings) * 1000:8.1f} ms  "
+                f"{results['candidates']} candidates, {len(results['files'])}"
+                f"{'+' if results['truncated'] else ''} files"
+            )
+
+    def bench_scan(self, repo, index, pattern, sample=20000):
+        """Reads and matches a sample of the indexed files, as a grep would."""
+        regex = re.compile(pattern, re.MULTILINE)
+        docs = list(index._docs(range(1, index.read_manifest()["next_id"])))
+        if not docs:
+            return
+        sample_docs = docs[:sample]
+
+        started = time.perf_counter()
+        for _, oid in sample_docs:
+            regex.search(repo[pygit2.Oid(raw=oid)].data.decode("utf-8", "replace"))
+        elapsed = (time.perf_counter() - started) * len(docs) / len(sample_docs)
+        self.stdout.write(
+            f"full scan   {elapsed * 1000:8.1f} ms  estimated from "
+            f"{len(sample_docs)} of {len(docs)} files"
+        )
+
+    def create_synthetic(self, repository, count):
+        rng = random.Random(count)
+        lines = [self.line(rng) for _ in range(20000)]
+
+        def files():
+            for n in range(count):
+                body = [f"# file {n}\n", f"TOKEN = 'needle_{n}'\n"]
+                body.extend(rng.choices(lines, k=12))
+                yield self.path(n), "".join(body).encode()
+
+        return self.fast_import(repository, files(), None)
+
+    def change_synthetic(self, repository, parent, count, changes):
+        rng = random.Random(-changes)
+
+        def files():
+            for n in rng.sample(range(count), min(changes, count)):
+                yield self.path(n), f"# changed {n}\nOMEGA_LIMIT = {n}\n".encode()
+
+        return self.fast_import(repository, files(), parent)
+
+    def path(self, n):
+        return f"src/d{n // FILES_PER_DIR:04d}/module_{n}.py"
+
+    def line(self, rng):
+        a, b = rng.choice(WORDS), rng.choice(WORDS)
+        return rng.choice(
+            [
+                f"def handle_{a}(self, {b}):\n",
+                f"    return self.{b}_{a}\n",
+                f"class {a.title()}Service({b.title()}Base):\n",
+                f"    {a}_{b} = {rng.randrange(10**6)}\n",
+                f"import {a}.{b}\n",
+            ]
+        )
+
+    def fast_import(self, repository, files, parent):
+        """Commits files (path, content) to the scratch branch with git fast-import."""
+        ref = f"{BRANCH_PREFIX}{BENCH_BRANCH}"
+        process = subprocess.Popen(
+            [settings.GIT_BINARY, "fast-import", "--quiet"],
+            cwd=repository.repo_path,
+            stdin=subprocess.PIPE,
+        )
+        stream = process.stdin
+        message = b"Synthetic files"
+        if not parent:
+            # Replaces a scratch branch kept by an earlier run
+            stream.write(f"reset {ref}\n".encode())
+        stream.write(
+            f"commit {ref}\ncommitter Gitsap Bench <bench@gitsap.invalid> "
+            f"{int(time.time())} +0000\ndata {len(message)}\n".encode()
+            + message
+            + b"\n"
+        )
+        if parent:
+            stream.write(f"from {parent}\n".encode())
+        else:
+            stream.write(b"deleteall\n")
+        for path, content in files:
+            stream.write(f"M 100644 inline {path}\ndata {len(content)}\n".encode())
+            stream.write(content + b"\n")
+        stream.close()
+        if process.wait():
+            raise CommandError("git fast-import failed")
+
+        with repository.open() as repo:
+            return str(repo.references[ref].target)
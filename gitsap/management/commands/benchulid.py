@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from ulid import ULID
+
+from gitsap.utils.generator import encode_base32, generate_ulid, generate_ulids
+
+
+def legacy_generate_ulid():
+    # The generator before monotonic batches, kept here as the baseline
+    timestamp = int(time.time() * 1000)
+    randomness = int.from_bytes(os.urandom(10), "big")
+    return encode_base32(timestamp, 10) + encode_base32(randomness, 16)
+
+
+class Command(BaseCommand):
+    help = "Dev utility: benchmark ULID generation strategies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=100_000, help="IDs generated per run"
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per strategy")
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        if count < 1 or options["repeat"] < 1:
+            raise CommandError("--count and --repeat must be positive")
+
+        strategies = [
+            (
+                "legacy generate_ulid",
+                lambda: [legacy_generate_ulid() for _ in range(count)],
+            ),
+            ("python-ulid", lambda: [str(ULID()) for _ in range(count)]),
+            ("generate_ulid", lambda: [generate_ulid() for _ in range(count)]),
+            ("generate_ulids (batch)", lambda: generate_ulids(count)),
+            (
+                "generate_ulids (batch, lowercase)",
+                lambda: generate_ulids(count, lowercase=True),
+            ),
+        ]
+
+        self.stdout.write(f"{count} IDs per run, best of {options['repeat']}")
+        for name, run in strategies:
+            best = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            self.stdout.write(
+                f"  {name:<36} {best * 1000:8.1f} ms  "
+                f"{best / count * 1_000_000_000:7.0f} ns/id"
+            )
@@ -0,0 +1,180 @@
+import asyncio
+import hmac
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import override_settings
+
+from gitsap.models import (
+    Project,
+    Webhook,
+    WebhookDelivery,
+    WebhookDeliveryStatusChoice,
+    WebhookPayload,
+)
+from gitsap.webhooks import events
+from gitsap.webhooks.delivery import Deliverer, sign
+
+SECRET = "benchwebhooks"
+
+
+class StandIn:
+    """A local receiver answering status after delay seconds, and counting."""
+
+    def __init__(self, name, delay=0.0, status=200):
+        self.name = name
+        self.requests = 0
+        self.bad_signatures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_request_at = None
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                signature = self.headers.get("X-Gitsap-Signature-256", "")
+                with stand_in.lock:
+                    stand_in.requests += 1
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(
+                        stand_in.max_in_flight, stand_in.in_flight
+                    )
+                    if not hmac.compare_digest(signature, sign(SECRET, body)):
+                        stand_in.bad_signatures += 1
+                time.sleep(delay)
+                with stand_in.lock:
+                    stand_in.in_flight -= 1
+                    stand_in.last_request_at = time.perf_counter()
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/{name}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class Command(BaseCommand):
+    help = (
+        "Dev utility: deliver a burst of push events to local stand-in "
+        "receivers, fast, slow and failing ones, and report how each fared"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project the webhooks are added to")
+        parser.add_argument(
+            "--events", type=int, default=1000, help="Push events in the burst"
+        )
+        parser.add_argument(
+            "--fast", type=int, default=3, help="Receivers answering at once"
+        )
+        parser.add_argument(
+            "--slow-delay",
+            type=float,
+            default=1.0,
+            help="Seconds the slow receiver takes to answer, 0 for none",
+        )
+        parser.add_argument(
+            "--no-failing",
+            action="store_true",
+            help="Leave out the receiver answering 500",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=60, help="Seconds to deliver for"
+        )
+
+    def handle(self, *args, **options):
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"No project {options['namespace']}")
+        if options["events"] < 1:
+            raise CommandError("--events must be positive")
+
+        stand_ins = [StandIn(f"fast-{i}") for i in range(options["fast"])]
+        if options["slow_delay"] > 0:
+            stand_ins.append(StandIn("slow", delay=options["slow_delay"]))
+        if not options["no_failing"]:
+            stand_ins.append(StandIn("failing", status=500))
+
+        webhooks = Webhook.objects.bulk_create(
+            [
+                Webhook(project=project, url=stand_in.url, secret=SECRET)
+                for stand_in in stand_ins
+            ]
+        )
+        webhook_ids = [webhook.pk for webhook in webhooks]
+        try:
+            self.run(project, stand_ins, webhook_ids, options)
+        finally:
+            payload_ids = set(
+                WebhookDelivery.objects.filter(webhook_id__in=webhook_ids).values_list(
+                    "payload_id", flat=True
+                )
+            )
+            Webhook.objects.filter(id__in=webhook_ids).delete()
+            WebhookPayload.objects.filter(id__in=payload_ids).delete()
+            for stand_in in stand_ins:
+                stand_in.server.shutdown()
+
+    def run(self, project, stand_ins, webhook_ids, options):
+        bodies = [
+            {
+                "event": "push",
+                "project": {"id": project.pk, "namespace": project.namespace},
+                "ref": "refs/heads/main",
+                "before": f"{i:040x}",
+                "after": f"{i + 1:040x}",
+            }
+            for i in range(options["events"])
+        ]
+        started = time.perf_counter()
+        queued = events.queue_event(
+            project, "push", bodies, Webhook.objects.filter(id__in=webhook_ids)
+        )
+        self.stdout.write(
+            f"Queued {queued} deliveries in {time.perf_counter() - started:.2f}s"
+        )
+
+        started = time.perf_counter()
+        # The stand-ins listen on loopback, which deliveries refuse by default
+        with override_settings(WEBHOOK_ALLOW_LOCAL_NETWORKS=True):
+            attempts = asyncio.run(Deliverer().run(options["duration"]))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{attempts} attempts in {elapsed:.1f}s, {attempts / elapsed:.0f}/s"
+        )
+
+        webhooks = Webhook.objects.in_bulk(webhook_ids)
+        counts = {}
+        for webhook_id, status, count in (
+            WebhookDelivery.objects.filter(webhook_id__in=webhook_ids)
+            .values_list("webhook_id", "status")
+            .annotate(count=Count("id"))
+        ):
+            counts[webhook_id, status] = count
+        for stand_in, webhook_id in zip(stand_ins, webhook_ids):
+            webhook = webhooks[webhook_id]
+            delivered = counts.get((webhook_id, WebhookDeliveryStatusChoice.SUCCESS), 0)
+            line = (
+                f"  {stand_in.name:<8} {delivered:>6} delivered"
+                f"  {stand_in.requests:>6} requests"
+                f"  max {stand_in.max_in_flight} at once"
+            )
+            if delivered == options["events"] and stand_in.last_request_at:
+                line += f"  done after {stand_in.last_request_at - started:.1f}s"
+            if webhook.is_circuit_open:
+                line += f"  circuit open after {webhook.consecutive_failures} failures"
+            if stand_in.bad_signatures:
+                line += f"  {stand_in.bad_signatures} bad signatures"
+            self.stdout.write(line)
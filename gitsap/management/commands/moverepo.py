@@ -0,0 +1,50 @@
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gitsap.access import invalidate_namespace
+from gitsap.models import Project
+from gitsap.tasks import update_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a repository to another storage shard while it stays online, "
+        "locking pushes out only for the final copy"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("namespace", help="Project namespace (e.g. acme/api)")
+        parser.add_argument("shard", help="Target shard in GIT_STORAGE_SHARDS")
+
+    def handle(self, *args, **options):
+        shard = options["shard"]
+        if shard not in settings.GIT_STORAGE_SHARDS:
+            raise CommandError(f"Unknown shard: {shard}")
+        project = Project.objects.filter(namespace=options["namespace"]).first()
+        if project is None:
+            raise CommandError(f"Unknown project: {options['namespace']}")
+
+        repository = project.repository
+        started = time.monotonic()
+        try:
+            old_path = repository.move_to(shard)
+        except TimeoutError:
+            raise CommandError("The repository stayed locked by pushes or maintenance")
+        if old_path is None:
+            self.stdout.write(f"Already in {shard}")
+            return
+
+        # Cached access results still hold the old path
+        invalidate_namespace(project.namespace)
+        # An index update that waited for the move wrote to the old copy
+        update_search_index.delay(repository.pk)
+        self.stdout.write(
+            f"Moved to {repository.repo_path} in {time.monotonic() - started:.1f}s"
+        )
+
+        time.sleep(settings.GIT_STORAGE_MOVE_GRACE)
+        shutil.rmtree(old_path)
+        self.stdout.write(f"Deleted {old_path}")
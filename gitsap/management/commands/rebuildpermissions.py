@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gitsap.models import EffectiveProjectPermission
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the effective_project_permissions table from the permission records"
+    )
+
+    def handle(self, *args, **options):
+        EffectiveProjectPermission.rebuild()
+        count = EffectiveProjectPermission.objects.count()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} effective permissions"))
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gitsap.git import storage
+from gitsap.models import Repository
+from gitsap.tasks import provision_repository, refill_spare_repositories
+
+
+class Command(BaseCommand):
+    help = "Compare the repositories on disk in every storage shard with the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help=(
+                "Provision missing empty repositories, delete orphaned "
+                "directories and stale spares, and refill the spare pool"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        fix = options["fix"]
+
+        on_disk = {
+            os.path.realpath(path)
+            for shard in settings.GIT_STORAGE_SHARDS
+            for path in storage.iter_repo_paths(shard)
+        }
+        known = {}
+        for repository in Repository.objects.select_related("project"):
+            known[os.path.realpath(repository.repo_path)] = repository
+
+        for path in sorted(on_disk - known.keys()):
+            self.stdout.write(f"Orphaned: {path}")
+            if fix:
+                shutil.rmtree(path)
+                self.stdout.write("  deleted")
+
+        for path in sorted(known.keys() - on_disk):
+            repository = known[path]
+            self.stdout.write(f"Missing:  {path} ({repository.project.namespace})")
+            if not repository.is_empty:
+                # Content was lost, an empty repository would hide that
+                self.stdout.write(
+                    self.style.ERROR("  has pushed content, not recreated")
+                )
+                continue
+
+            if fix:
+                Repository.objects.filter(pk=repository.pk).update(provisioned_at=None)
+                provision_repository(repository.pk)
+                self.stdout.write("  provisioned")
+
+        for shard in settings.GIT_STORAGE_SHARDS:
+            self.stdout.write(f"Spares:   {len(storage.list_spares(shard))} ({shard})")
+            if fix:
+                removed = storage.remove_stale_spares(shard)
+                self.stdout.write(f"  removed {removed} stale")
+        if fix:
+            created = refill_spare_repositories()
+            self.stdout.write(f"  created {created}")
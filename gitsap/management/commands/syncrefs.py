@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from gitsap.models import Repository
+from gitsap.tasks import sync_git_refs
+
+
+class Command(BaseCommand):
+    help = "Rebuild the git_refs index from the refs on disk"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "namespaces",
+            nargs="*",
+            help="Project namespaces to sync (default: every non-empty repository)",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run in this process instead of queueing Celery tasks",
+        )
+
+    def handle(self, *args, **options):
+        repositories = Repository.objects.filter(is_empty=False)
+        if options["namespaces"]:
+            repositories = repositories.filter(
+                project__namespace__in=options["namespaces"]
+            )
+
+        for repository_id in repositories.values_list("pk", flat=True):
+            if options["sync"]:
+                created, updated, deleted = sync_git_refs(repository_id)
+                self.stdout.write(
+                    f"Synced {repository_id}: " f"+{created} ~{updated} -{deleted}"
+                )
+            else:
+                sync_git_refs.delay(repository_id)
+                self.stdout.write(f"Queued {repository_id}")
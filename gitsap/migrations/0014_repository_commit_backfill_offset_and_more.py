@@ -0,0 +1,81 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:38
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0013_project_organization"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="commit_backfill_offset",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="commit_backfill_tips",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="commits_indexed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="GitCommit",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("sha", models.CharField(max_length=40)),
+                (
+                    "parent_shas",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.CharField(max_length=40), default=list
+                    ),
+                ),
+                ("message", models.TextField()),
+                ("author_name", models.CharField(max_length=255)),
+                ("author_email", models.EmailField(max_length=254)),
+                ("authored_at", models.DateTimeField()),
+                ("committer_name", models.CharField(max_length=255)),
+                ("committer_email", models.EmailField(max_length=254)),
+                ("committed_at", models.DateTimeField()),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="git_commits",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "git_commits",
+                "indexes": [
+                    models.Index(
+                        models.F("project"),
+                        models.OrderBy(models.F("committed_at"), descending=True),
+                        models.OrderBy(models.F("sha"), descending=True),
+                        name="git_commits_history_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project", "sha"), name="uniq_gitcommit_project_sha"
+                    )
+                ],
+            },
+        ),
+    ]
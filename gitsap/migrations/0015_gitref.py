@@ -0,0 +1,83 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0014_repository_commit_backfill_offset_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GitRef",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(db_collation="C", max_length=256)),
+                (
+                    "short_name",
+                    models.CharField(blank=True, db_collation="C", max_length=256),
+                ),
+                (
+                    "ref_type",
+                    models.CharField(
+                        choices=[
+                            ("branch", "Branch"),
+                            ("tag", "Tag"),
+                            ("remote", "Remote"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("target_sha", models.CharField(max_length=40)),
+                ("target_committed_at", models.DateTimeField(blank=True, null=True)),
+                ("is_head", models.BooleanField(default=False)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="git_refs",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "git_refs",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "ref_type", "short_name"],
+                        name="git_refs_name_idx",
+                    ),
+                    models.Index(
+                        models.F("project"),
+                        models.F("ref_type"),
+                        models.OrderBy(
+                            models.F("target_committed_at"),
+                            descending=True,
+                            nulls_last=True,
+                        ),
+                        name="git_refs_recent_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project", "name"), name="uniq_gitref_project_name"
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("is_head", True)),
+                        fields=("project",),
+                        name="uniq_gitref_single_head_per_project",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0015_gitref"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EffectiveProjectPermission",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "pk",
+                    models.CompositePrimaryKey(
+                        "user",
+                        "project",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("role", models.CharField(max_length=16)),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_permissions",
+                        to="gitsap.organization",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_permissions",
+                        to="gitsap.project",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_permissions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "effective_project_permissions",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "user"], name="effective_perm_project_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+def mark_existing_provisioned(apps, schema_editor):
+    # Repositories created before provisioning moved to Celery exist on disk
+    Repository = apps.get_model("gitsap", "Repository")
+    Repository.objects.update(provisioned_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0016_effectiveprojectpermission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="provisioned_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_provisioned, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0017_repository_provisioned_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PullRequest",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("title", models.CharField(max_length=256)),
+                ("description", models.TextField(blank=True, null=True)),
+                ("source_branch", models.CharField(max_length=255)),
+                ("target_branch", models.CharField(max_length=255)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("open", "Open"),
+                            ("closed", "Closed"),
+                            ("merged", "Merged"),
+                        ],
+                        default="open",
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="pull_requests",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pull_requests",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "pull_requests",
+                "indexes": [
+                    models.Index(
+                        models.F("project"),
+                        models.F("state"),
+                        models.OrderBy(models.F("created_at"), descending=True),
+                        name="pull_requests_list_idx",
+                    )
+                ],
+            },
+        ),
+    ]
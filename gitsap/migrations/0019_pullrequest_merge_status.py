@@ -0,0 +1,67 @@
+# Generated by Django 6.0.3 on 2026-10-18 14:57
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0018_pullrequest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pullrequest",
+            name="conflict_paths",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.TextField(), blank=True, default=list
+            ),
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="merge_checked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="merge_checked_source_sha",
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="merge_checked_target_sha",
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="pullrequest",
+            name="merge_status",
+            field=models.CharField(
+                choices=[
+                    ("unchecked", "Unchecked"),
+                    ("mergeable", "Mergeable"),
+                    ("conflicting", "Conflicting"),
+                ],
+                default="unchecked",
+                max_length=16,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pullrequest",
+            index=models.Index(
+                models.F("project"),
+                models.F("source_branch"),
+                condition=models.Q(("state", "open")),
+                name="pull_requests_open_source_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pullrequest",
+            index=models.Index(
+                models.F("project"),
+                models.F("target_branch"),
+                condition=models.Q(("state", "open")),
+                name="pull_requests_open_target_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.3 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0019_pullrequest_merge_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="maintained_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="repository",
+            name="pushes_since_maintenance",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0020_repository_maintenance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="repository",
+            name="shard",
+            field=models.CharField(default="default", max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.3 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0022_pipelines"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="job",
+            name="log",
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="log_size",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
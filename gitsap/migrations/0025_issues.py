@@ -0,0 +1,232 @@
+# Generated by Django 6.0.3 on 2026-10-18 16:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE FUNCTION issues_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER issues_search_vector
+    BEFORE INSERT OR UPDATE OF title, description ON issues
+    FOR EACH ROW EXECUTE FUNCTION issues_search_vector_update();
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER issues_search_vector ON issues;
+DROP FUNCTION issues_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0024_webhooks"),
+    ]
+
+    operations = [
+        # issues_search_idx combines the project and state btree columns
+        # with the search vector
+        django.contrib.postgres.operations.BtreeGinExtension(),
+        migrations.CreateModel(
+            name="Issue",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("number", models.PositiveIntegerField()),
+                ("title", models.CharField(max_length=256)),
+                ("description", models.TextField(blank=True)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[("open", "Open"), ("closed", "Closed")],
+                        default="open",
+                        max_length=16,
+                    ),
+                ),
+                ("closed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "search_vector",
+                    django.contrib.postgres.search.SearchVectorField(
+                        blank=True, editable=False, null=True
+                    ),
+                ),
+                (
+                    "assignee",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="assigned_issues",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="issues",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="issues",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "issues",
+            },
+        ),
+        migrations.CreateModel(
+            name="Label",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("name", models.CharField(max_length=64)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="labels",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "labels",
+            },
+        ),
+        migrations.CreateModel(
+            name="IssueLabel",
+            fields=[
+                (
+                    "pk",
+                    models.CompositePrimaryKey(
+                        "issue",
+                        "label",
+                        blank=True,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[("open", "Open"), ("closed", "Closed")], max_length=16
+                    ),
+                ),
+                ("number", models.PositiveIntegerField()),
+                (
+                    "issue",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="issue_labels",
+                        to="gitsap.issue",
+                    ),
+                ),
+                (
+                    "label",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="issue_labels",
+                        to="gitsap.label",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "issue_labels",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                models.F("project"),
+                models.F("state"),
+                models.OrderBy(models.F("number"), descending=True),
+                name="issues_list_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                models.F("project"),
+                models.F("assignee"),
+                models.F("state"),
+                models.OrderBy(models.F("number"), descending=True),
+                name="issues_assignee_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=django.contrib.postgres.indexes.GinIndex(
+                models.F("project"),
+                models.F("state"),
+                models.F("search_vector"),
+                name="issues_search_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issue",
+            index=models.Index(
+                models.F("project"),
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"),
+                    name="text_pattern_ops",
+                ),
+                name="issues_title_prefix_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="issue",
+            constraint=models.UniqueConstraint(
+                fields=("project", "number"), name="unique_project_issue_number"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="label",
+            constraint=models.UniqueConstraint(
+                fields=("project", "name"), name="unique_project_label_name"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="issuelabel",
+            index=models.Index(
+                models.F("label"),
+                models.F("state"),
+                models.OrderBy(models.F("number"), descending=True),
+                name="issue_labels_list_idx",
+            ),
+        ),
+        migrations.RunSQL(
+            sql=SEARCH_VECTOR_TRIGGER, reverse_sql=DROP_SEARCH_VECTOR_TRIGGER
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0.3 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_existing_rows(apps, schema_editor):
+    # Later changes are counted as they are written
+    Project = apps.get_model("gitsap", "Project")
+    ProjectCounters = apps.get_model("gitsap", "ProjectCounters")
+
+    counters = {
+        pk: ProjectCounters(project_id=pk)
+        for pk in Project.objects.values_list("pk", flat=True)
+    }
+    for prefix, model, column in (
+        ("issues", "Issue", "state"),
+        ("pull_requests", "PullRequest", "state"),
+        ("pipelines", "Pipeline", "status"),
+    ):
+        rows = (
+            apps.get_model("gitsap", model)
+            .objects.values_list("project_id", column)
+            .annotate(count=models.Count("*"))
+            .order_by()
+        )
+        for project_id, value, count in rows:
+            setattr(counters[project_id], f"{prefix}_{value}", count)
+    branches = (
+        apps.get_model("gitsap", "GitRef")
+        .objects.filter(ref_type="branch")
+        .values_list("project_id")
+        .annotate(count=models.Count("*"))
+        .order_by()
+    )
+    for project_id, count in branches:
+        counters[project_id].branches = count
+    ProjectCounters.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0025_issues"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectCounters",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="counters",
+                        serialize=False,
+                        to="gitsap.project",
+                    ),
+                ),
+                ("issues_open", models.IntegerField(default=0)),
+                ("issues_closed", models.IntegerField(default=0)),
+                ("pull_requests_open", models.IntegerField(default=0)),
+                ("pull_requests_merged", models.IntegerField(default=0)),
+                ("pull_requests_closed", models.IntegerField(default=0)),
+                ("branches", models.IntegerField(default=0)),
+                ("pipelines_pending", models.IntegerField(default=0)),
+                ("pipelines_running", models.IntegerField(default=0)),
+                ("pipelines_success", models.IntegerField(default=0)),
+                ("pipelines_failed", models.IntegerField(default=0)),
+                ("pipelines_canceled", models.IntegerField(default=0)),
+            ],
+            options={
+                "db_table": "project_counters",
+            },
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
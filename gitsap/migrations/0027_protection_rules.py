@@ -0,0 +1,61 @@
+# Generated by Django 6.0.3 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gitsap", "0026_project_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProtectionRule",
+            fields=[
+                (
+                    "id",
+                    models.CharField(
+                        editable=False, max_length=40, primary_key=True, serialize=False
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "ref_type",
+                    models.CharField(
+                        choices=[
+                            ("branch", "Branch"),
+                            ("tag", "Tag"),
+                            ("remote", "Remote"),
+                        ],
+                        default="branch",
+                        max_length=16,
+                    ),
+                ),
+                ("pattern", models.CharField(max_length=256)),
+                ("restrict_pushes", models.BooleanField(default=False)),
+                ("allow_force_pushes", models.BooleanField(default=False)),
+                ("allow_deletions", models.BooleanField(default=False)),
+                ("require_linear_history", models.BooleanField(default=False)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="protection_rules",
+                        to="gitsap.project",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "protection_rules",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project", "ref_type", "pattern"),
+                        name="unique_project_protection_pattern",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,7 +1,48 @@
-from django.http import HttpResponseForbidden
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404, HttpResponseForbidden
+from django.shortcuts import redirect
 
-from gitsap.models import Project, ProjectVisibilityChoice
+from gitsap.access import resolve_project_access, aresolve_project_access
+from gitsap.models import (
+    OrganizationPermissionChoice,
+    ProjectRoleChoice,
+    ProjectVisibilityChoice,
+)
+
+# Roles that may push, and change the project short of its settings
+ORGANIZATION_WRITE_ROLES = {
+    OrganizationPermissionChoice.OWNER,
+    OrganizationPermissionChoice.ADMIN,
+    OrganizationPermissionChoice.MAINTAINER,
+    OrganizationPermissionChoice.COLLABORATOR,
+}
+PROJECT_WRITE_ROLES = {
+    ProjectRoleChoice.OWNER,
+    ProjectRoleChoice.MAINTAINER,
+    ProjectRoleChoice.DEVELOPER,
+}
+# Roles that may change the settings of a project, and push past the
+# protection rules restricting pushes
+ORGANIZATION_MANAGE_ROLES = {
+    OrganizationPermissionChoice.OWNER,
+    OrganizationPermissionChoice.ADMIN,
+}
+PROJECT_MANAGE_ROLES = {ProjectRoleChoice.OWNER, ProjectRoleChoice.MAINTAINER}
+
+
+def can_write(request):
+    """Whether the roles attached to request by ProjectAccessMixin may write."""
+    return (
+        getattr(request, "organization_role", None) in ORGANIZATION_WRITE_ROLES
+        or getattr(request, "project_role", None) in PROJECT_WRITE_ROLES
+    )
+
+
+def can_manage(request):
+    """Whether the roles attached to request may change the project settings."""
+    return (
+        getattr(request, "organization_role", None) in ORGANIZATION_MANAGE_ROLES
+        or getattr(request, "project_role", None) in PROJECT_MANAGE_ROLES
+    )
 
 
 class ProjectAccessMixin:
@@ -17,61 +58,104 @@ class ProjectAccessMixin:
     """
 
     def dispatch(self, request, **kwargs):
-        project = get_object_or_404(Project, namespace=kwargs["namespace"])
-        request.project = project
+        access = resolve_project_access(request.user, kwargs["namespace"])
+        if access is None:
+            raise Http404("No Project matches the given query.")
+
+        request.project = access.project
+
+        allowed = self.check_project_access(request, access)
+
+        # Internal and private require authentication
+        if allowed is None:
+            return redirect("login")
+
+        if not allowed:
+            return HttpResponseForbidden()
+
+        return super().dispatch(request, **kwargs)
 
-        visibility = project.visibility
+    @classmethod
+    def check_project_access(cls, request, access):
+        """
+        Applies the visibility rules of access.project to request.user.
+
+        Returns True when access is granted, False when it is forbidden and
+        None when the user has to authenticate first. Only ``request.user`` is
+        read, so callers outside the Django view stack (e.g. the Git HTTP
+        transport) can pass any object carrying a user.
+        """
+        visibility = access.project.visibility
 
         # Public projects are accessible to everyone
         if visibility == ProjectVisibilityChoice.PUBLIC:
-            self._attach_permission(request, project)
-            return super().dispatch(request, **kwargs)
+            cls._attach_permission(request, access)
+            return True
 
         # Internal and private require authentication
         if not request.user.is_authenticated:
-            return redirect("login")
+            return None
 
         # Internal projects are accessible to any authenticated user
         if visibility == ProjectVisibilityChoice.INTERNAL:
-            self._attach_permission(request, project)
-            return super().dispatch(request, **kwargs)
+            cls._attach_permission(request, access)
+            return True
 
         # Private: must have explicit org or project-level permission
         if visibility == ProjectVisibilityChoice.PRIVATE:
-            if not self._attach_permission(request, project):
-                return HttpResponseForbidden()
-            return super().dispatch(request, **kwargs)
+            return cls._attach_permission(request, access)
 
-        return HttpResponseForbidden()
+        return False
 
-    def _attach_permission(self, request, project):
+    @classmethod
+    def _attach_permission(cls, request, access):
         """
         Attaches permission context to the request.
         Returns True if the user has an explicit permission record, False otherwise.
-        For unauthenticated users always returns False without querying the DB.
+        The roles were resolved along with the project, so this never queries.
         """
         if not request.user.is_authenticated:
             return False
 
+        project = access.project
         if project.organization_id:
             request.organization = project.organization
-            org_permission = (
-                project.organization.permissions
-                .filter(user=request.user)
-                .first()
-            )
-            if org_permission:
-                request.organization_role = org_permission.role
+            if access.organization_role:
+                request.organization_role = access.organization_role
                 return True
             return False
 
-        project_permission = (
-            project.permissions
-            .filter(user=request.user)
-            .first()
-        )
-        if project_permission:
-            request.project_role = project_permission.role
+        if access.project_role:
+            request.project_role = access.project_role
             return True
 
         return False
+
+
+class AsyncProjectAccessMixin:
+    """
+    ProjectAccessMixin for views whose handlers are async. Resolves the user
+    and the project through the async ORM and cache APIs, and applies the
+    same rules with ProjectAccessMixin.check_project_access.
+    """
+
+    async def dispatch(self, request, **kwargs):
+        # The lazy request.user would query synchronously on first use
+        request.user = await request.auser()
+
+        access = await aresolve_project_access(request.user, kwargs["namespace"])
+        if access is None:
+            raise Http404("No Project matches the given query.")
+
+        request.project = access.project
+
+        allowed = ProjectAccessMixin.check_project_access(request, access)
+
+        # Internal and private require authentication
+        if allowed is None:
+            return redirect("login")
+
+        if not allowed:
+            return HttpResponseForbidden()
+
+        return await super().dispatch(request, **kwargs)
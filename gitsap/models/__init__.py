@@ -3,11 +3,28 @@ from gitsap.models.choices import (
     UserRoleChoice,
     ProjectRoleChoice,
     ProjectVisibilityChoice,
-    OrganizationPermissionChoice
+    OrganizationPermissionChoice,
+    GitRefTypeChoice,
+    GitFileChangeTypeChoice,
+    PullRequestStateChoice,
+    MergeStatusChoice,
+    IssueStateChoice,
+    PipelineStatusChoice,
+    JobStatusChoice,
+    WebhookDeliveryStatusChoice,
 )
 from gitsap.models.project import Project, ProjectPermission
 from gitsap.models.repository import Repository
+from gitsap.models.counters import ProjectCounters
+from gitsap.models.commit import GitCommit
+from gitsap.models.ref import GitRef
+from gitsap.models.protection import ProtectionRule
 from gitsap.models.organization import Organization, OrganizationPermission
+from gitsap.models.effective_permission import EffectiveProjectPermission
+from gitsap.models.pull_request import PullRequest
+from gitsap.models.issue import Issue, Label, IssueLabel
+from gitsap.models.pipeline import Pipeline, Job
+from gitsap.models.webhook import Webhook, WebhookPayload, WebhookDelivery
 
 __all__ = [
     "User",
@@ -17,7 +34,29 @@ __all__ = [
     "ProjectRoleChoice",
     "ProjectVisibilityChoice",
     "Repository",
+    "ProjectCounters",
+    "GitCommit",
+    "GitRef",
+    "GitRefTypeChoice",
+    "ProtectionRule",
     "Organization",
     "OrganizationPermission",
-    "OrganizationPermissionChoice"
+    "OrganizationPermissionChoice",
+    "EffectiveProjectPermission",
+    "PullRequest",
+    "PullRequestStateChoice",
+    "MergeStatusChoice",
+    "GitFileChangeTypeChoice",
+    "Issue",
+    "IssueStateChoice",
+    "Label",
+    "IssueLabel",
+    "Pipeline",
+    "Job",
+    "PipelineStatusChoice",
+    "JobStatusChoice",
+    "Webhook",
+    "WebhookPayload",
+    "WebhookDelivery",
+    "WebhookDeliveryStatusChoice",
 ]
@@ -38,3 +38,44 @@ class OrganizationPermissionChoice(TextChoices):
     MAINTAINER = ("maintainer", "Maintainer")
     COLLABORATOR = ("collaborator", "Collaborator")
     VIEWER = ("viewer", "Viewer")
+
+
+class PullRequestStateChoice(TextChoices):
+    OPEN = ("open", "Open")
+    CLOSED = ("closed", "Closed")
+    MERGED = ("merged", "Merged")
+
+
+class IssueStateChoice(TextChoices):
+    OPEN = ("open", "Open")
+    CLOSED = ("closed", "Closed")
+
+
+class MergeStatusChoice(TextChoices):
+    UNCHECKED = ("unchecked", "Unchecked")
+    MERGEABLE = ("mergeable", "Mergeable")
+    CONFLICTING = ("conflicting", "Conflicting")
+
+
+class PipelineStatusChoice(TextChoices):
+    PENDING = ("pending", "Pending")
+    RUNNING = ("running", "Running")
+    SUCCESS = ("success", "Success")
+    FAILED = ("failed", "Failed")
+    CANCELED = ("canceled", "Canceled")
+
+
+class JobStatusChoice(TextChoices):
+    QUEUED = ("queued", "Queued")
+    DISPATCHED = ("dispatched", "Dispatched")
+    RUNNING = ("running", "Running")
+    SUCCESS = ("success", "Success")
+    FAILED = ("failed", "Failed")
+    CANCELED = ("canceled", "Canceled")
+
+
+class WebhookDeliveryStatusChoice(TextChoices):
+    PENDING = ("pending", "Pending")
+    DELIVERING = ("delivering", "Delivering")
+    SUCCESS = ("success", "Success")
+    FAILED = ("failed", "Failed")
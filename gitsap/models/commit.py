@@ -0,0 +1,152 @@
+from django.db import models
+from django.contrib.postgres.fields import ArrayField
+
+from gitsap.models.shared import BaseModel
+from gitsap.git.commits import commit_time
+
+
+def _decode(raw, max_length=None):
+    value = raw.decode("utf-8", "replace").replace("\x00", "")
+    return value[:max_length] if max_length else value
+
+
+class GitCommit(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="git_commits"
+    )
+    sha = models.CharField(max_length=40)
+    parent_shas = ArrayField(models.CharField(max_length=40), default=list)
+    message = models.TextField()
+    author_name = models.CharField(max_length=255)
+    author_email = models.EmailField()
+    authored_at = models.DateTimeField()
+    committer_name = models.CharField(max_length=255)
+    committer_email = models.EmailField()
+    committed_at = models.DateTimeField()
+
+    ID_PREFIX = "cmt"
+
+    class Meta:
+        db_table = "git_commits"
+        indexes = [
+            # Keyset pagination: newest first, sha breaks ties
+            models.Index(
+                "project",
+                models.F("committed_at").desc(),
+                models.F("sha").desc(),
+                name="git_commits_history_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "sha"], name="uniq_gitcommit_project_sha"
+            )
+        ]
+
+    @classmethod
+    def from_pygit2(cls, project, commit):
+        return cls(
+            project=project,
+            sha=str(commit.id),
+            parent_shas=[str(oid) for oid in commit.parent_ids],
+            message=_decode(commit.raw_message),
+            author_name=_decode(commit.author.raw_name, 255),
+            author_email=_decode(commit.author.raw_email, 254),
+            authored_at=commit_time(commit.author),
+            committer_name=_decode(commit.committer.raw_name, 255),
+            committer_email=_decode(commit.committer.raw_email, 254),
+            committed_at=commit_time(commit.committer),
+        )
+
+    @classmethod
+    def bulk_index(cls, project, commits, batch_size):
+        """
+        Writes commits (pygit2 objects) in bulk_create batches of batch_size,
+        skipping those already indexed. Yields the running count after each
+        batch so callers can checkpoint.
+        """
+        batch = []
+        written = 0
+        for commit in commits:
+            batch.append(cls.from_pygit2(project, commit))
+            if len(batch) >= batch_size:
+                cls.objects.bulk_create(batch, ignore_conflicts=True)
+                written += len(batch)
+                batch = []
+                yield written
+
+        if batch:
+            cls.objects.bulk_create(batch, ignore_conflicts=True)
+            written += len(batch)
+            yield written
+
+    @classmethod
+    def prune(cls, project, commits, batch_size):
+        """
+        Deletes commits (pygit2 objects) from the index of project, in
+        batches of batch_size. Returns how many rows were deleted.
+        """
+        deleted = 0
+        shas = []
+        for commit in commits:
+            shas.append(str(commit.id))
+            if len(shas) >= batch_size:
+                deleted += cls.objects.filter(project=project, sha__in=shas).delete()[0]
+                shas = []
+        if shas:
+            deleted += cls.objects.filter(project=project, sha__in=shas).delete()[0]
+        return deleted
+
+    @classmethod
+    def _history_queryset(cls, project, cursor):
+        queryset = cls.objects.filter(project=project).order_by("-committed_at", "-sha")
+        if cursor:
+            # The range on committed_at is the index seek, excluding the
+            # ties at or above the cursor sha only filters a few rows
+            queryset = queryset.filter(
+                committed_at__lte=cursor["committed_at"]
+            ).exclude(committed_at=cursor["committed_at"], sha__gte=cursor["sha"])
+        return queryset
+
+    @classmethod
+    def history_page(cls, project, after=None, limit=50):
+        """
+        Returns (commits, has_next) for the page following the commit with sha
+        after, newest first. The (committed_at, sha) keyset is served by
+        git_commits_history_idx, so deep pages cost the same as the first.
+        """
+        cursor = None
+        if after:
+            cursor = (
+                cls.objects.filter(project=project, sha=after)
+                .values("committed_at", "sha")
+                .first()
+            )
+
+        commits = list(cls._history_queryset(project, cursor)[: limit + 1])
+        return commits[:limit], len(commits) > limit
+
+    @classmethod
+    async def ahistory_page(cls, project, after=None, limit=50):
+        """Async version of history_page()."""
+        cursor = None
+        if after:
+            cursor = await (
+                cls.objects.filter(project=project, sha=after)
+                .values("committed_at", "sha")
+                .afirst()
+            )
+
+        commits = [
+            commit
+            async for commit in cls._history_queryset(project, cursor)[: limit + 1]
+        ]
+        return commits[:limit], len(commits) > limit
+
+    @property
+    def short_sha(self):
+        return self.sha[:7]
+
+    @property
+    def title(self):
+        return self.message.split("\n", 1)[0]
@@ -0,0 +1,105 @@
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from gitsap.models.shared import BaseTimestampModel
+from gitsap.models.choices import (
+    IssueStateChoice,
+    PipelineStatusChoice,
+    PullRequestStateChoice,
+)
+
+
+class ProjectCounters(BaseTimestampModel):
+    """
+    The issue, pull request, branch and pipeline counts of a project, shown
+    by the project layout without counting rows. Writers apply their deltas
+    with add() in the transaction of the rows counted; the
+    reconcile_project_counters task corrects whatever drifts anyway, e.g.
+    rows written in bulk.
+
+    Counts are signed: a count off by a missed delta goes negative rather
+    than failing the write that applies the next one.
+    """
+
+    project = models.OneToOneField(
+        "Project",
+        primary_key=True,
+        related_name="counters",
+        on_delete=models.CASCADE,
+    )
+    issues_open = models.IntegerField(default=0)
+    issues_closed = models.IntegerField(default=0)
+    pull_requests_open = models.IntegerField(default=0)
+    pull_requests_merged = models.IntegerField(default=0)
+    pull_requests_closed = models.IntegerField(default=0)
+    branches = models.IntegerField(default=0)
+    pipelines_pending = models.IntegerField(default=0)
+    pipelines_running = models.IntegerField(default=0)
+    pipelines_success = models.IntegerField(default=0)
+    pipelines_failed = models.IntegerField(default=0)
+    pipelines_canceled = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "project_counters"
+
+    COUNTER_FIELDS = [
+        *(f"issues_{state}" for state in IssueStateChoice.values),
+        *(f"pull_requests_{state}" for state in PullRequestStateChoice.values),
+        "branches",
+        *(f"pipelines_{status}" for status in PipelineStatusChoice.values),
+    ]
+
+    @classmethod
+    def add(cls, project_id, **deltas):
+        """
+        Adds deltas, {counter field: amount}, to the counts of project_id.
+        Call it inside the transaction writing the counted rows, so that
+        both commit or roll back together.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if deltas:
+            cls.objects.filter(project_id=project_id).update(
+                **{field: F(field) + delta for field, delta in deltas.items()},
+                updated_at=timezone.now(),
+            )
+
+    @classmethod
+    def move(cls, project_id, prefix, old, new):
+        """Moves one row of the prefix counts from state old to state new."""
+        if old != new:
+            cls.add(project_id, **{f"{prefix}_{old}": -1, f"{prefix}_{new}": 1})
+
+    @classmethod
+    def reconcile(cls, project_id, count):
+        """
+        Corrects the counts of project_id that drifted from count(project_id),
+        {counter field: count of rows}. Returns the corrections, {counter
+        field: count - stored count}.
+        """
+        counters = cls.objects.filter(project_id=project_id).first()
+        if counters is not None and not cls._drift(counters, count(project_id)):
+            return {}
+
+        with transaction.atomic():
+            # Writers update the row in their own transaction, so counting
+            # once it is locked sees every delta already applied and none
+            # that is not
+            counters, _ = cls.objects.select_for_update().get_or_create(
+                project_id=project_id
+            )
+            counts = count(project_id)
+            drift = cls._drift(counters, counts)
+            if drift:
+                cls.objects.filter(project_id=project_id).update(
+                    **counts, updated_at=timezone.now()
+                )
+        return drift
+
+    @classmethod
+    def _drift(cls, counters, counts):
+        return {
+            field: count - getattr(counters, field)
+            for field, count in counts.items()
+            if count != getattr(counters, field)
+        }
@@ -0,0 +1,165 @@
+from django.db import models, transaction
+from django.conf import settings
+
+from gitsap.models.shared import BaseTimestampModel
+from gitsap.models.project import Project, ProjectPermission
+from gitsap.models.organization import Organization, OrganizationPermission
+
+BATCH_SIZE = 5000
+
+
+class EffectiveProjectPermission(BaseTimestampModel):
+    """
+    Materialized (user, project, role) rows derived from ProjectPermission
+    (personal projects) and OrganizationPermission (organization projects).
+    Never edited directly: the signal handlers keep it current and the
+    rebuildpermissions command recomputes it from scratch.
+
+    The primary key (user, project) serves lookups by user; a second index
+    serves lookups by project.
+    """
+
+    pk = models.CompositePrimaryKey("user", "project")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="effective_permissions",
+    )
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="effective_permissions"
+    )
+    # Set when the role comes from an organization membership
+    organization = models.ForeignKey(
+        "Organization",
+        on_delete=models.CASCADE,
+        related_name="effective_permissions",
+        blank=True,
+        null=True,
+    )
+    role = models.CharField(max_length=16)
+
+    class Meta:
+        db_table = "effective_project_permissions"
+        indexes = [
+            models.Index(fields=["project", "user"], name="effective_perm_project_idx"),
+        ]
+
+    @classmethod
+    def _upsert(cls, rows):
+        cls.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["user", "project"],
+            update_fields=["organization", "role", "updated_at"],
+        )
+
+    @classmethod
+    def _rows_for_organization(cls, organization_id, user_id=None):
+        members = OrganizationPermission.objects.filter(organization_id=organization_id)
+        if user_id is not None:
+            members = members.filter(user_id=user_id)
+        members = list(members.values_list("user_id", "role"))
+        if not members:
+            return
+
+        project_ids = Project.objects.filter(
+            organization_id=organization_id
+        ).values_list("pk", flat=True)
+
+        for project_id in project_ids.iterator(chunk_size=BATCH_SIZE):
+            for member_id, role in members:
+                yield cls(
+                    user_id=member_id,
+                    project_id=project_id,
+                    organization_id=organization_id,
+                    role=role,
+                )
+
+    @classmethod
+    def _rows_for_project(cls, project):
+        if project.organization_id:
+            permissions = OrganizationPermission.objects.filter(
+                organization_id=project.organization_id
+            )
+        else:
+            permissions = project.permissions.all()
+
+        for user_id, role in permissions.values_list("user_id", "role"):
+            yield cls(
+                user_id=user_id,
+                project_id=project.pk,
+                organization_id=project.organization_id,
+                role=role,
+            )
+
+    @classmethod
+    def _write(cls, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                cls._upsert(batch)
+                batch = []
+        if batch:
+            cls._upsert(batch)
+
+    @classmethod
+    def sync_project(cls, project):
+        """Recomputes every row of project, e.g. after it moved organization."""
+        with transaction.atomic():
+            cls.objects.filter(project_id=project.pk).delete()
+            cls._write(cls._rows_for_project(project))
+
+    @classmethod
+    def sync_project_member(cls, project, user_id):
+        """Applies a ProjectPermission change. Organization projects ignore those."""
+        if project.organization_id:
+            return
+
+        role = (
+            project.permissions.filter(user_id=user_id)
+            .values_list("role", flat=True)
+            .first()
+        )
+        if role is None:
+            cls.objects.filter(user_id=user_id, project_id=project.pk).delete()
+        else:
+            cls._upsert(
+                [
+                    cls(
+                        user_id=user_id,
+                        project_id=project.pk,
+                        organization=None,
+                        role=role,
+                    )
+                ]
+            )
+
+    @classmethod
+    def sync_organization_member(cls, organization_id, user_id):
+        """Applies an OrganizationPermission change to every project of the org."""
+        with transaction.atomic():
+            cls.objects.filter(
+                user_id=user_id, organization_id=organization_id
+            ).delete()
+            cls._write(cls._rows_for_organization(organization_id, user_id))
+
+    @classmethod
+    def rebuild(cls):
+        """Recomputes the whole table from the permission records."""
+        with transaction.atomic():
+            cls.objects.all().delete()
+
+            personal = ProjectPermission.objects.filter(
+                project__organization__isnull=True
+            ).values_list("user_id", "project_id", "role")
+            cls._write(
+                cls(user_id=user_id, project_id=project_id, role=role)
+                for user_id, project_id, role in personal.iterator(
+                    chunk_size=BATCH_SIZE
+                )
+            )
+
+            for organization_id in Organization.objects.values_list("pk", flat=True):
+                cls._write(cls._rows_for_organization(organization_id))
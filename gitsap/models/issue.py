@@ -0,0 +1,285 @@
+from django.db import models, transaction
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.project import Project
+from gitsap.models.counters import ProjectCounters
+from gitsap.models.choices import IssueStateChoice
+
+# Text search configuration of the issues_search_vector trigger
+SEARCH_CONFIG = "english"
+# Shorter title prefixes match too many titles to rank
+TITLE_PREFIX_MIN_LENGTH = 3
+
+
+class Issue(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="issues"
+    )
+    # Sequential within the project
+    number = models.PositiveIntegerField()
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name="issues",
+    )
+    assignee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="assigned_issues",
+        blank=True,
+        null=True,
+    )
+    title = models.CharField(max_length=256)
+    description = models.TextField(blank=True)
+    state = models.CharField(
+        max_length=16,
+        choices=IssueStateChoice.choices,
+        default=IssueStateChoice.OPEN,
+    )
+    closed_at = models.DateTimeField(blank=True, null=True)
+    # Weighted title and description lexemes, set by the issues_search_vector
+    # trigger whenever either changes; whatever Django writes is replaced
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    ID_PREFIX = "iss"
+
+    class Meta:
+        db_table = "issues"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "number"], name="unique_project_issue_number"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                "project",
+                "state",
+                models.F("number").desc(),
+                name="issues_list_idx",
+            ),
+            models.Index(
+                "project",
+                "assignee",
+                "state",
+                models.F("number").desc(),
+                name="issues_assignee_idx",
+            ),
+            # btree_gin lets the project and state narrow the match in the
+            # same index scan
+            GinIndex("project", "state", "search_vector", name="issues_search_idx"),
+            # LIKE 'prefix%' is a range of this index, which also matches only
+            # real prefixes; trigrams of a prefix are shared by many titles
+            models.Index(
+                "project",
+                OpClass(Upper("title"), name="text_pattern_ops"),
+                name="issues_title_prefix_idx",
+            ),
+        ]
+
+    @classmethod
+    def create(cls, *, project, author, title, description="", assignee=None):
+        """Creates the next numbered issue of project."""
+        with transaction.atomic():
+            # Serializes numbering within the project
+            Project.objects.select_for_update().filter(pk=project.pk).first()
+            last = (
+                cls.objects.filter(project=project)
+                .order_by("-number")
+                .values_list("number", flat=True)
+                .first()
+            )
+            issue = cls.objects.create(
+                project=project,
+                number=(last or 0) + 1,
+                author=author,
+                title=title,
+                description=description,
+                assignee=assignee,
+            )
+            ProjectCounters.add(project.pk, **{f"issues_{issue.state}": 1})
+            return issue
+
+    def set_labels(self, labels):
+        """Replaces the labels of the issue."""
+        with transaction.atomic():
+            IssueLabel.objects.filter(issue=self).delete()
+            IssueLabel.objects.bulk_create(
+                [
+                    IssueLabel(
+                        issue=self, label=label, state=self.state, number=self.number
+                    )
+                    for label in labels
+                ]
+            )
+
+    def set_state(self, state):
+        """Opens or closes the issue, along with its label rows."""
+        self.state = state
+        self.closed_at = timezone.now() if state == IssueStateChoice.CLOSED else None
+        with transaction.atomic():
+            # The stored state, as another request may have changed it
+            old = (
+                Issue.objects.select_for_update()
+                .values_list("state", flat=True)
+                .get(pk=self.pk)
+            )
+            self.save(update_fields=["state", "closed_at", "updated_at"])
+            IssueLabel.objects.filter(issue=self).update(state=state)
+            ProjectCounters.move(self.project_id, "issues", old, state)
+
+    @classmethod
+    def search_page(
+        cls,
+        project,
+        text="",
+        state=None,
+        label=None,
+        assignee=None,
+        sort=None,
+        after=None,
+        limit=50,
+    ):
+        """
+        Returns (issues, has_next) for the page following the issue numbered
+        after, the newest first, or with text and the "relevance" sort, the
+        ones matching it best first. Text matches the title and description
+        words, or the start of the title.
+
+        Pages are keyset-paginated and read in list order from an index:
+        issues_list_idx, issues_assignee_idx, or issue_labels_list_idx when
+        filtering on a label. Deep pages cost the same as the first.
+
+        Ranking has to score every match before returning any, so relevance
+        is ranked among the ISSUE_SEARCH_RANK_WINDOW newest matches only,
+        found through issues_search_idx and issues_title_prefix_idx.
+        """
+        queryset = cls.objects.filter(project=project)
+        if assignee is not None:
+            queryset = queryset.filter(assignee=assignee)
+
+        rank = None
+        if text:
+            query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+            matches = models.Q(search_vector=query)
+            if len(text) >= TITLE_PREFIX_MIN_LENGTH:
+                matches |= models.Q(title__istartswith=text)
+            queryset = queryset.filter(matches)
+            if (sort or "relevance") == "relevance":
+                rank = SearchRank(models.F("search_vector"), query)
+
+        if rank is not None:
+            return cls._ranked_page(queryset, rank, state, label, after, limit)
+
+        # The label rows carry the state and number, so a label filter reads
+        # issue_labels_list_idx in order and joins only one page. Their
+        # conditions go in one filter() call, each call would join them again.
+        number = "number"
+        filters = {}
+        if label is not None:
+            number = "issue_labels__number"
+            filters["issue_labels__label"] = label
+            if state:
+                filters["issue_labels__state"] = state
+        elif state:
+            filters["state"] = state
+        if after is not None:
+            filters[f"{number}__lt"] = after
+
+        issues = list(
+            queryset.filter(**filters)
+            .select_related("author", "assignee")
+            .order_by(models.F(number).desc())[: limit + 1]
+        )
+        return issues[:limit], len(issues) > limit
+
+    @classmethod
+    def _ranked_page(cls, queryset, rank, state, label, after, limit):
+        # The search index narrows the matches by state, the label of each
+        # is then looked up by primary key
+        if state:
+            queryset = queryset.filter(state=state)
+        if label is not None:
+            labelled = IssueLabel.objects.filter(
+                issue=models.OuterRef("pk"), label=label
+            )
+            queryset = queryset.filter(models.Exists(labelled))
+
+        # Ranked here, as (rank, number, id) keys: the window is small, and
+        # only the issues of the page are read again
+        window = settings.ISSUE_SEARCH_RANK_WINDOW
+        keys = sorted(
+            queryset.annotate(rank=rank)
+            .order_by("-number")
+            .values_list("rank", "number", "pk")[:window],
+            reverse=True,
+        )
+        if after is not None:
+            cursor = next((key for key in keys if key[1] == after), None)
+            if cursor is None:
+                keys = [key for key in keys if key[1] < after]
+            else:
+                keys = [key for key in keys if key[:2] < cursor[:2]]
+
+        page = keys[:limit]
+        issues = cls.objects.select_related("author", "assignee").in_bulk(
+            [pk for _, _, pk in page]
+        )
+        return [issues[pk] for _, _, pk in page if pk in issues], len(keys) > limit
+
+    def get_labels(self):
+        return Label.objects.filter(issue_labels__issue=self).order_by("name")
+
+    @property
+    def is_open(self):
+        return self.state == IssueStateChoice.OPEN
+
+
+class Label(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="labels"
+    )
+    name = models.CharField(max_length=64)
+
+    ID_PREFIX = "lbl"
+
+    class Meta:
+        db_table = "labels"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "name"], name="unique_project_label_name"
+            ),
+        ]
+
+
+class IssueLabel(models.Model):
+    """
+    The labels of issues. The state and number of the issue are copied on
+    each row, Issue.set_labels() and Issue.set_state() keep them current,
+    so that the issues of a label are listed from issue_labels_list_idx.
+    """
+
+    pk = models.CompositePrimaryKey("issue", "label")
+    issue = models.ForeignKey(
+        "Issue", on_delete=models.CASCADE, related_name="issue_labels"
+    )
+    label = models.ForeignKey(
+        "Label", on_delete=models.CASCADE, related_name="issue_labels"
+    )
+    state = models.CharField(max_length=16, choices=IssueStateChoice.choices)
+    number = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "issue_labels"
+        indexes = [
+            models.Index(
+                "label",
+                "state",
+                models.F("number").desc(),
+                name="issue_labels_list_idx",
+            ),
+        ]
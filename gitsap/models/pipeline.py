@@ -0,0 +1,111 @@
+from django.db import models
+from django.conf import settings
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.choices import PipelineStatusChoice, JobStatusChoice
+
+
+class Pipeline(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="pipelines"
+    )
+    # None for pipelines started by a push
+    triggered_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="pipelines",
+        blank=True,
+        null=True,
+    )
+    branch = models.CharField(max_length=255)
+    commit_sha = models.CharField(max_length=40)
+    status = models.CharField(
+        max_length=16,
+        choices=PipelineStatusChoice.choices,
+        default=PipelineStatusChoice.PENDING,
+    )
+    # Why the pipeline failed without running, e.g. an invalid definition
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    ID_PREFIX = "ppl"
+
+    class Meta:
+        db_table = "pipelines"
+        indexes = [
+            models.Index(
+                "project", models.F("created_at").desc(), name="pipelines_list_idx"
+            ),
+        ]
+
+    FINISHED_STATUSES = {
+        PipelineStatusChoice.SUCCESS,
+        PipelineStatusChoice.FAILED,
+        PipelineStatusChoice.CANCELED,
+    }
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+
+class Job(BaseModel):
+    pipeline = models.ForeignKey(
+        "Pipeline", on_delete=models.CASCADE, related_name="jobs"
+    )
+    # Copied from the pipeline, the scheduler counts and ranks jobs per project
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="pipeline_jobs"
+    )
+    name = models.CharField(max_length=128)
+    script = models.TextField()
+    variables = models.JSONField(default=dict, blank=True)
+    timeout = models.PositiveIntegerField()
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=16,
+        choices=JobStatusChoice.choices,
+        default=JobStatusChoice.QUEUED,
+    )
+    # Worker host running the job; updated_at doubles as its heartbeat
+    worker = models.CharField(max_length=255, blank=True)
+    exit_code = models.IntegerField(blank=True, null=True)
+    # Bytes of output stored, see gitsap.pipelines.logs
+    log_size = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    ID_PREFIX = "job"
+
+    class Meta:
+        db_table = "pipeline_jobs"
+        indexes = [
+            # Queued jobs of a project in dispatch order
+            models.Index(
+                "project",
+                models.F("priority").desc(),
+                "id",
+                condition=models.Q(status=JobStatusChoice.QUEUED),
+                name="pipeline_jobs_queued_idx",
+            ),
+            models.Index(
+                "project",
+                condition=models.Q(
+                    status__in=[JobStatusChoice.DISPATCHED, JobStatusChoice.RUNNING]
+                ),
+                name="pipeline_jobs_active_idx",
+            ),
+        ]
+
+    ACTIVE_STATUSES = [JobStatusChoice.DISPATCHED, JobStatusChoice.RUNNING]
+    FINISHED_STATUSES = [
+        JobStatusChoice.SUCCESS,
+        JobStatusChoice.FAILED,
+        JobStatusChoice.CANCELED,
+    ]
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
@@ -65,6 +65,20 @@ class Project(BaseModel):
         except Exception:
             raise
 
+    def rename(self, namespace):
+        """
+        Moves the project to namespace. Only the database changes, its
+        repository is stored under the project id.
+        """
+        self.namespace = namespace
+        try:
+            with transaction.atomic():
+                self.save(update_fields=["namespace", "updated_at"])
+        except IntegrityError:
+            raise ValidationError(
+                {"namespace": "A project with this namespace already exists."}
+            )
+
     @property
     def repo_url(self):
         return f"{settings.APP_BASE_URL}/{self.namespace}.git"
@@ -0,0 +1,40 @@
+from django.db import models
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.choices import GitRefTypeChoice
+
+
+class ProtectionRule(BaseModel):
+    """
+    Restrictions on the branches or tags whose short names match pattern, a
+    glob where * matches within a path segment and ** across segments. A ref
+    matched by several rules gets the restrictions of all of them. Pushes are
+    checked against the rules compiled by gitsap.git.protection.
+    """
+
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="protection_rules"
+    )
+    ref_type = models.CharField(
+        max_length=16,
+        choices=GitRefTypeChoice.choices,
+        default=GitRefTypeChoice.BRANCH,
+    )
+    pattern = models.CharField(max_length=256)
+    # Only the roles that manage the project create, update or delete them
+    restrict_pushes = models.BooleanField(default=False)
+    allow_force_pushes = models.BooleanField(default=False)
+    allow_deletions = models.BooleanField(default=False)
+    # No merge commits among the commits pushed to them
+    require_linear_history = models.BooleanField(default=False)
+
+    ID_PREFIX = "prt"
+
+    class Meta:
+        db_table = "protection_rules"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "ref_type", "pattern"],
+                name="unique_project_protection_pattern",
+            ),
+        ]
@@ -0,0 +1,96 @@
+from django.db import models
+from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.choices import PullRequestStateChoice, MergeStatusChoice
+
+
+class PullRequest(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="pull_requests"
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name="pull_requests",
+    )
+    title = models.CharField(max_length=256)
+    description = models.TextField(blank=True, null=True)
+    source_branch = models.CharField(max_length=255)
+    target_branch = models.CharField(max_length=255)
+    state = models.CharField(
+        max_length=16,
+        choices=PullRequestStateChoice.choices,
+        default=PullRequestStateChoice.OPEN,
+    )
+
+    # Result of the last merge check and the two tips it was computed for
+    merge_status = models.CharField(
+        max_length=16,
+        choices=MergeStatusChoice.choices,
+        default=MergeStatusChoice.UNCHECKED,
+    )
+    conflict_paths = ArrayField(models.TextField(), default=list, blank=True)
+    merge_checked_target_sha = models.CharField(max_length=40, blank=True)
+    merge_checked_source_sha = models.CharField(max_length=40, blank=True)
+    merge_checked_at = models.DateTimeField(blank=True, null=True)
+
+    ID_PREFIX = "pr"
+
+    class Meta:
+        db_table = "pull_requests"
+        indexes = [
+            models.Index(
+                "project",
+                "state",
+                models.F("created_at").desc(),
+                name="pull_requests_list_idx",
+            ),
+            models.Index(
+                "project",
+                "source_branch",
+                condition=models.Q(state=PullRequestStateChoice.OPEN),
+                name="pull_requests_open_source_idx",
+            ),
+            models.Index(
+                "project",
+                "target_branch",
+                condition=models.Q(state=PullRequestStateChoice.OPEN),
+                name="pull_requests_open_target_idx",
+            ),
+        ]
+
+    MERGE_CHECK_FIELDS = [
+        "merge_status",
+        "conflict_paths",
+        "merge_checked_target_sha",
+        "merge_checked_source_sha",
+        "merge_checked_at",
+        "updated_at",
+    ]
+
+    def tips(self, refs):
+        """
+        (target_oid, source_oid) of the two branches in the ref snapshot refs,
+        None for a branch that no longer exists.
+        """
+        branches = refs["branches"]
+        return branches.get(self.target_branch), branches.get(self.source_branch)
+
+    def merge_checked_for(self, target_oid, source_oid):
+        return (self.merge_checked_target_sha, self.merge_checked_source_sha) == (
+            target_oid,
+            source_oid,
+        )
+
+    def record_merge_check(self, target_oid, source_oid, conflicts):
+        """Sets the merge check fields, saving is left to the caller."""
+        self.merge_status = (
+            MergeStatusChoice.CONFLICTING if conflicts else MergeStatusChoice.MERGEABLE
+        )
+        self.conflict_paths = conflicts[: settings.GIT_MERGE_MAX_CONFLICT_PATHS]
+        self.merge_checked_target_sha = target_oid
+        self.merge_checked_source_sha = source_oid
+        self.merge_checked_at = self.updated_at = timezone.now()
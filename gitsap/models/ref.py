@@ -0,0 +1,139 @@
+from django.db import models, transaction
+from django.utils import timezone
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.choices import GitRefTypeChoice
+from gitsap.models.repository import Repository
+from gitsap.models.counters import ProjectCounters
+from gitsap.git.refs import BRANCH_PREFIX, TAG_PREFIX
+
+
+class GitRef(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="git_refs"
+    )
+    # Byte-order collation: matches git's ordering and lets the btree index
+    # serve prefix (LIKE 'abc%') searches
+    name = models.CharField(max_length=256, db_collation="C")
+    short_name = models.CharField(max_length=256, blank=True, db_collation="C")
+    ref_type = models.CharField(max_length=16, choices=GitRefTypeChoice.choices)
+    target_sha = models.CharField(max_length=40)
+    target_committed_at = models.DateTimeField(blank=True, null=True)
+    is_head = models.BooleanField(default=False)
+
+    ID_PREFIX = "ref"
+
+    class Meta:
+        db_table = "git_refs"
+        indexes = [
+            models.Index(
+                fields=["project", "ref_type", "short_name"],
+                name="git_refs_name_idx",
+            ),
+            models.Index(
+                "project",
+                "ref_type",
+                models.F("target_committed_at").desc(nulls_last=True),
+                name="git_refs_recent_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "name"], name="uniq_gitref_project_name"
+            ),
+            models.UniqueConstraint(
+                fields=["project"],
+                condition=models.Q(is_head=True),
+                name="uniq_gitref_single_head_per_project",
+            ),
+        ]
+
+    @classmethod
+    def sync(cls, repository, read_snapshot, resolve_committed_at):
+        """
+        Brings the stored refs of repository's project in line with the
+        snapshot read_snapshot() returns (see
+        gitsap.git.refs.read_ref_snapshot) by diffing both sets and writing
+        only the refs that were added, moved or deleted, in one transaction.
+        resolve_committed_at(oid) is only called for refs whose target
+        changed. Returns (created, updated, deleted) counts.
+        """
+        project = repository.project
+        now = timezone.now()
+
+        with transaction.atomic():
+            # Serializes concurrent syncs of the same repository. The refs
+            # are read once it is locked, so a sync that started earlier
+            # never writes an older snapshot over a newer one
+            Repository.objects.select_for_update().filter(pk=repository.pk).get()
+            snapshot = read_snapshot()
+            head_name = BRANCH_PREFIX + snapshot["head"] if snapshot["head"] else None
+
+            wanted = {}
+            for ref_type, prefix, refs in (
+                (GitRefTypeChoice.BRANCH, BRANCH_PREFIX, snapshot["branches"]),
+                (GitRefTypeChoice.TAG, TAG_PREFIX, snapshot["tags"]),
+            ):
+                for short_name, target in refs.items():
+                    wanted[prefix + short_name] = (short_name, ref_type, target)
+
+            existing = {
+                ref.name: ref
+                for ref in cls.objects.filter(project=project).only(
+                    "id", "name", "target_sha", "target_committed_at", "is_head"
+                )
+            }
+
+            deleted = [ref.pk for name, ref in existing.items() if name not in wanted]
+            if deleted:
+                cls.objects.filter(pk__in=deleted).delete()
+
+            # Release the old HEAD first, the single-HEAD constraint is checked
+            # row by row
+            cls.objects.filter(project=project, is_head=True).exclude(
+                name=head_name
+            ).update(is_head=False, updated_at=now)
+
+            created = []
+            updated = []
+            for name, (short_name, ref_type, target) in wanted.items():
+                is_head = name == head_name
+                ref = existing.get(name)
+
+                if ref is None:
+                    created.append(
+                        cls(
+                            project=project,
+                            name=name,
+                            short_name=short_name,
+                            ref_type=ref_type,
+                            target_sha=target,
+                            target_committed_at=resolve_committed_at(target),
+                            is_head=is_head,
+                        )
+                    )
+                elif ref.target_sha != target or (is_head and not ref.is_head):
+                    if ref.target_sha != target:
+                        ref.target_sha = target
+                        ref.target_committed_at = resolve_committed_at(target)
+                    ref.is_head = is_head
+                    ref.updated_at = now
+                    updated.append(ref)
+
+            if updated:
+                cls.objects.bulk_update(
+                    updated,
+                    ["target_sha", "target_committed_at", "is_head", "updated_at"],
+                    batch_size=1000,
+                )
+            if created:
+                cls.objects.bulk_create(created, batch_size=1000)
+
+            branches = sum(ref.ref_type == GitRefTypeChoice.BRANCH for ref in created)
+            branches -= sum(
+                name.startswith(BRANCH_PREFIX) and name not in wanted
+                for name in existing
+            )
+            ProjectCounters.add(project.pk, branches=branches)
+
+        return len(created), len(updated), len(deleted)
@@ -1,8 +1,16 @@
-import pygit2
 import os
+import time
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from gitsap.models.shared import BaseTimestampModel
+from gitsap.git import storage
+from gitsap.git.maintenance import RepositoryLock
+from gitsap.git.search import SearchIndex
+from gitsap.git.refs import RefCache, ZERO_OID
+from gitsap.git.pool import get_pool
 
 
 class Repository(BaseTimestampModel):
@@ -13,32 +21,129 @@ class Repository(BaseTimestampModel):
         on_delete=models.CASCADE,
     )
     repo_path = models.CharField(max_length=512, unique=True, blank=True)
+    # The GIT_STORAGE_SHARDS entry repo_path is under
+    shard = models.CharField(max_length=64, default="default")
     is_empty = models.BooleanField(default=True)
+    # Set once the bare repository exists on disk
+    provisioned_at = models.DateTimeField(blank=True, null=True)
+
+    # Commit index backfill checkpoint: the tips being walked and how many
+    # commits of that walk are already written. Cleared once complete.
+    commit_backfill_tips = models.JSONField(blank=True, null=True)
+    commit_backfill_offset = models.PositiveBigIntegerField(default=0)
+    commits_indexed_at = models.DateTimeField(blank=True, null=True)
+
+    # Pushes applied since the last repack, one of the measures maintenance
+    # is scheduled by
+    pushes_since_maintenance = models.PositiveIntegerField(default=0)
+    maintained_at = models.DateTimeField(blank=True, null=True)
+
+    ZERO_OID = ZERO_OID
+    # Seconds between attempts to lock the repository for a move
+    MOVE_LOCK_INTERVAL = 0.5
 
     class Meta:
         db_table = "repositories"
 
-    @classmethod
-    def init_bare_repo_path(cls, repo_path):
-        os.makedirs(os.path.dirname(repo_path), exist_ok=True)
-        repo = pygit2.init_repository(repo_path, bare=True)
-        return repo
+    @property
+    def is_provisioned(self):
+        return self.provisioned_at is not None
+
+    def provision(self):
+        """
+        Puts a bare repository at repo_path, claiming a spare when one is
+        ready. Safe to run again: an existing repository is kept as is.
+        Returns True when a spare was used.
+        """
+        claimed = False
+        if not os.path.exists(self.repo_path):
+            default_branch = self.project.default_git_branch
+            claimed = storage.claim_spare(self.shard, self.repo_path, default_branch)
+            if not claimed:
+                storage.init_bare(self.repo_path, default_branch)
+
+        self.provisioned_at = timezone.now()
+        self.save(update_fields=["provisioned_at", "updated_at"])
+        return claimed
+
+    def move_to(self, shard):
+        """
+        Moves the repository to shard while it stays online. The bulk copy
+        runs with pushes allowed; only the final copy of what changed
+        meanwhile and the rename into place run with them locked out.
+        Returns the old path, for the caller to delete once requests reading
+        it are done, or None when the repository is already in shard.
+        Raises TimeoutError when pushes or maintenance keep it locked for
+        GIT_STORAGE_MOVE_LOCK_WAIT seconds.
+        """
+        if shard == self.shard:
+            return None
+
+        old_path = self.repo_path
+        staging = storage.moving_path_for(shard, self.project_id)
+        target = storage.repo_path_for(shard, self.project_id)
+        storage.sync_tree(old_path, staging)
+
+        lock = RepositoryLock(old_path)
+        deadline = time.monotonic() + settings.GIT_STORAGE_MOVE_LOCK_WAIT
+        while not lock.acquire():
+            if time.monotonic() >= deadline:
+                raise TimeoutError(old_path)
+            time.sleep(self.MOVE_LOCK_INTERVAL)
+        try:
+            # The search index is updated outside pushes, wait for that too
+            with SearchIndex.for_repository(self)._lock():
+                # A ref moved since the first pass can keep its size and
+                # time, so refs are copied whatever they look like
+                storage.sync_tree(old_path, staging, always=storage.REF_PATHS)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(staging, target)
+
+            self.repo_path = target
+            self.shard = shard
+            self.save(update_fields=["repo_path", "shard", "updated_at"])
+        finally:
+            # Pushes waiting on the old path find the new one in the database
+            lock.release()
+        return old_path
+
+    def open(self):
+        """
+        Lends a pooled pygit2 handle for the duration of a with block:
+
+            with repository.open() as repo:
+                ...
+
+        The handle must not escape the block or be shared with other threads.
+        """
+        return get_pool().acquire(self.repo_path)
 
     @property
-    def repo(self):
-        return pygit2.Repository(self.repo_path)
-    
+    def refs(self):
+        return RefCache(self).get()
+
     @property
     def branches(self):
-        # TODO: Can perform redis caching for better perf
-        return self.list_branches(branch_type="local")
+        return list(self.refs["branches"])
+
+    @property
+    def tags(self):
+        return list(self.refs["tags"])
+
+    @property
+    def head(self):
+        return self.refs["head"]
+
+    def invalidate_refs(self):
+        RefCache(self).invalidate()
 
     def list_branches(self, branch_type="local"):
-        if branch_type == "local":
-            return [b for b in self.repo.branches.local]
-        elif branch_type == "remote":
-            return [b for b in self.repo.branches.remote]
-        else:
-            raise ValueError("branch_type must be 'local' or 'remote'")
+        with self.open() as repo:
+            if branch_type == "local":
+                return [b for b in repo.branches.local]
+            elif branch_type == "remote":
+                return [b for b in repo.branches.remote]
+            else:
+                raise ValueError("branch_type must be 'local' or 'remote'")
 
     
\ No newline at end of file
@@ -1,6 +1,21 @@
 from django.db import models
 
-from gitsap.utils.generator import generate_ulid
+from gitsap.utils.generator import generate_ulids
+
+
+class BaseQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Assigns prefixed IDs, drawn as one batch, to objs that have none."""
+        objs = list(objs)
+        missing = [obj for obj in objs if not obj.id]
+        if missing:
+            for obj, id in zip(missing, self.model.generate_ids(len(missing))):
+                obj.id = id
+
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+BaseModelManager = models.Manager.from_queryset(BaseQuerySet)
 
 
 class BaseModel(models.Model):
@@ -11,18 +26,30 @@ class BaseModel(models.Model):
 
     ID_PREFIX = None
 
+    objects = BaseModelManager()
+
     class Meta:
         abstract = True
 
+    @classmethod
+    def generate_ids(cls, count):
+        if not cls.ID_PREFIX:
+            raise ValueError(f"{cls.__name__} must define ID_PREFIX")
+
+        prefix = cls.ID_PREFIX.lower()
+        return [f"{prefix}_{ulid}" for ulid in generate_ulids(count, lowercase=True)]
+
+    @classmethod
+    def generate_id(cls):
+        return cls.generate_ids(1)[0]
+
     def save(self, *args, **kwargs):
         if self._state.adding:
             if not self.ID_PREFIX:
                 raise ValueError(f"{self.__class__.__name__} must define ID_PREFIX")
 
             if not self.id:
-                ulid = str(generate_ulid()).lower()
-                prefix = self.ID_PREFIX.lower()
-                self.id = f"{prefix}_{ulid}"
+                self.id = self.generate_id()
 
         return super().save(*args, **kwargs)
 
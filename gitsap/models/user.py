@@ -1,11 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 
-from gitsap.models.shared import BaseModel
+from gitsap.models.shared import BaseModel, BaseQuerySet
 from gitsap.models.choices import UserRoleChoice
 
 
-class UserManager(BaseUserManager):
+class UserManager(BaseUserManager.from_queryset(BaseQuerySet)):
     def create_superuser(self, username, primary_email, full_name, password=None):
         user = self.model(
             username=username,
@@ -0,0 +1,93 @@
+from django.db import models
+from django.utils import timezone
+
+from gitsap.models.shared import BaseModel
+from gitsap.models.choices import WebhookDeliveryStatusChoice
+
+
+class Webhook(BaseModel):
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="webhooks"
+    )
+    url = models.URLField(max_length=2048)
+    # Signs payloads with HMAC-SHA256 when set
+    secret = models.CharField(max_length=255, blank=True)
+    is_active = models.BooleanField(default=True)
+    # Circuit breaker: failed deliveries in a row, and until when no more
+    # are attempted once they reach WEBHOOK_CIRCUIT_THRESHOLD
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    circuit_open_until = models.DateTimeField(blank=True, null=True)
+
+    ID_PREFIX = "whk"
+
+    class Meta:
+        db_table = "webhooks"
+
+    @property
+    def is_circuit_open(self):
+        return (
+            self.circuit_open_until is not None
+            and self.circuit_open_until > timezone.now()
+        )
+
+
+class WebhookPayload(BaseModel):
+    """An event, serialized once for all the webhooks it is delivered to."""
+
+    project = models.ForeignKey(
+        "Project", on_delete=models.CASCADE, related_name="webhook_payloads"
+    )
+    event = models.CharField(max_length=32)
+    body = models.BinaryField()
+
+    ID_PREFIX = "whp"
+
+    class Meta:
+        db_table = "webhook_payloads"
+
+
+class WebhookDelivery(BaseModel):
+    webhook = models.ForeignKey(
+        "Webhook", on_delete=models.CASCADE, related_name="deliveries"
+    )
+    payload = models.ForeignKey(
+        "WebhookPayload", on_delete=models.CASCADE, related_name="deliveries"
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=WebhookDeliveryStatusChoice.choices,
+        default=WebhookDeliveryStatusChoice.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # The worker delivering it, and its lease, given back to others once past
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    # Of the last attempt
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    duration_ms = models.PositiveIntegerField(blank=True, null=True)
+    delivered_at = models.DateTimeField(blank=True, null=True)
+
+    ID_PREFIX = "whd"
+
+    class Meta:
+        db_table = "webhook_deliveries"
+        indexes = [
+            models.Index(
+                "next_attempt_at",
+                condition=models.Q(status=WebhookDeliveryStatusChoice.PENDING),
+                name="webhook_deliveries_due_idx",
+            ),
+            models.Index(
+                "webhook",
+                "locked_until",
+                condition=models.Q(status=WebhookDeliveryStatusChoice.DELIVERING),
+                name="webhook_deliveries_active_idx",
+            ),
+            models.Index(
+                "webhook",
+                models.F("created_at").desc(),
+                name="webhook_deliveries_list_idx",
+            ),
+        ]
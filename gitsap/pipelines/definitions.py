@@ -0,0 +1,110 @@
+"""
+Pipeline definitions, read from GIT_PIPELINE_FILE at the commit a
+pipeline runs for:
+
+    [jobs.test]
+    script = '''
+    pip install -e .
+    python -m pytest -q
+    '''
+    timeout = 900          # seconds, optional
+    priority = 1           # higher runs first, optional
+
+    [jobs.test.variables]  # optional
+    DJANGO_SETTINGS_MODULE = "app.settings"
+
+A script is one string or a list of commands, run by /bin/sh -e in a fresh
+checkout of the commit.
+"""
+
+import re
+import tomllib
+
+import pygit2
+from django.conf import settings
+
+JOB_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+PRIORITY_RANGE = range(-10, 11)
+
+
+class DefinitionError(Exception):
+    """The pipeline file is missing or invalid."""
+
+
+def _blob(repo, commit_oid):
+    tree = repo[commit_oid].peel(pygit2.Commit).tree
+    try:
+        entry = tree[settings.GIT_PIPELINE_FILE]
+    except KeyError:
+        return None
+    return repo[entry.id] if entry.type_str == "blob" else None
+
+
+def has_definition(repo, commit_oid):
+    return _blob(repo, commit_oid) is not None
+
+
+def _job(name, spec):
+    if not JOB_NAME_RE.match(name):
+        raise DefinitionError(f"Invalid job name: {name!r}")
+    if not isinstance(spec, dict):
+        raise DefinitionError(f"Job {name} must be a table")
+
+    script = spec.get("script")
+    if isinstance(script, list) and all(isinstance(line, str) for line in script):
+        script = "\n".join(script)
+    if not isinstance(script, str) or not script.strip():
+        raise DefinitionError(f"Job {name} has no script")
+
+    timeout = spec.get("timeout", settings.GIT_PIPELINE_JOB_TIMEOUT)
+    if not isinstance(timeout, int) or not (
+        0 < timeout <= settings.GIT_PIPELINE_MAX_JOB_TIMEOUT
+    ):
+        raise DefinitionError(
+            f"Job {name}: timeout must be 1 to "
+            f"{settings.GIT_PIPELINE_MAX_JOB_TIMEOUT} seconds"
+        )
+
+    priority = spec.get("priority", 0)
+    if not isinstance(priority, int) or priority not in PRIORITY_RANGE:
+        raise DefinitionError(
+            f"Job {name}: priority must be {PRIORITY_RANGE.start} to "
+            f"{PRIORITY_RANGE.stop - 1}"
+        )
+
+    variables = spec.get("variables", {})
+    if not isinstance(variables, dict) or not all(
+        isinstance(value, str) for value in variables.values()
+    ):
+        raise DefinitionError(f"Job {name}: variables must be strings")
+
+    return {
+        "name": name,
+        "script": script,
+        "timeout": timeout,
+        "priority": priority,
+        "variables": variables,
+    }
+
+
+def load(repo, commit_oid):
+    """
+    The jobs defined at commit_oid, as dicts of name, script, timeout,
+    priority and variables. Raises DefinitionError.
+    """
+    blob = _blob(repo, commit_oid)
+    if blob is None:
+        raise DefinitionError(f"No {settings.GIT_PIPELINE_FILE} in this commit")
+    try:
+        document = tomllib.loads(blob.data.decode("utf-8"))
+    except (UnicodeDecodeError, tomllib.TOMLDecodeError) as error:
+        raise DefinitionError(f"{settings.GIT_PIPELINE_FILE}: {error}")
+
+    jobs = document.get("jobs")
+    if not isinstance(jobs, dict) or not jobs:
+        raise DefinitionError("No jobs defined")
+    if len(jobs) > settings.GIT_PIPELINE_MAX_JOBS:
+        raise DefinitionError(
+            f"At most {settings.GIT_PIPELINE_MAX_JOBS} jobs per pipeline"
+        )
+    return [_job(name, spec) for name, spec in jobs.items()]
@@ -0,0 +1,448 @@
+"""
+Pipeline job logs.
+
+While a job runs, its worker appends the output in chunks to the Redis
+stream pipeline-log:<job id>. The ID of an entry is <byte offset of its
+chunk>-1, so a reader resumes from a byte offset by starting at the entry
+holding it, and the last entry, <size>-2, carries the final status. The
+writer never waits on readers: they only read the stream, and within a
+process every reader of a job shares one blocking XREAD (see _Follower).
+
+Once the job finishes, its stream is compacted into
+<GIT_PIPELINE_LOG_DIR>/<id[-2:]>/<id>.log.gz, a gzip file made of one member
+per BLOCK_SIZE bytes of output, and <id>.idx, the output size and where
+each member starts, so any byte range is read by decompressing only the
+members it spans. The stream then expires after GIT_PIPELINE_LOG_STREAM_TTL
+seconds, which leaves readers still on it time to finish.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import struct
+import threading
+import weakref
+from collections import deque
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from gitsap.git.executor import run_git
+from gitsap.models import Job
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "pipeline-log:"
+DATA_SEQ = 1
+END_SEQ = 2
+# Largest chunk in one stream entry
+CHUNK_SIZE = 64 * 1024
+# Output per gzip member of a compacted log
+BLOCK_SIZE = 256 * 1024
+# Seconds between appends of a running job
+FLUSH_INTERVAL = 0.5
+# Entries read at once, and kept for the readers of a job in a process
+READ_COUNT = 100
+WINDOW = 1000
+# Seconds a reader waits for output before sending a keepalive
+KEEPALIVE = 15
+INDEX_ENTRY = struct.Struct(">Q")
+TRUNCATED = "\n[Output truncated at {} bytes.]\n"
+
+_lock = threading.Lock()
+_client = None
+_pid = None
+# Per event loop: its async client and the followers of the jobs read
+_loops = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client, _pid
+    with _lock:
+        # Connections do not survive a fork, start over in the child
+        if _client is None or _pid != os.getpid():
+            _client = redis.Redis.from_url(settings.GIT_PIPELINE_LOG_REDIS_URL)
+            _pid = os.getpid()
+        return _client
+
+
+def _loop_state():
+    loop = asyncio.get_running_loop()
+    state = _loops.get(loop)
+    if state is None:
+        client = redis.asyncio.Redis.from_url(settings.GIT_PIPELINE_LOG_REDIS_URL)
+        state = _loops[loop] = (client, {})
+    return state
+
+
+def stream_key(job_id):
+    return f"{STREAM_PREFIX}{job_id}"
+
+
+def log_path(job_id):
+    """The compacted log of job_id, less the .log.gz and .idx extensions."""
+    return os.path.join(settings.GIT_PIPELINE_LOG_DIR, job_id[-2:], job_id)
+
+
+def _parse_id(entry_id):
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    offset, seq = entry_id.split("-")
+    return int(offset), int(seq)
+
+
+def _stream_size(client, key):
+    """The size of the output in stream key, and whether it has ended."""
+    entries = client.xrevrange(key, count=1)
+    if not entries:
+        return 0, False
+    entry_id, fields = entries[0]
+    offset, seq = _parse_id(entry_id)
+    if seq == END_SEQ:
+        return offset, True
+    return offset + len(fields[b"data"]), False
+
+
+class LogWriter:
+    """
+    Appends the output of a job to its stream. Writes only buffer, a thread
+    appends the buffer every FLUSH_INTERVAL seconds, so neither the job nor
+    its output pipe wait on Redis. Output past GIT_PIPELINE_MAX_LOG_SIZE
+    bytes is dropped.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.key = stream_key(job_id)
+        self.size = 0
+        self.flushed = 0
+        self.pending = bytearray()
+        self.truncated = False
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        # Set when an append may or may not have happened
+        self.resync = False
+
+    def write(self, data):
+        limit = settings.GIT_PIPELINE_MAX_LOG_SIZE
+        with self.lock:
+            if self.truncated:
+                return
+            if self.size + len(data) > limit:
+                data = data[: limit - self.size] + TRUNCATED.format(limit).encode()
+                self.truncated = True
+            self.pending += data
+            self.size += len(data)
+
+    def follow(self, stream):
+        """Copies stream into the log until EOF, in a thread of its own."""
+
+        def copy():
+            while chunk := stream.read1(65536):
+                self.write(chunk)
+
+        thread = threading.Thread(target=copy, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        def flush_regularly():
+            while not self.stopped.wait(FLUSH_INTERVAL):
+                self.flush()
+
+        self.thread = threading.Thread(target=flush_regularly, daemon=True)
+        self.thread.start()
+
+    def flush(self):
+        """Appends the buffered output. Returns whether it all was."""
+        with self.flush_lock:
+            client = get_client()
+            try:
+                if self.resync:
+                    self._resync(client)
+                with self.lock:
+                    data = bytes(self.pending)
+                if not data:
+                    return True
+
+                pipe = client.pipeline()
+                for start in range(0, len(data), CHUNK_SIZE):
+                    pipe.xadd(
+                        self.key,
+                        {"data": data[start : start + CHUNK_SIZE]},
+                        id=f"{self.flushed + start}-{DATA_SEQ}",
+                    )
+                pipe.execute()
+            except redis.RedisError:
+                logger.warning("Could not append the log of %s", self.job_id)
+                self.resync = True
+                return False
+
+            with self.lock:
+                del self.pending[: len(data)]
+            self.flushed += len(data)
+            return True
+
+    def _resync(self, client):
+        # Drops what a failed append stored after all
+        size, _ = _stream_size(client, self.key)
+        with self.lock:
+            del self.pending[: size - self.flushed]
+        self.flushed = size
+        self.resync = False
+
+    def close(self, status):
+        """
+        Appends the rest of the output and ends the log with status, then
+        compacts it. Returns the size of the log stored.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        return seal(self.job_id, status)
+
+
+def seal(job_id, status):
+    """
+    Ends the stream of job_id with status unless it has ended, compacts it
+    and lets it expire. Also run for jobs lost with their worker. Returns
+    the size of the log stored, None when it could not be.
+    """
+    client = get_client()
+    key = stream_key(job_id)
+    try:
+        size, ended = _stream_size(client, key)
+        if not ended:
+            client.xadd(key, {"status": status}, id=f"{size}-{END_SEQ}")
+        compact(client, job_id)
+        client.expire(key, settings.GIT_PIPELINE_LOG_STREAM_TTL)
+    except (redis.RedisError, OSError):
+        logger.exception("Could not store the log of %s", job_id)
+        return None
+    return size
+
+
+def compact(client, job_id):
+    """Writes the output in the stream of job_id to its compacted log."""
+    path = log_path(job_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    offsets = []
+    size = 0
+    block = bytearray()
+    with open(f"{path}.log.gz.tmp", "wb") as log:
+
+        def write_block():
+            offsets.append(log.tell())
+            log.write(gzip.compress(bytes(block[:BLOCK_SIZE]), mtime=0))
+            del block[:BLOCK_SIZE]
+
+        last_id = "-"
+        while entries := client.xrange(stream_key(job_id), min=last_id, count=100):
+            for entry_id, fields in entries:
+                if b"data" in fields:
+                    block += fields[b"data"]
+                    size += len(fields[b"data"])
+                while len(block) >= BLOCK_SIZE:
+                    write_block()
+            last_id = f"({entries[-1][0].decode()}"
+        if block:
+            write_block()
+        offsets.append(log.tell())
+
+    with open(f"{path}.idx.tmp", "wb") as index:
+        for value in [size, *offsets]:
+            index.write(INDEX_ENTRY.pack(value))
+    # The log last, readers look for it
+    os.replace(f"{path}.idx.tmp", f"{path}.idx")
+    os.replace(f"{path}.log.gz.tmp", f"{path}.log.gz")
+
+
+class CompactedLog:
+    """A compacted log, read by byte range. open() raises OSError if none."""
+
+    def __init__(self, job_id):
+        self.path = log_path(job_id)
+        self.size = None
+        self.offsets = None
+
+    def open(self):
+        # The log first, the index is complete once it exists
+        os.stat(f"{self.path}.log.gz")
+        with open(f"{self.path}.idx", "rb") as index:
+            values = [value for (value,) in INDEX_ENTRY.iter_unpack(index.read())]
+        self.size, self.offsets = values[0], values[1:]
+        return self
+
+    def read(self, start, end):
+        """Bytes start to end of the output."""
+        end = min(end, self.size)
+        if start >= end:
+            return b""
+        first, last = start // BLOCK_SIZE, (end - 1) // BLOCK_SIZE
+        with open(f"{self.path}.log.gz", "rb") as log:
+            log.seek(self.offsets[first])
+            data = log.read(self.offsets[last + 1] - self.offsets[first])
+        data = gzip.decompress(data)
+        base = first * BLOCK_SIZE
+        return data[start - base : end - base]
+
+    async def aiter_range(self, start, end):
+        """Yields bytes start to end of the output, a block at a time."""
+        end = min(end, self.size)
+        while start < end:
+            stop = min(end, (start // BLOCK_SIZE + 1) * BLOCK_SIZE)
+            yield await run_git(self.read, start, stop)
+            start = stop
+
+
+class _Follower:
+    """
+    Blocks on XREAD for the stream of a job, on behalf of every reader of
+    it in the process, and keeps the last WINDOW entries read. A reader
+    takes its next entries from there when they are still in it, and from
+    the stream itself otherwise, so a slow reader only falls behind.
+    """
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+        self.readers = 0
+        self.entries = deque(maxlen=WINDOW)
+        self.condition = asyncio.Condition()
+        self.task = None
+
+    def after(self, entry_id):
+        """
+        The entries read after entry_id, or None when some of them are no
+        longer or not yet in the window.
+        """
+        position = _parse_id(entry_id)
+        if not self.entries or self.entries[0][0] > position:
+            return None
+        return [
+            (raw_id, fields)
+            for parsed_id, raw_id, fields in self.entries
+            if parsed_id > position
+        ]
+
+    async def wait(self, timeout):
+        """Waits for entries to be read. Returns False on timeout."""
+        async with self.condition:
+            try:
+                await asyncio.wait_for(self.condition.wait(), timeout)
+            except TimeoutError:
+                return False
+        return True
+
+    async def run(self, followers):
+        last_id = "$"
+        try:
+            while self.readers:
+                try:
+                    result = await self.client.xread(
+                        {self.key: last_id}, count=READ_COUNT, block=KEEPALIVE * 1000
+                    )
+                except redis.RedisError:
+                    # The readers see the error reading the stream themselves
+                    await asyncio.sleep(1)
+                    continue
+                for _, entries in result or []:
+                    for entry_id, fields in entries:
+                        self.entries.append((_parse_id(entry_id), entry_id, fields))
+                        last_id = entry_id
+                if result:
+                    async with self.condition:
+                        self.condition.notify_all()
+        finally:
+            followers.pop(self.key, None)
+
+
+async def _job_status(job_id):
+    return await Job.objects.filter(pk=job_id).values_list("status", flat=True).afirst()
+
+
+async def _read_compacted(job_id, offset, status):
+    """follow() for a job whose stream is gone."""
+    size = offset
+    try:
+        log = await run_git(CompactedLog(job_id).open)
+    except OSError:
+        # Cancelled before it started, or its log could not be stored
+        log = None
+    if log is not None:
+        async for data in log.aiter_range(offset, log.size):
+            offset += len(data)
+            yield "data", offset, data
+        size = log.size
+    yield "end", size, status
+
+
+async def follow(job_id, offset=0):
+    """
+    Yields ("data", end offset, bytes) for the output of job_id from byte
+    offset on as it is written, ("keepalive", offset, None) while none is,
+    and last ("end", size, status).
+    """
+    client, followers = _loop_state()
+    key = stream_key(job_id)
+
+    status = await _job_status(job_id)
+    if status in Job.FINISHED_STATUSES and not await client.exists(key):
+        async for event in _read_compacted(job_id, offset, status):
+            yield event
+        return
+
+    # Starts at the entry holding offset
+    last_id = "0-0"
+    if offset:
+        entries = await client.xrevrange(key, max=f"{offset}-{DATA_SEQ}", count=1)
+        if entries:
+            start, _ = _parse_id(entries[0][0])
+            last_id = f"{start}-0"
+
+    follower = followers.get(key)
+    if follower is None:
+        follower = followers[key] = _Follower(client, key)
+    follower.readers += 1
+    if follower.task is None:
+        follower.task = asyncio.create_task(follower.run(followers))
+    try:
+        while True:
+            entries = follower.after(last_id)
+            if entries is None:
+                entries = await client.xrange(
+                    key, min=f"({_str_id(last_id)}", count=READ_COUNT
+                )
+            for entry_id, fields in entries:
+                last_id = entry_id
+                start, seq = _parse_id(entry_id)
+                if seq == END_SEQ:
+                    yield "end", start, fields[b"status"].decode()
+                    return
+                data = fields[b"data"]
+                if start + len(data) > offset:
+                    yield "data", start + len(data), data[max(0, offset - start) :]
+                    offset = start + len(data)
+            if entries or await follower.wait(KEEPALIVE):
+                continue
+
+            # Nothing for a while: the job may have ended without a stream
+            # (lost with its worker, cancelled before it started), or its
+            # stream expired under a reader that long behind
+            status = await _job_status(job_id)
+            if status in Job.FINISHED_STATUSES and not await client.exists(key):
+                async for event in _read_compacted(job_id, offset, status):
+                    yield event
+                return
+            yield "keepalive", offset, None
+    finally:
+        follower.readers -= 1
+
+
+def _str_id(entry_id):
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
@@ -0,0 +1,172 @@
+"""
+Runs one pipeline job as a local subprocess.
+
+The script runs under /bin/sh -e, niced, in its own session so the whole
+process tree can be killed, in a fresh workspace (see workspaces). Every
+HEARTBEAT_INTERVAL seconds the worker refreshes the heartbeat reap() checks
+and learns whether the job was cancelled; a cancelled or timed out job
+gets SIGTERM, then SIGKILL. The output goes to the job log (see logs).
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import tarfile
+import time
+from contextlib import suppress
+
+from django.conf import settings
+from django.utils import timezone
+
+from gitsap.models import Job, JobStatusChoice
+from gitsap.pipelines.logs import LogWriter
+from gitsap.pipelines.scheduler import refresh_pipeline
+from gitsap.pipelines.workspaces import WorkspaceCache
+
+HEARTBEAT_INTERVAL = 2
+# Seconds between SIGTERM and SIGKILL
+KILL_GRACE = 5
+NICE = 10
+
+
+def _environment(job, workspace):
+    pipeline = job.pipeline
+    return {
+        **job.variables,
+        "PATH": os.environ.get("PATH", os.defpath),
+        "LANG": "C.UTF-8",
+        "HOME": workspace,
+        "CI": "true",
+        "GITSAP_PROJECT": pipeline.project.namespace,
+        "GITSAP_PIPELINE_ID": pipeline.pk,
+        "GITSAP_JOB_ID": job.pk,
+        "GITSAP_JOB_NAME": job.name,
+        "GITSAP_BRANCH": pipeline.branch,
+        "GITSAP_COMMIT_SHA": pipeline.commit_sha,
+    }
+
+
+def _kill(process):
+    """Terminates the process group of process, then kills what is left."""
+    with suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=KILL_GRACE)
+    except subprocess.TimeoutExpired:
+        pass
+    with suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+
+
+def _execute(job, workspace, log):
+    """Runs the script of job. Returns (status, exit code)."""
+    process = subprocess.Popen(
+        ["nice", "-n", str(NICE), "/bin/sh", "-e", "-c", job.script],
+        cwd=workspace,
+        env=_environment(job, workspace),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    reader = log.follow(process.stdout)
+    deadline = time.monotonic() + job.timeout
+    status = None
+    try:
+        while True:
+            try:
+                process.wait(timeout=HEARTBEAT_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+
+            alive = Job.objects.filter(
+                pk=job.pk, status=JobStatusChoice.RUNNING
+            ).update(updated_at=timezone.now())
+            if not alive:
+                log.write(b"\nCancelled.\n")
+                status = JobStatusChoice.CANCELED
+                _kill(process)
+                break
+            if time.monotonic() >= deadline:
+                log.write(f"\nTimed out after {job.timeout}s.\n".encode())
+                status = JobStatusChoice.FAILED
+                _kill(process)
+                break
+    finally:
+        if process.returncode is None:
+            _kill(process)
+        else:
+            # Background processes the script left behind
+            with suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGKILL)
+        reader.join(timeout=KILL_GRACE)
+        process.stdout.close()
+
+    if status is None:
+        status = JobStatusChoice.SUCCESS
+        if process.returncode:
+            status = JobStatusChoice.FAILED
+            log.write(f"\nExited with {process.returncode}.\n".encode())
+    return status, process.returncode
+
+
+def _finish(job, status, exit_code, log):
+    # The log is stored before the job shows finished
+    log_size = log.close(status) or 0
+    now = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, status=JobStatusChoice.RUNNING).update(
+        status=status,
+        exit_code=exit_code,
+        log_size=log_size,
+        finished_at=now,
+        updated_at=now,
+    )
+    if not finished:
+        # Cancelled meanwhile: keep that status, record the output still
+        Job.objects.filter(pk=job.pk).update(log_size=log_size, exit_code=exit_code)
+    refresh_pipeline(job.pipeline_id)
+
+
+def run(job_id):
+    """
+    Runs a dispatched job to completion. Returns its final status, None
+    when it was cancelled before it started.
+    """
+    now = timezone.now()
+    started = Job.objects.filter(pk=job_id, status=JobStatusChoice.DISPATCHED).update(
+        status=JobStatusChoice.RUNNING,
+        worker=socket.gethostname(),
+        started_at=now,
+        updated_at=now,
+    )
+    if not started:
+        return None
+
+    job = Job.objects.select_related("pipeline__project__repository").get(pk=job_id)
+    refresh_pipeline(job.pipeline_id)
+    pipeline = job.pipeline
+    log = LogWriter(job.pk)
+    log.start()
+    cache = WorkspaceCache()
+    try:
+        workspace, hit = cache.checkout(
+            pipeline.project.repository.repo_path, pipeline.commit_sha, job.pk
+        )
+    except (OSError, subprocess.CalledProcessError, tarfile.TarError) as error:
+        log.write(f"Could not check out {pipeline.commit_sha}: {error}\n".encode())
+        _finish(job, JobStatusChoice.FAILED, None, log)
+        return JobStatusChoice.FAILED
+
+    log.write(
+        f"Checked out {pipeline.commit_sha[:12]} on {job.worker}"
+        f"{' (cached)' if hit else ''}\n".encode()
+    )
+    try:
+        status, exit_code = _execute(job, workspace, log)
+    finally:
+        cache.release(workspace)
+    _finish(job, status, exit_code, log)
+    return status
@@ -0,0 +1,220 @@
+"""
+Pipeline job scheduling.
+
+Jobs wait in the database as queued. dispatch() marks as many of them as
+the limits allow dispatched and queues one Celery task per job on the
+"pipelines" queue, whose workers run them. It runs whenever jobs are
+queued or finish, and from celery beat to recover from lost workers and
+messages. The broker thus never holds more than GIT_PIPELINE_MAX_RUNNING
+jobs, and priorities, limits and fairness are applied here rather than by
+queue order:
+
+- at most GIT_PIPELINE_MAX_RUNNING jobs are dispatched or running in all,
+  and GIT_PIPELINE_PROJECT_MAX_RUNNING per project; how many a worker host
+  runs at once is its worker concurrency;
+- higher priority first;
+- within a priority, the project with the fewest active jobs goes next,
+  counting the ones picked so far, so a project queueing hundreds of jobs
+  takes turns with one queueing a few instead of starving it;
+- then the oldest job of that project.
+
+Concurrent dispatches are serialized by a Postgres advisory lock.
+Cancelling marks jobs canceled; a running job is killed by its worker at
+its next heartbeat.
+"""
+
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from gitsap.models import (
+    Job,
+    JobStatusChoice,
+    Pipeline,
+    PipelineStatusChoice,
+    ProjectCounters,
+)
+from gitsap.pipelines import definitions, logs
+
+# pg_advisory_xact_lock key held while dispatching
+DISPATCH_LOCK_ID = 0x67697473617001
+
+
+def create_pipeline(project, repo, branch, commit_sha, triggered_by=None):
+    """
+    Creates the pipeline of commit_sha with the jobs it defines, queued.
+    A commit whose definition is invalid gets a failed pipeline carrying
+    the error. Dispatching is left to the caller, once committed.
+    """
+    pipeline = Pipeline(
+        project=project,
+        triggered_by=triggered_by,
+        branch=branch,
+        commit_sha=commit_sha,
+    )
+    try:
+        jobs = definitions.load(repo, commit_sha)
+    except definitions.DefinitionError as error:
+        pipeline.status = PipelineStatusChoice.FAILED
+        pipeline.error = str(error)
+        pipeline.finished_at = timezone.now()
+        jobs = []
+
+    with transaction.atomic():
+        pipeline.save()
+        Job.objects.bulk_create(
+            [Job(pipeline=pipeline, project=project, **job) for job in jobs]
+        )
+        ProjectCounters.add(project.pk, **{f"pipelines_{pipeline.status}": 1})
+    return pipeline
+
+
+def _pick(candidates, active, free):
+    """
+    Ids of up to free jobs of candidates, {project_id: [(id, priority)]}
+    each in dispatch order, given active, {project_id: active job count}.
+    """
+    heap = []
+    for project_id, jobs in candidates.items():
+        job_id, priority = jobs[0]
+        count = active.get(project_id, 0)
+        heapq.heappush(heap, (-priority, count, job_id, project_id))
+
+    picked = []
+    positions = dict.fromkeys(candidates, 0)
+    while heap and len(picked) < free:
+        _, count, job_id, project_id = heapq.heappop(heap)
+        picked.append(job_id)
+        positions[project_id] += 1
+        if count + 1 >= settings.GIT_PIPELINE_PROJECT_MAX_RUNNING:
+            continue
+        jobs = candidates[project_id]
+        if positions[project_id] < len(jobs):
+            next_id, priority = jobs[positions[project_id]]
+            heapq.heappush(heap, (-priority, count + 1, next_id, project_id))
+    return picked
+
+
+def dispatch():
+    """
+    Marks the queued jobs to run next dispatched, within the limits.
+    Returns their ids; the caller queues them once committed.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [DISPATCH_LOCK_ID])
+
+        active = dict(
+            Job.objects.filter(status__in=Job.ACTIVE_STATUSES)
+            .values("project_id")
+            .annotate(count=Count("id"))
+            .values_list("project_id", "count")
+        )
+        free = settings.GIT_PIPELINE_MAX_RUNNING - sum(active.values())
+        if free <= 0:
+            return []
+
+        # Only the jobs each project could start now
+        queued = (
+            Job.objects.filter(status=JobStatusChoice.QUEUED)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=[F("project_id")],
+                    order_by=[F("priority").desc(), F("id").asc()],
+                )
+            )
+            .filter(rank__lte=settings.GIT_PIPELINE_PROJECT_MAX_RUNNING)
+            .order_by("project_id", "rank")
+            .values_list("id", "project_id", "priority")
+        )
+        limit = settings.GIT_PIPELINE_PROJECT_MAX_RUNNING
+        candidates = {}
+        for job_id, project_id, priority in queued:
+            if active.get(project_id, 0) < limit:
+                candidates.setdefault(project_id, []).append((job_id, priority))
+
+        picked = _pick(candidates, active, free)
+        if picked:
+            Job.objects.filter(id__in=picked, status=JobStatusChoice.QUEUED).update(
+                status=JobStatusChoice.DISPATCHED, updated_at=timezone.now()
+            )
+        return picked
+
+
+def reap():
+    """
+    Requeues dispatched jobs no worker started and fails running jobs
+    whose worker stopped sending heartbeats. Returns the number of each.
+    """
+    now = timezone.now()
+    dispatch_timeout = timedelta(seconds=settings.GIT_PIPELINE_DISPATCH_TIMEOUT)
+    heartbeat_timeout = timedelta(seconds=settings.GIT_PIPELINE_HEARTBEAT_TIMEOUT)
+    requeued = Job.objects.filter(
+        status=JobStatusChoice.DISPATCHED, updated_at__lt=now - dispatch_timeout
+    ).update(status=JobStatusChoice.QUEUED, updated_at=now)
+
+    lost = list(
+        Job.objects.filter(
+            status=JobStatusChoice.RUNNING, updated_at__lt=now - heartbeat_timeout
+        ).values_list("id", "pipeline_id")
+    )
+    failed = 0
+    for job_id, _ in lost:
+        updated = Job.objects.filter(pk=job_id, status=JobStatusChoice.RUNNING).update(
+            status=JobStatusChoice.FAILED, finished_at=now, updated_at=now
+        )
+        if updated:
+            failed += 1
+            # Ends the log for its readers with what the worker got to append
+            log_size = logs.seal(job_id, JobStatusChoice.FAILED)
+            Job.objects.filter(pk=job_id).update(log_size=log_size or 0)
+    for pipeline_id in {pipeline_id for _, pipeline_id in lost}:
+        refresh_pipeline(pipeline_id)
+    return requeued, failed
+
+
+def cancel(pipeline):
+    """Cancels every unfinished job of pipeline."""
+    now = timezone.now()
+    Job.objects.filter(
+        pipeline=pipeline,
+        status__in=[JobStatusChoice.QUEUED, *Job.ACTIVE_STATUSES],
+    ).update(status=JobStatusChoice.CANCELED, finished_at=now, updated_at=now)
+    refresh_pipeline(pipeline.pk)
+
+
+def refresh_pipeline(pipeline_id):
+    """Derives the status of a pipeline from the statuses of its jobs."""
+    with transaction.atomic():
+        pipeline = Pipeline.objects.select_for_update().get(pk=pipeline_id)
+        old = pipeline.status
+        jobs = list(pipeline.jobs.values_list("status", "started_at"))
+        statuses = {status for status, _ in jobs}
+
+        if not statuses <= set(Job.FINISHED_STATUSES):
+            started = [started_at for _, started_at in jobs if started_at]
+            status = PipelineStatusChoice.PENDING
+            if started:
+                status = PipelineStatusChoice.RUNNING
+                pipeline.started_at = pipeline.started_at or min(started)
+        elif JobStatusChoice.FAILED in statuses:
+            status = PipelineStatusChoice.FAILED
+        elif JobStatusChoice.CANCELED in statuses:
+            status = PipelineStatusChoice.CANCELED
+        else:
+            status = PipelineStatusChoice.SUCCESS
+
+        pipeline.status = status
+        if pipeline.is_finished and pipeline.finished_at is None:
+            pipeline.finished_at = timezone.now()
+        pipeline.save(
+            update_fields=["status", "started_at", "finished_at", "updated_at"]
+        )
+        ProjectCounters.move(pipeline.project_id, "pipelines", old, status)
+        return pipeline
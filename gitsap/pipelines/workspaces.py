@@ -0,0 +1,122 @@
+"""
+Job workspaces, copied from a checkout cache keyed by commit.
+
+The first job of a commit on a worker host extracts the commit with git
+archive into <GIT_PIPELINE_WORKSPACE_DIR>/cache/<commit>; every job of it,
+the first included, then runs in its own copy under jobs/<job id>, so a
+job never sees what another left behind. Checkouts are flocked through
+<commit[:2]>.lock, one lock file per first OID byte so there are never
+more than 256: exclusively while one is extracted or evicted, shared while
+one is copied. Past GIT_PIPELINE_WORKSPACE_CACHE_SIZE checkouts, the least
+recently used ones not in use are evicted.
+"""
+
+import fcntl
+import os
+import shutil
+import subprocess
+import tarfile
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from gitsap.git.archives import _try_lock
+
+CACHE_DIR = "cache"
+JOBS_DIR = "jobs"
+
+
+class WorkspaceCache:
+    def __init__(self, root=None):
+        self.root = root or settings.GIT_PIPELINE_WORKSPACE_DIR
+        self.cache_root = os.path.join(self.root, CACHE_DIR)
+        self.jobs_root = os.path.join(self.root, JOBS_DIR)
+
+    def _lock_path(self, commit_oid):
+        return os.path.join(self.cache_root, f"{commit_oid[:2]}.lock")
+
+    @contextmanager
+    def _locked(self, commit_oid, operation):
+        os.makedirs(self.cache_root, exist_ok=True)
+        fd = os.open(self._lock_path(commit_oid), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            os.close(fd)
+
+    def _extract(self, repo_path, commit_oid, path):
+        partial = f"{path}.partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        process = subprocess.Popen(
+            [settings.GIT_BINARY, "archive", "--format=tar", commit_oid],
+            cwd=repo_path,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            with tarfile.open(fileobj=process.stdout, mode="r|") as archive:
+                archive.extractall(partial, filter="data")
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            shutil.rmtree(partial, ignore_errors=True)
+            raise subprocess.CalledProcessError(returncode, "git archive")
+        os.rename(partial, path)
+
+    def checkout(self, repo_path, commit_oid, job_id):
+        """
+        A fresh copy of commit_oid for job_id, extracted into the cache
+        first when this host has none. Returns (path, whether the cache was
+        hit).
+        """
+        path = os.path.join(self.cache_root, commit_oid)
+        workspace = os.path.join(self.jobs_root, job_id)
+        shutil.rmtree(workspace, ignore_errors=True)
+        os.makedirs(self.jobs_root, exist_ok=True)
+
+        hit = True
+        with self._locked(commit_oid, fcntl.LOCK_SH):
+            if os.path.isdir(path):
+                os.utime(path)
+                shutil.copytree(path, workspace, symlinks=True)
+                return workspace, hit
+
+        with self._locked(commit_oid, fcntl.LOCK_EX):
+            # Another job may have extracted it while this one waited
+            if not os.path.isdir(path):
+                hit = False
+                self._extract(repo_path, commit_oid, path)
+            os.utime(path)
+            shutil.copytree(path, workspace, symlinks=True)
+        self.evict()
+        return workspace, hit
+
+    def release(self, workspace):
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    def evict(self):
+        """Removes the least recently used checkouts over the size limit."""
+        checkouts = []
+        for entry in os.scandir(self.cache_root):
+            if entry.is_dir() and not entry.name.endswith(".partial"):
+                checkouts.append((entry.stat().st_mtime, entry.name))
+
+        excess = len(checkouts) - settings.GIT_PIPELINE_WORKSPACE_CACHE_SIZE
+        for _, commit_oid in sorted(checkouts):
+            if excess <= 0:
+                break
+            fd = os.open(self._lock_path(commit_oid), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                # In use: keep it, the next eviction retries
+                if not _try_lock(fd):
+                    continue
+                shutil.rmtree(
+                    os.path.join(self.cache_root, commit_oid), ignore_errors=True
+                )
+            finally:
+                os.close(fd)
+            excess -= 1
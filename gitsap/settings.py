@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import json
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "gitsap",
 ]
 
@@ -86,10 +89,98 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD", "gitsap"),
         "HOST": os.environ.get("DB_HOST", "127.0.0.1"),
         "PORT": os.environ.get("DB_PORT", "5432"),
+        # psycopg3 connection pool shared by the threads of a process,
+        # instead of a new connection per request
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+                "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            },
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    },
+    # Computed diffs. Point this at a Redis with a maxmemory limit and
+    # maxmemory-policy allkeys-lru so the least recently viewed diffs go first.
+    "diffs": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("DIFF_CACHE_URL", REDIS_URL),
+        "TIMEOUT": 60 * 60 * 24 * 7,
+    },
+    # Computed blame and last commits of tree entries, evicted the same way
+    # as diffs
+    "blame": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("BLAME_CACHE_URL", REDIS_URL),
+        "TIMEOUT": 60 * 60 * 24 * 7,
+    },
+}
+
+
+# Seconds a resolved (user, namespace) project access stays cached
+PROJECT_ACCESS_CACHE_TIMEOUT = 30
+
+DASHBOARD_PAGE_SIZE = 50
+PIPELINE_PAGE_SIZE = 50
+ISSUE_PAGE_SIZE = 25
+# Newest matches of an issue search ranked by relevance
+ISSUE_SEARCH_RANK_WINDOW = 1000
+
+
+# Celery
+# https://docs.celeryq.dev/en/stable/django/first-steps-with-django.html
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", REDIS_URL)
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Merge checks and search indexing get their own queues so a rescan of many
+# pull requests or a first index of a large repository runs on a fixed
+# number of processes, e.g.:
+#   celery -A gitsap worker -Q merges --concurrency 2
+#   celery -A gitsap worker -Q search --concurrency 1
+CELERY_TASK_ROUTES = {
+    "gitsap.tasks.merges.*": {"queue": "merges"},
+    "gitsap.tasks.search.*": {"queue": "search"},
+    "gitsap.tasks.maintenance.*": {"queue": "maintenance"},
+    "gitsap.tasks.counters.*": {"queue": "maintenance"},
+    # Its concurrency is the most jobs the host runs at once
+    "gitsap.tasks.pipelines.run_pipeline_job": {"queue": "pipelines"},
+    "gitsap.tasks.webhooks.deliver_webhooks": {"queue": "webhooks"},
+}
+# Run with: celery -A gitsap beat
+CELERY_BEAT_SCHEDULE = {
+    "schedule-repository-maintenance": {
+        "task": "gitsap.tasks.maintenance.schedule_repository_maintenance",
+        "schedule": 10 * 60,
+    },
+    "dispatch-pipeline-jobs": {
+        "task": "gitsap.tasks.pipelines.dispatch_pipeline_jobs",
+        "schedule": 30,
+    },
+    "deliver-webhooks": {
+        "task": "gitsap.tasks.webhooks.deliver_webhooks",
+        "schedule": 15,
+    },
+    "reconcile-project-counters": {
+        "task": "gitsap.tasks.counters.reconcile_project_counters",
+        "schedule": 60 * 60,
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -133,6 +224,159 @@ AUTH_USER_MODEL = "gitsap.User"
 GIT_REPO_BASE = os.environ.get(
     "GIT_REPO_BASE", "/Users/santoshkpatro/Desktop/gitsap/tmp/git"
 )
+# Storage shards, name -> {"path": root directory, "weight": placement
+# weight}, as JSON in GIT_STORAGE_SHARDS; repositories created before
+# sharding live in "default". New repositories go to the shard with the most
+# free space times weight ("free_space"), or to a random one in proportion
+# to the weights ("weight"). A move locks pushes out for at most
+# GIT_STORAGE_MOVE_LOCK_WAIT seconds of waiting plus its final copy, and
+# deletes the old copy GIT_STORAGE_MOVE_GRACE seconds later, once requests
+# that read it are done.
+GIT_STORAGE_SHARDS = json.loads(
+    os.environ.get(
+        "GIT_STORAGE_SHARDS",
+        json.dumps({"default": {"path": GIT_REPO_BASE, "weight": 1}}),
+    )
+)
+GIT_STORAGE_PLACEMENT = os.environ.get("GIT_STORAGE_PLACEMENT", "free_space")
+GIT_STORAGE_MOVE_LOCK_WAIT = 60
+GIT_STORAGE_MOVE_GRACE = 30
+GIT_BINARY = os.environ.get("GIT_BINARY", "git")
+GIT_HTTP_CHUNK_SIZE = int(os.environ.get("GIT_HTTP_CHUNK_SIZE", 64 * 1024))
+GIT_REF_CACHE_TIMEOUT = 60 * 60 * 24
+GIT_COMMIT_INDEX_BATCH_SIZE = 5000
+GIT_COMMIT_PAGE_SIZE = 50
+GIT_REF_PAGE_SIZE = 100
+# Larger blobs are only offered as raw downloads
+GIT_BLOB_DISPLAY_MAX_SIZE = 1024 * 1024
+# Diff lines kept per file, and how long a queued diff computation blocks
+# queueing another one for the same diff
+GIT_DIFF_MAX_FILE_LINES = 10000
+GIT_DIFF_PENDING_TIMEOUT = 5 * 60
+# Seconds one blame run walks before storing a partial result and queueing
+# the next, and how long a queued run blocks queueing another
+GIT_BLAME_TIME_BUDGET = 5
+GIT_BLAME_PENDING_TIMEOUT = 60
+# How long a queued last-commit walk of a directory blocks queueing another,
+# and the most new commits of a push that cached directories are carried
+# forward through
+GIT_TREE_COMMITS_PENDING_TIMEOUT = 5 * 60
+GIT_TREE_COMMITS_PUSH_DEPTH = 1000
+# Code search: larger files are not indexed, files per index segment, how
+# many segments an index may have before they are merged into one, and the
+# matching files listed per query
+GIT_SEARCH_MAX_FILE_SIZE = 1024 * 1024
+GIT_SEARCH_SEGMENT_SIZE = 50000
+GIT_SEARCH_MAX_SEGMENTS = 8
+GIT_SEARCH_MAX_RESULTS = 50
+# Conflicting paths stored per pull request
+GIT_MERGE_MAX_CONFLICT_PATHS = 100
+# Generated tar.gz and zip archives, least recently downloaded evicted first
+# past the size limit. Behind nginx, set GIT_ARCHIVE_SENDFILE_HEADER to
+# X-Accel-Redirect and GIT_ARCHIVE_SENDFILE_PREFIX to an internal location
+# aliasing the cache directory, so finished archives go out through
+# sendfile; otherwise the app streams them itself.
+GIT_ARCHIVE_CACHE_DIR = os.environ.get(
+    "GIT_ARCHIVE_CACHE_DIR", os.path.join(os.path.dirname(GIT_REPO_BASE), "archives")
+)
+GIT_ARCHIVE_CACHE_MAX_SIZE = int(
+    os.environ.get("GIT_ARCHIVE_CACHE_MAX_SIZE", 10 * 1024 * 1024 * 1024)
+)
+GIT_ARCHIVE_SENDFILE_HEADER = os.environ.get("GIT_ARCHIVE_SENDFILE_HEADER", "")
+GIT_ARCHIVE_SENDFILE_PREFIX = os.environ.get("GIT_ARCHIVE_SENDFILE_PREFIX", "")
+# Repository maintenance (repack, commit-graph, bitmaps): repositories
+# ranked per scheduling run and queued at most, how long a queued one is
+# not queued again, repositories maintained at once per host (slots are
+# flocked files in a host-local directory), loose objects worth a repack on
+# their own, and how long a push waits for maintenance to finish before
+# being refused with 503
+GIT_MAINTENANCE_SCAN_LIMIT = 1000
+GIT_MAINTENANCE_BATCH_SIZE = 20
+GIT_MAINTENANCE_PENDING_TIMEOUT = 60 * 60
+GIT_MAINTENANCE_HOST_CONCURRENCY = int(
+    os.environ.get("GIT_MAINTENANCE_HOST_CONCURRENCY", 1)
+)
+GIT_MAINTENANCE_SLOT_DIR = os.environ.get(
+    "GIT_MAINTENANCE_SLOT_DIR",
+    os.path.join(tempfile.gettempdir(), "gitsap-maintenance"),
+)
+GIT_MAINTENANCE_MIN_LOOSE_OBJECTS = 1000
+GIT_MAINTENANCE_PUSH_WAIT = 60
+# Pipelines: the file defining the jobs of a commit, jobs per pipeline,
+# default and longest job timeouts, and output kept per job
+GIT_PIPELINE_FILE = ".gitsap/pipeline.toml"
+GIT_PIPELINE_MAX_JOBS = 50
+GIT_PIPELINE_JOB_TIMEOUT = 60 * 60
+GIT_PIPELINE_MAX_JOB_TIMEOUT = 6 * 60 * 60
+GIT_PIPELINE_MAX_LOG_SIZE = 16 * 1024 * 1024
+# Jobs dispatched or running at once, in all and per project; how long a
+# dispatched job may wait for a worker before it is queued again, and how
+# long a running one may go without a heartbeat before it is failed
+GIT_PIPELINE_MAX_RUNNING = int(os.environ.get("GIT_PIPELINE_MAX_RUNNING", 16))
+GIT_PIPELINE_PROJECT_MAX_RUNNING = int(
+    os.environ.get("GIT_PIPELINE_PROJECT_MAX_RUNNING", 4)
+)
+GIT_PIPELINE_DISPATCH_TIMEOUT = 10 * 60
+GIT_PIPELINE_HEARTBEAT_TIMEOUT = 2 * 60
+# Worker host directory for job workspaces and the checkouts, per commit,
+# they are copied from
+GIT_PIPELINE_WORKSPACE_DIR = os.environ.get(
+    "GIT_PIPELINE_WORKSPACE_DIR",
+    os.path.join(tempfile.gettempdir(), "gitsap-pipelines"),
+)
+GIT_PIPELINE_WORKSPACE_CACHE_SIZE = int(
+    os.environ.get("GIT_PIPELINE_WORKSPACE_CACHE_SIZE", 20)
+)
+# Job logs: the Redis their streams are appended to while jobs run, the
+# directory, shared by web and worker hosts, finished logs are compacted
+# into, and how long a stream outlives its job for readers still on it
+GIT_PIPELINE_LOG_REDIS_URL = os.environ.get("GIT_PIPELINE_LOG_REDIS_URL", REDIS_URL)
+GIT_PIPELINE_LOG_DIR = os.environ.get(
+    "GIT_PIPELINE_LOG_DIR",
+    os.path.join(os.path.dirname(GIT_REPO_BASE), "pipeline-logs"),
+)
+GIT_PIPELINE_LOG_STREAM_TTL = 5 * 60
+
+# Webhooks: per delivering worker, deliveries held and requests in flight;
+# per webhook, deliveries claimed at once and requests in flight; and
+# connections per destination host
+WEBHOOK_MAX_CLAIMED = int(os.environ.get("WEBHOOK_MAX_CLAIMED", 1000))
+WEBHOOK_MAX_IN_FLIGHT = int(os.environ.get("WEBHOOK_MAX_IN_FLIGHT", 100))
+WEBHOOK_ENDPOINT_BATCH_SIZE = 100
+WEBHOOK_ENDPOINT_CONCURRENCY = int(os.environ.get("WEBHOOK_ENDPOINT_CONCURRENCY", 4))
+WEBHOOK_HOST_MAX_CONNECTIONS = 16
+# Seconds a delivery may take in all and to connect; attempts per delivery
+# and the backoff between them, doubling from the base up to the max
+WEBHOOK_TIMEOUT = 10
+WEBHOOK_CONNECT_TIMEOUT = 5
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_DELAY = 10
+WEBHOOK_RETRY_MAX_DELAY = 60 * 60
+# Failures in a row that open the circuit of a webhook, and for how long
+WEBHOOK_CIRCUIT_THRESHOLD = 5
+WEBHOOK_CIRCUIT_COOLDOWN = 5 * 60
+# Seconds one delivery task claims deliveries for
+WEBHOOK_DRAIN_TIME = 50
+WEBHOOK_DELIVERY_PAGE_SIZE = 20
+# Webhooks are refused hosts that resolve to loopback, private, link-local
+# or other non-public addresses, which would let project managers reach
+# services on the network of the workers. Set it to deliver to those too,
+# e.g. in development or to receivers on an internal network
+WEBHOOK_ALLOW_LOCAL_NETWORKS = False
+# Pre-initialized bare repositories kept ready for new projects
+GIT_SPARE_REPO_COUNT = int(os.environ.get("GIT_SPARE_REPO_COUNT", 8))
+
+# Open pygit2 handles kept per worker process, and the process wide libgit2
+# limits (bytes) for the object cache and mmapped pack windows
+GIT_REPO_POOL_SIZE = int(os.environ.get("GIT_REPO_POOL_SIZE", 64))
+GIT_OBJECT_CACHE_MAX_SIZE = int(
+    os.environ.get("GIT_OBJECT_CACHE_MAX_SIZE", 256 * 1024 * 1024)
+)
+GIT_MWINDOW_MAPPED_LIMIT = int(
+    os.environ.get("GIT_MWINDOW_MAPPED_LIMIT", 1024 * 1024 * 1024)
+)
+# Threads per process running blocking libgit2 calls for async views
+GIT_EXECUTOR_WORKERS = int(os.environ.get("GIT_EXECUTOR_WORKERS", 8))
 
 # APP Base Setting
 APP_BASE_URL = os.environ.get("APP_BASE_URL", "http://127.0.0.1:8000")
@@ -1,21 +1,209 @@
-import os
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+from django.dispatch import receiver, Signal
 
-from gitsap.models import Project, Repository
+from gitsap.access import invalidate_namespace, invalidate_user
+from gitsap.models import (
+    Project,
+    ProjectPermission,
+    OrganizationPermission,
+    EffectiveProjectPermission,
+    Repository,
+    ProjectCounters,
+    ProtectionRule,
+)
+from gitsap.git import protection, storage
+from gitsap.git.pool import get_pool
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.tasks import (
+    index_pushed_commits,
+    sync_git_refs,
+    provision_repository,
+    check_pull_request_merges,
+    update_search_index,
+    update_tree_commits,
+    create_push_pipelines,
+    create_push_webhook_deliveries,
+)
+
+
+# Sent once a push has been applied to a repository.
+# Provides: repository, updates — list of (old_oid, new_oid, ref_name) tuples,
+# previous_tips — hex oids of the commits the refs pointed to before the push
+post_receive = Signal()
 
 
 @receiver(post_save, sender=Project)
 def create_repo(sender, instance, created, **kwargs):
     if created:
-        repo_path = os.path.join(
-            settings.GIT_REPO_BASE, f"{instance.namespace}.git"
+        shard = storage.choose_shard()
+        # Nothing to backfill, pushes are indexed as they arrive
+        repository = Repository.objects.create(
+            project=instance,
+            shard=shard,
+            repo_path=storage.repo_path_for(shard, instance.pk),
+            commits_indexed_at=timezone.now(),
         )
 
-        Repository.init_bare_repo_path(repo_path)
+        # The directory is created outside the transaction, and never for a
+        # project that gets rolled back
+        transaction.on_commit(lambda: provision_repository.delay(repository.pk))
 
-        Repository.objects.create(
-            project=instance,
-            repo_path=repo_path,
+
+@receiver(post_save, sender=Project)
+def create_project_counters(sender, instance, created, **kwargs):
+    if created:
+        ProjectCounters.objects.create(project=instance)
+
+
+@receiver(post_save, sender=Project)
+def sync_effective_permissions(sender, instance, created, **kwargs):
+    # Rows only depend on the organization, see note_project_changes
+    if created or getattr(instance, "_organization_changed", False):
+        EffectiveProjectPermission.sync_project(instance)
+
+
+@receiver(post_save, sender=ProjectPermission)
+@receiver(post_delete, sender=ProjectPermission)
+def sync_project_member_permission(sender, instance, **kwargs):
+    EffectiveProjectPermission.sync_project_member(instance.project, instance.user_id)
+
+
+@receiver(post_save, sender=OrganizationPermission)
+@receiver(post_delete, sender=OrganizationPermission)
+def sync_organization_member_permission(sender, instance, **kwargs):
+    EffectiveProjectPermission.sync_organization_member(
+        instance.organization_id, instance.user_id
+    )
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project_access(sender, instance, **kwargs):
+    # Once committed: a request caching the project before that would store
+    # the old row under the new version
+    namespace = instance.namespace
+    transaction.on_commit(lambda: invalidate_namespace(namespace))
+
+
+@receiver(post_save, sender=Repository)
+def invalidate_repository_access(sender, instance, **kwargs):
+    # Cached access carries the repository, e.g. whether it is empty or
+    # provisioned yet
+    namespace = instance.project.namespace
+    transaction.on_commit(lambda: invalidate_namespace(namespace))
+
+
+@receiver(pre_save, sender=Project)
+def note_project_changes(sender, instance, update_fields, **kwargs):
+    instance._organization_changed = False
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {"namespace", "organization"} & set(
+        update_fields
+    ):
+        return
+    old = (
+        Project.objects.filter(pk=instance.pk)
+        .values_list("namespace", "organization_id")
+        .first()
+    )
+    if old is None:
+        return
+    old_namespace, old_organization_id = old
+    instance._organization_changed = old_organization_id != instance.organization_id
+    if old_namespace != instance.namespace:
+        # Cached access under the old namespace would keep resolving
+        transaction.on_commit(lambda: invalidate_namespace(old_namespace))
+
+
+@receiver(post_save, sender=ProjectPermission)
+@receiver(post_delete, sender=ProjectPermission)
+@receiver(post_save, sender=OrganizationPermission)
+@receiver(post_delete, sender=OrganizationPermission)
+def invalidate_permission_access(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(post_save, sender=ProtectionRule)
+@receiver(post_delete, sender=ProtectionRule)
+def invalidate_protection_rules(sender, instance, **kwargs):
+    project_id = instance.project_id
+    transaction.on_commit(lambda: protection.invalidate(project_id))
+
+
+@receiver(post_receive, sender=Repository)
+def invalidate_ref_cache(sender, repository, updates, **kwargs):
+    repository.invalidate_refs()
+
+
+@receiver(post_receive, sender=Repository)
+def release_repo_handles(sender, repository, updates, **kwargs):
+    get_pool().invalidate(repository.repo_path)
+
+
+@receiver(post_receive, sender=Repository)
+def mark_repo_not_empty(sender, repository, updates, **kwargs):
+    pushed = [new for _, new, _ in updates if new != Repository.ZERO_OID]
+    if repository.is_empty and pushed:
+        repository.is_empty = False
+        repository.save(update_fields=["is_empty", "updated_at"])
+
+
+@receiver(post_receive, sender=Repository)
+def count_push(sender, repository, updates, **kwargs):
+    Repository.objects.filter(pk=repository.pk).update(
+        pushes_since_maintenance=F("pushes_since_maintenance") + 1
+    )
+
+
+@receiver(post_receive, sender=Repository)
+def queue_commit_indexing(sender, repository, updates, previous_tips, **kwargs):
+    transaction.on_commit(
+        lambda: index_pushed_commits.delay(repository.pk, updates, previous_tips)
+    )
+
+
+@receiver(post_receive, sender=Repository)
+def queue_ref_sync(sender, repository, updates, **kwargs):
+    transaction.on_commit(lambda: sync_git_refs.delay(repository.pk))
+
+
+@receiver(post_receive, sender=Repository)
+def queue_merge_checks(sender, repository, updates, **kwargs):
+    branches = [
+        ref_name[len(BRANCH_PREFIX) :]
+        for _, _, ref_name in updates
+        if ref_name.startswith(BRANCH_PREFIX)
+    ]
+    if branches:
+        transaction.on_commit(
+            lambda: check_pull_request_merges.delay(repository.pk, branches)
         )
+
+
+@receiver(post_receive, sender=Repository)
+def queue_search_indexing(sender, repository, updates, **kwargs):
+    default_ref = f"{BRANCH_PREFIX}{repository.project.default_git_branch}"
+    if any(ref_name == default_ref for _, _, ref_name in updates):
+        transaction.on_commit(lambda: update_search_index.delay(repository.pk))
+
+
+@receiver(post_receive, sender=Repository)
+def queue_tree_commits_update(sender, repository, updates, **kwargs):
+    transaction.on_commit(lambda: update_tree_commits.delay(repository.pk, updates))
+
+
+@receiver(post_receive, sender=Repository)
+def queue_push_pipelines(sender, repository, updates, **kwargs):
+    transaction.on_commit(lambda: create_push_pipelines.delay(repository.pk, updates))
+
+
+@receiver(post_receive, sender=Repository)
+def queue_push_webhooks(sender, repository, updates, **kwargs):
+    transaction.on_commit(
+        lambda: create_push_webhook_deliveries.delay(repository.pk, updates)
+    )
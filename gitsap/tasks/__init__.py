@@ -0,0 +1,41 @@
+from gitsap.tasks.commits import index_pushed_commits, backfill_commit_index
+from gitsap.tasks.refs import sync_git_refs
+from gitsap.tasks.repositories import provision_repository, refill_spare_repositories
+from gitsap.tasks.diffs import compute_pull_request_diff
+from gitsap.tasks.merges import check_pull_request_merges
+from gitsap.tasks.blame import compute_blame
+from gitsap.tasks.search import update_search_index
+from gitsap.tasks.tree_commits import compute_tree_commits, update_tree_commits
+from gitsap.tasks.pipelines import (
+    dispatch_pipeline_jobs,
+    run_pipeline_job,
+    create_push_pipelines,
+)
+from gitsap.tasks.maintenance import (
+    schedule_repository_maintenance,
+    maintain_repository,
+)
+from gitsap.tasks.webhooks import deliver_webhooks, create_push_webhook_deliveries
+from gitsap.tasks.counters import reconcile_project_counters
+
+__all__ = [
+    "index_pushed_commits",
+    "backfill_commit_index",
+    "sync_git_refs",
+    "provision_repository",
+    "refill_spare_repositories",
+    "compute_pull_request_diff",
+    "check_pull_request_merges",
+    "compute_blame",
+    "update_search_index",
+    "compute_tree_commits",
+    "update_tree_commits",
+    "schedule_repository_maintenance",
+    "maintain_repository",
+    "dispatch_pipeline_jobs",
+    "run_pipeline_job",
+    "create_push_pipelines",
+    "deliver_webhooks",
+    "create_push_webhook_deliveries",
+    "reconcile_project_counters",
+]
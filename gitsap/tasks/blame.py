@@ -0,0 +1,42 @@
+import time
+
+from celery import shared_task
+from django.conf import settings
+
+from gitsap.git.blame import BlameBuilder, BlameCache
+from gitsap.models import Repository
+
+
+@shared_task
+def compute_blame(repository_id, commit_oid, path):
+    """
+    Blames path at commit_oid for up to GIT_BLAME_TIME_BUDGET seconds,
+    resuming from the stored partial result. Stores the result when done,
+    otherwise the partial result, and queues the next run. Returns True once
+    the blame is complete.
+    """
+    repository = Repository.objects.get(pk=repository_id)
+    blame = BlameCache(commit_oid, path)
+    if blame.get() is not None:
+        return True
+
+    partial = blame.get_partial()
+    deadline = time.monotonic() + settings.GIT_BLAME_TIME_BUDGET
+
+    with repository.open() as repo:
+        builder = BlameBuilder(
+            repo, blame, commit_oid, path, partial["state"] if partial else None
+        )
+        done = builder.run(deadline)
+        if done:
+            blame.store(builder.result(), builder.state["revision"] or commit_oid)
+        else:
+            blame.store_partial(
+                {"state": builder.state, "result": builder.result(partial=True)}
+            )
+
+    if not done:
+        # Requeued rather than looped, so other work gets the worker in between
+        blame.extend_claim()
+        compute_blame.delay(repository_id, commit_oid, path)
+    return done
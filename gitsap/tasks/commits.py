@@ -0,0 +1,80 @@
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from gitsap.models import Repository, GitCommit
+from gitsap.git.commits import (
+    iter_dropped_commits,
+    iter_history,
+    iter_pushed_commits,
+    ref_tips,
+)
+
+
+@shared_task
+def index_pushed_commits(repository_id, updates, previous_tips):
+    """
+    Indexes only the commits introduced by one push, and drops those it
+    left unreachable from every ref. previous_tips are the commits the refs
+    pointed to before the push: the refs as they are when the task runs may
+    already include commits of later pushes, which hiding them would leave
+    out of both indexes.
+    """
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+    batch_size = settings.GIT_COMMIT_INDEX_BATCH_SIZE
+
+    with repository.open() as repo:
+        commits = iter_pushed_commits(repo, updates, previous_tips)
+        for _ in GitCommit.bulk_index(repository.project, commits, batch_size):
+            pass
+        # Against the refs as they are now: a commit a later push made
+        # reachable again is kept, or indexed again by that push
+        dropped = iter_dropped_commits(repo, updates)
+        GitCommit.prune(repository.project, dropped, batch_size)
+
+
+@shared_task
+def backfill_commit_index(repository_id):
+    """
+    Indexes the full history of an existing repository. Progress is
+    checkpointed on the repository after every batch; a re-run (or a
+    redelivery after a worker crash) walks the same tips again and skips the
+    commits it already wrote. Commits pushed meanwhile are covered by
+    index_pushed_commits.
+    """
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+
+    with repository.open() as repo:
+        tips = repository.commit_backfill_tips
+        if tips is None or not all(oid in repo for oid in tips):
+            # Fresh start, or a recorded tip got garbage collected and the
+            # walk can no longer be replayed; rewriting rows is harmless
+            repository.commit_backfill_tips = ref_tips(repo)
+            repository.commit_backfill_offset = 0
+            repository.save(
+                update_fields=[
+                    "commit_backfill_tips",
+                    "commit_backfill_offset",
+                    "updated_at",
+                ]
+            )
+
+        offset = repository.commit_backfill_offset
+        commits = iter_history(repo, repository.commit_backfill_tips, offset)
+        for written in GitCommit.bulk_index(
+            repository.project, commits, settings.GIT_COMMIT_INDEX_BATCH_SIZE
+        ):
+            repository.commit_backfill_offset = offset + written
+            repository.save(update_fields=["commit_backfill_offset", "updated_at"])
+
+    repository.commit_backfill_tips = None
+    repository.commit_backfill_offset = 0
+    repository.commits_indexed_at = timezone.now()
+    repository.save(
+        update_fields=[
+            "commit_backfill_tips",
+            "commit_backfill_offset",
+            "commits_indexed_at",
+            "updated_at",
+        ]
+    )
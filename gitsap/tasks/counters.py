@@ -0,0 +1,54 @@
+import logging
+
+from celery import shared_task
+from django.db.models import Count
+
+from gitsap.models import (
+    GitRef,
+    GitRefTypeChoice,
+    Issue,
+    Pipeline,
+    Project,
+    ProjectCounters,
+    PullRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def count_project_rows(project_id):
+    """The counts ProjectCounters keeps for project_id, counted from its rows."""
+    counts = dict.fromkeys(ProjectCounters.COUNTER_FIELDS, 0)
+    for prefix, queryset, column in (
+        ("issues", Issue.objects, "state"),
+        ("pull_requests", PullRequest.objects, "state"),
+        ("pipelines", Pipeline.objects, "status"),
+    ):
+        rows = (
+            queryset.filter(project_id=project_id)
+            .values_list(column)
+            .annotate(count=Count("*"))
+            .order_by()
+        )
+        for value, count in rows:
+            counts[f"{prefix}_{value}"] = count
+    counts["branches"] = GitRef.objects.filter(
+        project_id=project_id, ref_type=GitRefTypeChoice.BRANCH
+    ).count()
+    return counts
+
+
+@shared_task
+def reconcile_project_counters():
+    """
+    Run by celery beat: recounts the rows of every project and corrects the
+    counters that drifted, e.g. after rows were written in bulk. Returns the
+    number of projects corrected.
+    """
+    corrected = 0
+    for project_id in Project.objects.values_list("pk", flat=True).iterator():
+        drift = ProjectCounters.reconcile(project_id, count_project_rows)
+        if drift:
+            logger.warning("Corrected the counters of %s: %s", project_id, drift)
+            corrected += 1
+    return corrected
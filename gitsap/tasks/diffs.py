@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from gitsap.git.diffs import DiffCache, compute_diff
+from gitsap.models import Repository
+
+
+@shared_task
+def compute_pull_request_diff(repository_id, base_oid, head_oid, options):
+    """Computes the diff of head_oid against base_oid and stores it in the diff cache."""
+    repository = Repository.objects.get(pk=repository_id)
+
+    with repository.open() as repo:
+        manifest, files = compute_diff(repo, base_oid, head_oid, options)
+
+    DiffCache(base_oid, head_oid, options).store(manifest, files)
+    return len(files)
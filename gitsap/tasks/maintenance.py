@@ -0,0 +1,98 @@
+import logging
+import subprocess
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from gitsap.git import maintenance
+from gitsap.models import Repository
+
+logger = logging.getLogger(__name__)
+
+
+def _pending_key(repository_id):
+    return f"maintenance:pending:{repository_id}"
+
+
+@shared_task
+def schedule_repository_maintenance():
+    """
+    Run by celery beat: ranks the repositories pushed to since their last
+    maintenance, and any never maintained, by pushes and fragmentation and
+    queues maintenance for the GIT_MAINTENANCE_BATCH_SIZE that need it most.
+    Returns the number queued.
+    """
+    candidates = (
+        Repository.objects.filter(provisioned_at__isnull=False, is_empty=False)
+        .filter(pushes_since_maintenance__gt=0)
+        .order_by("-pushes_since_maintenance")
+        .values_list("pk", "repo_path", "pushes_since_maintenance")
+    )
+    never_maintained = Repository.objects.filter(
+        provisioned_at__isnull=False, is_empty=False, maintained_at__isnull=True
+    ).values_list("pk", "repo_path", "pushes_since_maintenance")
+
+    limit = settings.GIT_MAINTENANCE_SCAN_LIMIT
+    ranked = []
+    for pk, repo_path, pushes in {*candidates[:limit], *never_maintained[:limit]}:
+        urgency = maintenance.score(maintenance.fragmentation(repo_path), pushes)
+        if urgency:
+            ranked.append((urgency, pk))
+
+    queued = 0
+    for _, pk in sorted(ranked, reverse=True):
+        if queued == settings.GIT_MAINTENANCE_BATCH_SIZE:
+            break
+        if cache.add(
+            _pending_key(pk), 1, timeout=settings.GIT_MAINTENANCE_PENDING_TIMEOUT
+        ):
+            maintain_repository.delay(pk)
+            queued += 1
+    return queued
+
+
+@shared_task
+def maintain_repository(repository_id):
+    """
+    Repacks a repository and writes its commit-graph and bitmaps. Skipped,
+    returning False, while a push holds the repository or every maintenance
+    slot of this host is taken: the next scheduling run queues it again.
+    """
+    try:
+        repository = Repository.objects.get(pk=repository_id)
+        with maintenance.host_slot() as slot:
+            if slot is None:
+                return False
+
+            lock = maintenance.RepositoryLock(repository.repo_path)
+            if not lock.acquire():
+                return False
+            try:
+                # Pushes are counted under the lock, so none lands unseen
+                repo_path, pushes = Repository.objects.values_list(
+                    "repo_path", "pushes_since_maintenance"
+                ).get(pk=repository_id)
+                if repo_path != repository.repo_path:
+                    # Moved to another shard meanwhile
+                    return False
+                maintenance.maintain(repository.repo_path)
+            except subprocess.CalledProcessError as error:
+                logger.warning(
+                    "Maintenance of %s failed: %s",
+                    repository.repo_path,
+                    error.stderr.decode("utf-8", "replace").strip(),
+                )
+                return False
+            finally:
+                lock.release()
+
+        Repository.objects.filter(pk=repository_id).update(
+            pushes_since_maintenance=F("pushes_since_maintenance") - pushes,
+            maintained_at=timezone.now(),
+        )
+        return True
+    finally:
+        cache.delete(_pending_key(repository_id))
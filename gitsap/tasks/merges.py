@@ -0,0 +1,52 @@
+from celery import shared_task
+from django.db.models import Q
+
+from gitsap.git.merges import branch_tip, find_conflicts
+from gitsap.models import Repository, PullRequest, PullRequestStateChoice
+
+# Checks stored per UPDATE, and kept should the task die afterwards
+CHECK_BATCH_SIZE = 500
+
+
+@shared_task
+def check_pull_request_merges(repository_id, branches=None, force=False):
+    """
+    Rechecks the mergeability of the open pull requests of a repository that
+    have one of branches as source or target (all of them when None). Pull
+    requests whose two tips are unchanged since their last check are
+    skipped unless force is set. Checks are stored every CHECK_BATCH_SIZE,
+    so a rescan cut short keeps those done. Returns the number of checks
+    run.
+    """
+    repository = Repository.objects.get(pk=repository_id)
+
+    pull_requests = PullRequest.objects.filter(
+        project_id=repository_id, state=PullRequestStateChoice.OPEN
+    )
+    if branches is not None:
+        pull_requests = pull_requests.filter(
+            Q(source_branch__in=branches) | Q(target_branch__in=branches)
+        )
+
+    checked = []
+    count = 0
+    with repository.open() as repo:
+        for pull_request in pull_requests.iterator():
+            target = branch_tip(repo, pull_request.target_branch)
+            source = branch_tip(repo, pull_request.source_branch)
+            if target is None or source is None:
+                continue
+            if not force and pull_request.merge_checked_for(target, source):
+                continue
+
+            conflicts = find_conflicts(repo, target, source)
+            pull_request.record_merge_check(target, source, conflicts)
+            checked.append(pull_request)
+            count += 1
+            if len(checked) >= CHECK_BATCH_SIZE:
+                PullRequest.objects.bulk_update(checked, PullRequest.MERGE_CHECK_FIELDS)
+                checked = []
+
+    if checked:
+        PullRequest.objects.bulk_update(checked, PullRequest.MERGE_CHECK_FIELDS)
+    return count
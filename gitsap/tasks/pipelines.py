@@ -0,0 +1,52 @@
+from celery import shared_task
+from django.db import transaction
+
+from gitsap.git.refs import BRANCH_PREFIX
+from gitsap.models import Repository
+from gitsap.pipelines import definitions, runner, scheduler
+
+
+@shared_task
+def dispatch_pipeline_jobs():
+    """
+    Starts the queued jobs the concurrency limits leave room for, after
+    recovering jobs lost with their worker. Also run by celery beat.
+    Returns the number started.
+    """
+    scheduler.reap()
+    job_ids = scheduler.dispatch()
+    for job_id in job_ids:
+        run_pipeline_job.delay(job_id)
+    return len(job_ids)
+
+
+@shared_task
+def run_pipeline_job(job_id):
+    """Runs a dispatched job on this worker, then fills the slot it frees."""
+    try:
+        return runner.run(job_id)
+    finally:
+        dispatch_pipeline_jobs.delay()
+
+
+@shared_task
+def create_push_pipelines(repository_id, updates):
+    """
+    Creates a pipeline for every branch a push updated whose new tip
+    defines one. Returns the number created.
+    """
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+    created = 0
+    with repository.open() as repo:
+        for _, new, ref_name in updates:
+            if new == Repository.ZERO_OID or not ref_name.startswith(BRANCH_PREFIX):
+                continue
+            if not definitions.has_definition(repo, new):
+                continue
+            branch = ref_name[len(BRANCH_PREFIX) :]
+            scheduler.create_pipeline(repository.project, repo, branch, new)
+            created += 1
+
+    if created:
+        transaction.on_commit(dispatch_pipeline_jobs.delay)
+    return created
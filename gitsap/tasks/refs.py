@@ -0,0 +1,18 @@
+from celery import shared_task
+
+from gitsap.models import Repository, GitRef
+from gitsap.git.refs import read_ref_snapshot
+from gitsap.git.commits import tip_committed_at
+
+
+@shared_task
+def sync_git_refs(repository_id):
+    """Diffs the repository's refs against the git_refs table and applies the changes."""
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+
+    with repository.open() as repo:
+        return GitRef.sync(
+            repository,
+            lambda: read_ref_snapshot(repo),
+            lambda oid: tip_committed_at(repo, oid),
+        )
@@ -0,0 +1,39 @@
+from celery import shared_task
+from django.conf import settings
+
+from gitsap.access import invalidate_namespace
+from gitsap.git import storage
+from gitsap.models import Repository
+
+
+@shared_task
+def provision_repository(repository_id):
+    """Creates the bare repository of a new project on disk."""
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+    if repository.is_provisioned:
+        return False
+
+    claimed = repository.provision()
+    # Cached access results still hold the unprovisioned record
+    invalidate_namespace(repository.project.namespace)
+
+    if claimed:
+        refill_spare_repositories.delay()
+    return claimed
+
+
+@shared_task
+def refill_spare_repositories():
+    """
+    Tops the spare pool of every shard taking new repositories up to
+    GIT_SPARE_REPO_COUNT repositories. Returns the number created.
+    """
+    created = 0
+    for shard, options in settings.GIT_STORAGE_SHARDS.items():
+        if options["weight"] <= 0:
+            continue
+        missing = settings.GIT_SPARE_REPO_COUNT - len(storage.list_spares(shard))
+        for _ in range(missing):
+            storage.create_spare(shard)
+        created += max(missing, 0)
+    return created
@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from gitsap.git.merges import branch_tip
+from gitsap.git.search import SearchIndex
+from gitsap.models import Repository
+
+
+@shared_task
+def update_search_index(repository_id):
+    """
+    Brings the code search index of a repository to the tip of its default
+    branch. Returns the number of files (re)indexed.
+    """
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+
+    with repository.open() as repo:
+        tip = branch_tip(repo, repository.project.default_git_branch)
+        if tip is None:
+            return 0
+        indexed, _ = SearchIndex.for_repository(repository).update(repo, tip)
+    return indexed
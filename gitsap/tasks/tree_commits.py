@@ -0,0 +1,36 @@
+from celery import shared_task
+
+from gitsap.git.refs import BRANCH_PREFIX, ZERO_OID
+from gitsap.git.tree_commits import TreeCommits, carry_forward
+from gitsap.models import Repository
+
+
+@shared_task
+def compute_tree_commits(repository_id, commit_oid, path):
+    """
+    Finds the last commit of each entry of the directory path at commit_oid,
+    walking its history at most once, and caches the result.
+    """
+    repository = Repository.objects.get(pk=repository_id)
+    with repository.open() as repo:
+        try:
+            TreeCommits(repo, commit_oid, path).compute()
+        except KeyError:
+            # Not a directory: nothing to cache
+            pass
+
+
+@shared_task
+def update_tree_commits(repository_id, updates):
+    """
+    Carries the cached last commits of the directories a push changed through
+    the new commits of each updated branch. Returns the number of results
+    stored.
+    """
+    repository = Repository.objects.get(pk=repository_id)
+    stored = 0
+    with repository.open() as repo:
+        for old, new, ref_name in updates:
+            if ref_name.startswith(BRANCH_PREFIX) and ZERO_OID not in (old, new):
+                stored += carry_forward(repo, old, new)
+    return stored
@@ -0,0 +1,40 @@
+import asyncio
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from gitsap.models import Repository
+from gitsap.webhooks import events
+from gitsap.webhooks.delivery import Deliverer
+
+# Set while a drain is queued, so a burst of pushes queues a single one
+DRAIN_PENDING_KEY = "webhooks:drain:pending"
+
+
+def _queue_drain():
+    if cache.add(DRAIN_PENDING_KEY, 1, timeout=settings.WEBHOOK_DRAIN_TIME):
+        transaction.on_commit(deliver_webhooks.delay)
+
+
+@shared_task
+def deliver_webhooks():
+    """
+    Delivers the due webhook deliveries for up to WEBHOOK_DRAIN_TIME
+    seconds. Also run by celery beat, for retries. Returns the number of
+    attempts made.
+    """
+    # Events queued from now on need another drain, this one may miss them
+    cache.delete(DRAIN_PENDING_KEY)
+    return asyncio.run(Deliverer().run(settings.WEBHOOK_DRAIN_TIME))
+
+
+@shared_task
+def create_push_webhook_deliveries(repository_id, updates):
+    """Queues the push events of a push for the webhooks of its project."""
+    repository = Repository.objects.select_related("project").get(pk=repository_id)
+    queued = events.queue_push(repository, updates)
+    if queued:
+        _queue_drain()
+    return queued
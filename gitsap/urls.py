@@ -1,8 +1,15 @@
 from django.contrib import admin
 from django.urls import path, re_path, include
 
+from gitsap.views.home import IndexView
 from gitsap.views.projects import (
     RepoView,
+    TreeView,
+    BlobView,
+    BlameView,
+    RawView,
+    ArchiveView,
+    SearchView,
     CommitsView,
     BranchesView,
     SettingsGeneralView,
@@ -16,14 +23,27 @@ from gitsap.views.issues import IssueListView, IssueDetailView, IssueCreateView
 from gitsap.views.pull_requests import (
     PullRequestListView,
     PullRequestDetailView,
+    PullRequestFileView,
     PullRequestCreateView,
     PullRequestConfirmView,
 )
-from gitsap.views.pipelines import PipelineListView, PipelineDetailView, PipelineCreateView
+from gitsap.views.pipelines import (
+    PipelineListView,
+    PipelineDetailView,
+    PipelineCreateView,
+    PipelineJobLogView,
+    PipelineJobRawLogView,
+)
 
 project_urlpatterns = [
     # Code
     path("", RepoView.as_view(), name="repo"),
+    path("tree/<path:spec>", TreeView.as_view(), name="tree"),
+    path("blob/<path:spec>", BlobView.as_view(), name="blob"),
+    path("blame/<path:spec>", BlameView.as_view(), name="blame"),
+    path("raw/<path:spec>", RawView.as_view(), name="raw"),
+    path("archive/<path:spec>", ArchiveView.as_view(), name="archive"),
+    path("search/", SearchView.as_view(), name="search"),
     path("commits/", CommitsView.as_view(), name="commits"),
     path("branches/", BranchesView.as_view(), name="branches"),
 
@@ -37,11 +57,14 @@ project_urlpatterns = [
     path("pull-requests/new/", PullRequestCreateView.as_view(), name="pull_request_create"),
     path("pull-requests/<str:pr_id>/", PullRequestDetailView.as_view(), name="pull_request_detail"),
     path("pull-requests/<str:pr_id>/confirm/", PullRequestConfirmView.as_view(), name="pull_request_confirm"),
+    path("pull-requests/<str:pr_id>/files/<int:index>/", PullRequestFileView.as_view(), name="pull_request_file"),
 
     # Pipelines
     path("pipelines/", PipelineListView.as_view(), name="pipeline_list"),
     path("pipelines/new/", PipelineCreateView.as_view(), name="pipeline_create"),
     path("pipelines/<str:pipeline_id>/", PipelineDetailView.as_view(), name="pipeline_detail"),
+    path("pipelines/<str:pipeline_id>/jobs/<str:job_id>/log/", PipelineJobLogView.as_view(), name="pipeline_job_log"),
+    path("pipelines/<str:pipeline_id>/jobs/<str:job_id>/log/raw/", PipelineJobRawLogView.as_view(), name="pipeline_job_raw_log"),
 
     # Settings
     path("settings/", SettingsGeneralView.as_view(), name="settings_general"),
@@ -54,5 +77,6 @@ project_urlpatterns = [
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("", IndexView.as_view(), name="home"),
     re_path(r"^(?P<namespace>[^/]+/[^/]+)/", include(project_urlpatterns)),
 ]
@@ -1,7 +1,39 @@
-import time
+"""
+ULID generation (https://github.com/ulid/spec).
+
+IDs are monotonic within a process: inside one millisecond the 80-bit random
+part is incremented instead of redrawn, so IDs sort in creation order and a
+batch of any size costs a single entropy read.
+"""
+
+import base64
 import os
+import threading
+import time
 
 CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+RFC4648_BASE32 = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+MAX_RANDOMNESS = (1 << 80) - 1
+
+# base64.b32encode does the bit packing in C, these map its alphabet to
+# Crockford's
+_UPPERCASE = bytes.maketrans(RFC4648_BASE32.encode(), CROCKFORD_BASE32.encode())
+_LOWERCASE = bytes.maketrans(RFC4648_BASE32.encode(), CROCKFORD_BASE32.lower().encode())
+
+_lock = threading.Lock()
+_last_timestamp = -1
+_last_randomness = 0
+
+
+def _reset_state():
+    # A forked child must not keep counting from its parent's last ID
+    global _lock, _last_timestamp, _last_randomness
+    _lock = threading.Lock()
+    _last_timestamp = -1
+    _last_randomness = 0
+
+
+os.register_at_fork(after_in_child=_reset_state)
 
 
 def encode_base32(value: int, length: int) -> str:
@@ -12,15 +44,61 @@ def encode_base32(value: int, length: int) -> str:
     return "".join(reversed(result))
 
 
-def generate_ulid() -> str:
-    # 48-bit timestamp (milliseconds)
-    timestamp = int(time.time() * 1000)
+def _reserve(count: int) -> tuple[int, int]:
+    """
+    Reserves count consecutive random values and returns (timestamp, first
+    random value) for them.
+    """
+    global _last_timestamp, _last_randomness
 
-    # 80-bit randomness
-    randomness = int.from_bytes(os.urandom(10), "big")
+    timestamp = time.time_ns() // 1_000_000
+    with _lock:
+        if timestamp <= _last_timestamp:
+            # Same millisecond (or the clock stepped back): keep counting
+            timestamp = _last_timestamp
+            randomness = _last_randomness + 1
+        else:
+            randomness = int.from_bytes(os.urandom(10), "big")
 
-    # Encode parts
-    time_str = encode_base32(timestamp, 10)
-    rand_str = encode_base32(randomness, 16)
+        if randomness + count - 1 > MAX_RANDOMNESS:
+            # The random part would overflow, borrow the next millisecond
+            timestamp += 1
+            randomness = int.from_bytes(os.urandom(10), "big") >> 1
 
-    return time_str + rand_str
+        _last_timestamp = timestamp
+        _last_randomness = randomness + count - 1
+
+    return timestamp, randomness
+
+
+def generate_ulids(count: int, lowercase: bool = False) -> list[str]:
+    """Returns count monotonically increasing ULIDs."""
+    if count <= 0:
+        return []
+
+    timestamp, randomness = _reserve(count)
+
+    table = _LOWERCASE if lowercase else _UPPERCASE
+
+    # 10 bytes encode to exactly 16 characters, so the whole batch goes
+    # through b32encode at once without padding. The timestamp takes the
+    # last 10 characters (50 bits) of its own 16.
+    raw = b"".join(
+        [value.to_bytes(10, "big") for value in range(randomness, randomness + count)]
+    )
+    encoded = (
+        base64.b32encode(timestamp.to_bytes(10, "big") + raw)
+        .translate(table)
+        .decode("ascii")
+    )
+    prefix = encoded[6:16]
+    encoded = encoded[16:]
+
+    return [prefix + encoded[i : i + 16] for i in range(0, count * 16, 16)]
+
+
+def generate_ulid() -> str:
+    timestamp, randomness = _reserve(1)
+    # 20 bytes encode to 32 characters, the ULID is the last 26 (130 bits)
+    raw = ((timestamp << 80) | randomness).to_bytes(20, "big")
+    return base64.b32encode(raw)[6:].translate(_UPPERCASE).decode("ascii")
@@ -1,9 +1,22 @@
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render
 
+from gitsap.models import EffectiveProjectPermission
+
 
 class IndexView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        context = {}
+        # Newest first straight off the (user, project) primary key
+        permissions = (
+            EffectiveProjectPermission.objects.filter(user=request.user)
+            .select_related("project", "project__organization")
+            .order_by("-project_id")
+        )
+        page = Paginator(permissions, settings.DASHBOARD_PAGE_SIZE).get_page(
+            request.GET.get("page")
+        )
+        context = {"page": page}
         return render(request, "home/index.html", context)
@@ -1,22 +1,176 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseForbidden
 from django.views import View
-from django.shortcuts import render
+from django.shortcuts import render, redirect, get_object_or_404
+
+from gitsap.mixins import ProjectAccessMixin, can_write
+from gitsap.models import Issue, IssueStateChoice, Label, User
 
-from gitsap.mixins import ProjectAccessMixin
+ISSUE_STATES = {"open", "closed", "all"}
+ISSUE_SORTS = {"relevance", "newest"}
 
 
 class IssueListView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "issues"}
+        filters = {
+            "q": request.GET.get("q", "").strip(),
+            "state": request.GET.get("state", "open"),
+            "label": request.GET.get("label", ""),
+            "assignee": request.GET.get("assignee", ""),
+            "sort": request.GET.get("sort", ""),
+        }
+        if filters["state"] not in ISSUE_STATES:
+            filters["state"] = "open"
+        if filters["sort"] not in ISSUE_SORTS:
+            filters["sort"] = ""
+        try:
+            after = int(request.GET["after"])
+        except (KeyError, ValueError):
+            after = None
+
+        label = assignee = None
+        if filters["label"]:
+            label = Label.objects.filter(
+                project=request.project, name=filters["label"]
+            ).first()
+        if filters["assignee"]:
+            assignee = User.objects.filter(username=filters["assignee"]).first()
+
+        issues, has_next = [], False
+        # An unknown label or assignee has no issues
+        if (label or not filters["label"]) and (assignee or not filters["assignee"]):
+            issues, has_next = Issue.search_page(
+                request.project,
+                text=filters["q"],
+                state=None if filters["state"] == "all" else filters["state"],
+                label=label,
+                assignee=assignee,
+                sort=filters["sort"] or None,
+                after=after,
+                limit=settings.ISSUE_PAGE_SIZE,
+            )
+
+        next_query = None
+        if has_next:
+            query = {key: value for key, value in filters.items() if value}
+            next_query = urlencode({**query, "after": issues[-1].number})
+
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "issues",
+            "issues": issues,
+            "filters": filters,
+            "labels": request.project.labels.order_by("name"),
+            "next_query": next_query,
+        }
         return render(request, "issues/issue_list.html", context)
 
 
 class IssueDetailView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "issues"}
+        issue = get_object_or_404(
+            Issue.objects.select_related("author", "assignee"),
+            project=request.project,
+            pk=kwargs["issue_id"],
+        )
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "issues",
+            "issue": issue,
+            "labels": issue.get_labels(),
+            "can_close": can_write(request) or issue.author_id == request.user.pk,
+        }
         return render(request, "issues/issue_detail.html", context)
 
+    def post(self, request, **kwargs):
+        issue = get_object_or_404(
+            Issue, project=request.project, pk=kwargs["issue_id"]
+        )
+        if not (can_write(request) or issue.author_id == request.user.pk):
+            return HttpResponseForbidden()
+
+        action = request.POST.get("action")
+        if action == "close" and issue.is_open:
+            issue.set_state(IssueStateChoice.CLOSED)
+        elif action == "reopen" and not issue.is_open:
+            issue.set_state(IssueStateChoice.OPEN)
+        return redirect(
+            "issue_detail", namespace=kwargs["namespace"], issue_id=issue.pk
+        )
+
 
 class IssueCreateView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "issues"}
+    def render_form(self, request, namespace, values=None, error=None):
+        context = {
+            "namespace": namespace,
+            "current_page": "issues",
+            "values": values or {},
+            "can_triage": can_write(request),
+            "error": error,
+        }
         return render(request, "issues/issue_create.html", context)
+
+    def get(self, request, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden()
+        return self.render_form(request, kwargs["namespace"])
+
+    def post(self, request, **kwargs):
+        if not request.user.is_authenticated:
+            return HttpResponseForbidden()
+
+        values = {
+            "title": request.POST.get("title", "").strip(),
+            "description": request.POST.get("description", "").strip(),
+            "labels": request.POST.get("labels", "").strip(),
+            "assignee": request.POST.get("assignee", "").strip(),
+        }
+        if not values["title"]:
+            return self.render_form(
+                request, kwargs["namespace"], values, error="Enter a title."
+            )
+        if len(values["title"]) > Issue._meta.get_field("title").max_length:
+            return self.render_form(
+                request, kwargs["namespace"], values, error="The title is too long."
+            )
+
+        # Only triagers label and assign, anyone with access can report
+        assignee, names = None, []
+        if can_write(request):
+            if values["assignee"]:
+                assignee = User.objects.filter(username=values["assignee"]).first()
+                if assignee is None:
+                    return self.render_form(
+                        request, kwargs["namespace"], values, error="No such user."
+                    )
+            names = sorted(
+                {
+                    name.strip()[: Label._meta.get_field("name").max_length]
+                    for name in values["labels"].split(",")
+                    if name.strip()
+                }
+            )
+
+        with transaction.atomic():
+            issue = Issue.create(
+                project=request.project,
+                author=request.user,
+                title=values["title"],
+                description=values["description"],
+                assignee=assignee,
+            )
+            if names:
+                issue.set_labels(
+                    [
+                        Label.objects.get_or_create(
+                            project=request.project, name=name
+                        )[0]
+                        for name in names
+                    ]
+                )
+        return redirect(
+            "issue_detail", namespace=kwargs["namespace"], issue_id=issue.pk
+        )
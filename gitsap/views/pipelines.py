@@ -1,22 +1,224 @@
+import json
+import re
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
 from django.views import View
-from django.shortcuts import render
+from django.shortcuts import render, redirect, get_object_or_404
+
+from gitsap.git.executor import run_git
+from gitsap.mixins import AsyncProjectAccessMixin, ProjectAccessMixin, can_write
+from gitsap.models import Job, Pipeline
+from gitsap.pipelines import logs, scheduler
+from gitsap.tasks import dispatch_pipeline_jobs
 
-from gitsap.mixins import ProjectAccessMixin
+# Milliseconds browsers wait before reconnecting to a log stream
+LOG_RETRY = 2000
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
 
 
 class PipelineListView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "pipelines"}
+        pipelines = request.project.pipelines.select_related("triggered_by").order_by(
+            "-created_at"
+        )
+        page = Paginator(pipelines, settings.PIPELINE_PAGE_SIZE).get_page(
+            request.GET.get("page")
+        )
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "pipelines",
+            "page": page,
+            "can_run": can_write(request),
+        }
         return render(request, "pipelines/pipeline_list.html", context)
 
 
 class PipelineDetailView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "pipelines"}
+        pipeline = get_object_or_404(
+            Pipeline.objects.select_related("triggered_by"),
+            project=request.project,
+            pk=kwargs["pipeline_id"],
+        )
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "pipelines",
+            "pipeline": pipeline,
+            "jobs": pipeline.jobs.order_by("-priority", "name"),
+            "can_run": can_write(request),
+        }
         return render(request, "pipelines/pipeline_detail.html", context)
 
+    def post(self, request, **kwargs):
+        if not can_write(request):
+            return HttpResponseForbidden()
+        pipeline = get_object_or_404(
+            Pipeline, project=request.project, pk=kwargs["pipeline_id"]
+        )
+        if request.POST.get("action") == "cancel":
+            scheduler.cancel(pipeline)
+            # Cancelled jobs free their slots
+            transaction.on_commit(dispatch_pipeline_jobs.delay)
+        return redirect(
+            "pipeline_detail", namespace=kwargs["namespace"], pipeline_id=pipeline.pk
+        )
+
 
 class PipelineCreateView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "pipelines"}
+    def render_form(self, request, namespace, branch, error=None):
+        repository = request.project.repository
+        branches = []
+        if repository.is_provisioned:
+            branches = sorted(repository.refs["branches"])
+        context = {
+            "namespace": namespace,
+            "current_page": "pipelines",
+            "branches": branches,
+            "branch": branch,
+            "error": error,
+        }
         return render(request, "pipelines/pipeline_create.html", context)
+
+    def get(self, request, **kwargs):
+        if not can_write(request):
+            return HttpResponseForbidden()
+        branch = request.GET.get("branch") or request.project.default_git_branch
+        return self.render_form(request, kwargs["namespace"], branch)
+
+    def post(self, request, **kwargs):
+        if not can_write(request):
+            return HttpResponseForbidden()
+        repository = request.project.repository
+        branch = request.POST.get("branch", "")
+        tip = None
+        if repository.is_provisioned:
+            tip = repository.refs["branches"].get(branch)
+        if tip is None:
+            return self.render_form(
+                request, kwargs["namespace"], branch, error="No such branch."
+            )
+
+        with repository.open() as repo:
+            pipeline = scheduler.create_pipeline(
+                request.project, repo, branch, tip, triggered_by=request.user
+            )
+        transaction.on_commit(dispatch_pipeline_jobs.delay)
+        return redirect(
+            "pipeline_detail", namespace=kwargs["namespace"], pipeline_id=pipeline.pk
+        )
+
+
+async def _get_job(request, kwargs):
+    job = await Job.objects.filter(
+        pipeline__project=request.project,
+        pipeline_id=kwargs["pipeline_id"],
+        pk=kwargs["job_id"],
+    ).afirst()
+    if job is None:
+        raise Http404("No such job.")
+    return job
+
+
+def _utf8_boundary(data):
+    """Length of the longest prefix of data not ending inside a character."""
+    for back in range(1, min(4, len(data) + 1)):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte >= 0xF0:
+            length = 4
+        elif byte >= 0xE0:
+            length = 3
+        elif byte >= 0xC0:
+            length = 2
+        else:
+            length = 1
+        return len(data) - back if back < length else len(data)
+    return len(data)
+
+
+async def _log_events(job_id, offset):
+    # Event IDs are byte offsets, browsers resume from the last one seen
+    yield f"retry: {LOG_RETRY}\n\n"
+    partial = b""
+    async for kind, end, value in logs.follow(job_id, offset):
+        if kind == "data":
+            data = partial + value
+            boundary = _utf8_boundary(data)
+            partial = data[boundary:]
+            if boundary:
+                text = json.dumps(data[:boundary].decode("utf-8", "replace"))
+                yield f"id: {end - len(partial)}\ndata: {text}\n\n"
+        elif kind == "keepalive":
+            yield ": keepalive\n\n"
+        else:
+            yield f"id: {end}\nevent: end\ndata: {json.dumps(value)}\n\n"
+
+
+class PipelineJobLogView(AsyncProjectAccessMixin, View):
+    """
+    The output of a job as server-sent events: JSON strings of text as it
+    is written, then an "end" event with the final status. Resumes from
+    the byte offset in Last-Event-ID or ?offset.
+    """
+
+    async def get(self, request, **kwargs):
+        job = await _get_job(request, kwargs)
+        offset = request.headers.get("Last-Event-ID") or request.GET.get("offset")
+        try:
+            offset = max(int(offset or 0), 0)
+        except ValueError:
+            offset = 0
+
+        response = StreamingHttpResponse(
+            _log_events(job.pk, offset), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Proxies must not buffer the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class PipelineJobRawLogView(AsyncProjectAccessMixin, View):
+    """The stored output of a finished job as text, honouring a byte Range."""
+
+    async def get(self, request, **kwargs):
+        job = await _get_job(request, kwargs)
+        try:
+            log = await run_git(logs.CompactedLog(job.pk).open)
+        except OSError:
+            raise Http404("No log stored for this job.")
+
+        start, end = 0, log.size
+        status = 200
+        # A single range; any other is ignored, which is allowed
+        match = RANGE_RE.fullmatch(request.headers.get("Range", ""))
+        if match and any(match.groups()):
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last) + 1, log.size) if last else log.size
+            else:
+                start = max(log.size - int(last), 0)
+            if start >= end:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{log.size}"
+                return response
+            status = 206
+
+        response = StreamingHttpResponse(log.aiter_range(start, end), status=status)
+        if status == 206:
+            response["Content-Range"] = f"bytes {start}-{end - 1}/{log.size}"
+        response["Content-Length"] = str(end - start)
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Type"] = "text/plain; charset=utf-8"
+        response["X-Content-Type-Options"] = "nosniff"
+        return response
@@ -1,29 +1,634 @@
+import abc
+import hashlib
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import AsyncPaginator
+from django.core.validators import URLValidator
+from django.db.models import F
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.views import View
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+
+from gitsap.git.archives import FORMATS, ArchiveCache, ArchiveFile, split_format
+from gitsap.git.blame import BlameCache
+from gitsap.git.executor import run_git
+from gitsap.git.objects import split_rev, lookup, list_tree, BlobReader
+from gitsap.git.search import SearchIndex, QueryTooBroad
+from gitsap.git.tree_commits import TreeCommits
+from gitsap.mixins import AsyncProjectAccessMixin, can_manage
+from gitsap.models import (
+    GitCommit,
+    GitRef,
+    GitRefTypeChoice,
+    ProjectVisibilityChoice,
+    ProtectionRule,
+    Webhook,
+    WebhookDelivery,
+)
+from gitsap.tasks import compute_blame, compute_tree_commits, update_search_index
+from gitsap.webhooks.delivery import is_public_address
+
+# Pages addressed by object ID never change
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+# Ref names and globs of protection rules: no leading, trailing or double
+# slashes, nor anything git refuses in a ref name
+PROTECTION_PATTERN_RE = re.compile(r"^(?!/)(?!.*//)(?!.*/$)[^\s~^:\\\[]+$")
+
+
+def _page_etag(request, oid, path):
+    # Pages also show who is signed in, so the user is part of the tag
+    user_id = request.user.pk if request.user.is_authenticated else ""
+    return quote_etag(hashlib.sha1(f"{oid}:{path}:{user_id}".encode()).hexdigest())
+
+
+def _breadcrumbs(path):
+    parts = path.split("/") if path else []
+    return [
+        {"name": name, "path": "/".join(parts[: i + 1])} for i, name in enumerate(parts)
+    ]
+
+
+def _commit_summary(commit):
+    return {
+        "oid": str(commit.id),
+        "message": commit.message,
+        "short_id": commit.short_id,
+    }
+
+
+def _read_tree(repository, oid, path):
+    """
+    Runs on the git executor. Returns ("tree", data) for a tree, ("blob",
+    None) when path is a file, and (None, None) when it does not exist. Only
+    plain values leave the pooled handle.
+    """
+    with repository.open() as repo:
+        commit, obj = lookup(repo, oid, path)
+        if obj is None:
+            return None, None
+        if obj.type_str == "blob":
+            return "blob", None
+        return "tree", {
+            "commit": _commit_summary(commit),
+            "entries": list_tree(obj, path),
+        }
+
+
+def _load_tree_commits(repository, commit_oid, path):
+    """
+    Runs on the git executor. The last commits of the entries of the
+    directory path, or None while its history is walked in the background;
+    the first caller to miss schedules that walk.
+    """
+    with repository.open() as repo:
+        tree_commits = TreeCommits(repo, commit_oid, path)
+        result = tree_commits.get()
+    if result is None and tree_commits.cache.claim(commit_oid):
+        compute_tree_commits.delay(repository.pk, commit_oid, path)
+        result = tree_commits.cache.get(commit_oid)
+    return result
+
+
+def _with_last_commits(entries, result):
+    for entry in entries:
+        entry["last_commit"] = None
+        index = result["entries"].get(entry["name"]) if result else None
+        if index is not None:
+            commit = dict(result["commits"][index])
+            commit["date"] = datetime.fromtimestamp(commit["time"], timezone.utc)
+            entry["last_commit"] = commit
+    return entries
+
+
+def _read_blob(repository, oid, path):
+    """Runs on the git executor, the blob counterpart of _read_tree."""
+    with repository.open() as repo:
+        commit, obj = lookup(repo, oid, path)
+        if obj is None:
+            return None, None
+        if obj.type_str == "tree":
+            return "tree", None
+
+        # Large and binary files are only offered as raw downloads
+        content = None
+        if obj.size <= settings.GIT_BLOB_DISPLAY_MAX_SIZE and not obj.is_binary:
+            content = obj.data.decode("utf-8", "replace")
+
+        return "blob", {
+            "commit": _commit_summary(commit),
+            "blob": {"size": obj.size, "is_binary": obj.is_binary},
+            "content": content,
+        }
+
+
+def _load_blame(repository, commit_oid, path):
+    """
+    Returns (result, complete). While the blame is computed in the background
+    result is the partial one, or None before the first run stored it; the
+    first caller to miss schedules that computation.
+    """
+    blame = BlameCache(commit_oid, path)
+    result = blame.get()
+    if result is None and blame.claim():
+        compute_blame.delay(repository.pk, commit_oid, path)
+        result = blame.get()
+    if result is not None:
+        return result, True
+
+    partial = blame.get_partial()
+    return (partial["result"] if partial else None), False
+
+
+def _blame_groups(content, result):
+    """
+    Splits the lines of content into groups of consecutive lines blamed on
+    the same commit. Lines not blamed yet have no commit.
+    """
+    lines = content.split("\n")
+    if content.endswith("\n"):
+        lines.pop()
+
+    owners = [None] * len(lines)
+    if result is not None:
+        for start, count, commit, _ in result["runs"]:
+            owners[start : start + count] = [commit] * count
+
+    groups = []
+    for number, (line, owner) in enumerate(zip(lines, owners), 1):
+        if not groups or groups[-1]["owner"] != owner:
+            commit = None
+            if owner is not None:
+                commit = dict(result["commits"][owner])
+                commit["date"] = datetime.fromtimestamp(commit["time"], timezone.utc)
+            groups.append({"owner": owner, "commit": commit, "lines": []})
+        groups[-1]["lines"].append((number, line))
+
+    for group in groups:
+        group["numbers"] = "\n".join(str(number) for number, _ in group["lines"])
+        group["text"] = "\n".join(line for _, line in group["lines"])
+    return groups
+
+
+def _search(repository, query, ignore_case):
+    """Runs on the git executor."""
+    with repository.open() as repo:
+        return SearchIndex.for_repository(repository).search(
+            repo, query, ignore_case, limit=settings.GIT_SEARCH_MAX_RESULTS
+        )
+
+
+def _queue_search_indexing(repository):
+    """Indexes a repository pushed to before search existed, once."""
+    key = f"search_index:{repository.pk}"
+    if cache.add(key, 1, timeout=settings.GIT_DIFF_PENDING_TIMEOUT):
+        update_search_index.delay(repository.pk)
+
+
+def _read_raw_header(repository, oid, path):
+    """Runs on the git executor. (blob_oid, size), or None when no file."""
+    with repository.open() as repo:
+        _, obj = lookup(repo, oid, path)
+        if obj is None or obj.type_str != "blob":
+            return None
+
+        # The header read gives the size without inflating the blob
+        _, size = repo.odb.read_header(obj.id)
+        return str(obj.id), size
+
+
+def _read_tree_oid(repository, oid, path):
+    """Runs on the git executor. The OID of the tree at path, or None."""
+    with repository.open() as repo:
+        _, obj = lookup(repo, oid, path)
+        if obj is None or obj.type_str != "tree":
+            return None
+        return str(obj.id)
+
+
+def _read_small_blob(repository, blob_oid):
+    with repository.open() as repo:
+        blob = repo[blob_oid]
+        return blob.data, blob.is_binary
+
+
+class CodeView(AsyncProjectAccessMixin, View, abc.ABC):
+    """
+    Base of the views reading a git object at "<rev>/<path>". A rev naming a
+    branch or tag redirects to the same page addressed by OID, which is then
+    served with a strong ETag and cached as immutable.
+    """
+
+    url_name = None
+
+    def get_repository(self, request):
+        repository = request.project.repository
+        if not repository.is_provisioned or repository.is_empty:
+            raise Http404("This repository is empty.")
+        return repository
+
+    async def get(self, request, namespace, spec):
+        repository = self.get_repository(request)
+
+        refs = await run_git(getattr, repository, "refs")
+        match = split_rev(spec, refs)
+        if match is None:
+            raise Http404("No branch, tag or commit matches the given query.")
+
+        oid, path, is_oid = match
+        path = path.strip("/")
+        if not is_oid:
+            response = redirect(
+                self.url_name,
+                namespace=namespace,
+                spec=f"{oid}/{path}" if path else oid,
+            )
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        response = await self.get_object(request, namespace, repository, oid, path)
+        # Pages that may still change set their own caching
+        if response.status_code in (200, 304) and not response.has_header(
+            "Cache-Control"
+        ):
+            patch_cache_control(
+                response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+            )
+        return response
+
+    @abc.abstractmethod
+    async def get_object(self, request, namespace, repository, oid, path):
+        """Render the page for the object at ``path`` in commit ``oid``."""
+
+
+class TreeView(CodeView):
+    url_name = "tree"
+
+    async def get_object(self, request, namespace, repository, oid, path):
+        # Only pages with every last commit carry the tag
+        etag = _page_etag(request, oid, f"tree:{path}")
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response["ETag"] = etag
+            return response
+
+        kind, data = await run_git(_read_tree, repository, oid, path)
+        if kind is None:
+            raise Http404("No such path.")
+        if kind == "blob":
+            return redirect("blob", namespace=namespace, spec=f"{oid}/{path}")
+
+        result = await run_git(
+            _load_tree_commits, repository, data["commit"]["oid"], path
+        )
+        _with_last_commits(data["entries"], result)
+
+        context = {
+            "namespace": namespace,
+            "current_page": "code",
+            "oid": oid,
+            "path": path,
+            "breadcrumbs": _breadcrumbs(path),
+            "last_commits_pending": result is None,
+            **data,
+        }
+        response = render(request, "projects/repo.html", context)
+
+        if result is not None:
+            response["ETag"] = etag
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class RepoView(TreeView):
+    async def get(self, request, namespace):
+        repository = request.project.repository
+        if not repository.is_provisioned or repository.is_empty:
+            context = {
+                "namespace": namespace,
+                "current_page": "code",
+                "repo_url": request.project.repo_url,
+            }
+            return render(request, "projects/repo.html", context)
+
+        refs = await run_git(getattr, repository, "refs")
+        oid = refs["branches"].get(refs["head"])
+        if oid is None:
+            raise Http404("The default branch does not exist.")
+
+        # The default branch moves, so this page is only revalidated (cheap
+        # through the ETag) instead of cached
+        response = await self.get_object(request, namespace, repository, oid, "")
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
 
-from gitsap.mixins import ProjectAccessMixin
+class BlobView(CodeView):
+    url_name = "blob"
 
+    async def get_object(self, request, namespace, repository, oid, path):
+        etag = _page_etag(request, oid, path)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            kind, data = await run_git(_read_blob, repository, oid, path)
+            if kind is None:
+                raise Http404("No such path.")
+            if kind == "tree":
+                return redirect("tree", namespace=namespace, spec=f"{oid}/{path}")
 
-class RepoView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "code"}
-        return render(request, "projects/repo.html", context)
+            context = {
+                "namespace": namespace,
+                "current_page": "code",
+                "oid": oid,
+                "path": path,
+                "breadcrumbs": _breadcrumbs(path),
+                **data,
+            }
+            response = render(request, "projects/blob.html", context)
 
+        response["ETag"] = etag
+        return response
 
-class CommitsView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "commits"}
+
+class BlameView(CodeView):
+    url_name = "blame"
+
+    async def get_object(self, request, namespace, repository, oid, path):
+        # Only complete blames carry the tag
+        etag = _page_etag(request, oid, f"blame:{path}")
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response["ETag"] = etag
+            return response
+
+        kind, data = await run_git(_read_blob, repository, oid, path)
+        if kind is None:
+            raise Http404("No such path.")
+        if kind == "tree":
+            return redirect("tree", namespace=namespace, spec=f"{oid}/{path}")
+
+        result, complete = None, True
+        if data["content"] is not None:
+            result, complete = await sync_to_async(_load_blame)(
+                repository, data["commit"]["oid"], path
+            )
+
+        context = {
+            "namespace": namespace,
+            "current_page": "code",
+            "oid": oid,
+            "path": path,
+            "breadcrumbs": _breadcrumbs(path),
+            "complete": complete,
+            **data,
+        }
+        if data["content"] is not None:
+            context["groups"] = _blame_groups(data["content"], result)
+        response = render(request, "projects/blame.html", context)
+
+        if complete:
+            response["ETag"] = etag
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class RawView(CodeView):
+    url_name = "raw"
+
+    async def get_object(self, request, namespace, repository, oid, path):
+        header = await run_git(_read_raw_header, repository, oid, path)
+        if header is None:
+            raise Http404("No such file.")
+        blob_oid, size = header
+
+        # The blob OID is the content, identical files share one tag
+        etag = quote_etag(blob_oid)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if size <= settings.GIT_HTTP_CHUNK_SIZE:
+                data, is_binary = await run_git(_read_small_blob, repository, blob_oid)
+                response = HttpResponse(data)
+            else:
+                reader = await run_git(
+                    BlobReader,
+                    repository.repo_path,
+                    blob_oid,
+                    settings.GIT_HTTP_CHUNK_SIZE,
+                )
+                is_binary = reader.is_binary
+                # Django closes the reader, returning its handle, once done
+                response = StreamingHttpResponse(reader)
+            response["Content-Length"] = str(size)
+
+            # Never render repository content as HTML on this origin
+            if is_binary:
+                response["Content-Type"] = "application/octet-stream"
+                response["Content-Disposition"] = "attachment"
+            else:
+                response["Content-Type"] = "text/plain; charset=utf-8"
+            response["X-Content-Type-Options"] = "nosniff"
+
+        response["ETag"] = etag
+        return response
+
+    async def get(self, request, namespace, spec):
+        response = await super().get(request, namespace, spec)
+        # Raw files do not depend on the user, public ones may sit in shared caches
+        if (
+            response.status_code in (200, 304)
+            and request.project.visibility == ProjectVisibilityChoice.PUBLIC
+        ):
+            del response["Cache-Control"]
+            patch_cache_control(
+                response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+            )
+        return response
+
+
+class ArchiveView(AsyncProjectAccessMixin, View):
+    """
+    A tar.gz or zip of the tree at "<rev>/<path>.<format>". The archive of a
+    tree is generated once and cached, and served to every request for the
+    same tree, whatever rev names it.
+    """
+
+    async def get(self, request, namespace, spec):
+        match = split_format(spec)
+        repository = request.project.repository
+        if match is None or not repository.is_provisioned or repository.is_empty:
+            raise Http404("No such archive.")
+        rev, archive_format = match
+
+        refs = await run_git(getattr, repository, "refs")
+        match = split_rev(rev, refs)
+        if match is None:
+            raise Http404("No branch, tag or commit matches the given query.")
+        oid, path, is_oid = match
+        path = path.strip("/")
+
+        tree_oid = await run_git(_read_tree_oid, repository, oid, path)
+        if tree_oid is None:
+            raise Http404("No such directory.")
+
+        # The top level directory is the project name, the file name also
+        # says which rev and directory it holds
+        prefix = namespace.rsplit("/", 1)[-1]
+        label = rev
+        if is_oid:
+            label = f"{oid[:12]}/{path}" if path else oid[:12]
+        filename = f"{prefix}-{label.strip('/').replace('/', '-')}.{archive_format}"
+
+        # Regenerated archives carry new timestamps, hence a weak tag
+        etag = f"W/{quote_etag(f'{tree_oid}.{archive_format}.{prefix}')}"
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            kind, value = await run_git(
+                ArchiveCache().open,
+                repository.repo_path,
+                tree_oid,
+                archive_format,
+                prefix,
+            )
+            if kind == "stream":
+                # Django closes the follower once done
+                response = StreamingHttpResponse(value)
+            elif settings.GIT_ARCHIVE_SENDFILE_HEADER:
+                response = HttpResponse()
+                location = value
+                if settings.GIT_ARCHIVE_SENDFILE_PREFIX:
+                    location = settings.GIT_ARCHIVE_SENDFILE_PREFIX + os.path.relpath(
+                        value, settings.GIT_ARCHIVE_CACHE_DIR
+                    )
+                response[settings.GIT_ARCHIVE_SENDFILE_HEADER] = location
+            else:
+                # Django closes the file once done
+                archive = await run_git(ArchiveFile, value)
+                response = StreamingHttpResponse(archive)
+                response["Content-Length"] = archive.size
+            response["Content-Type"] = FORMATS[archive_format]
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+        response["ETag"] = etag
+        if not is_oid:
+            # Branches and tags move, revalidate (cheap through the tag)
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            # Archives do not depend on the user, like raw files
+            visibility = {"private": True}
+            if request.project.visibility == ProjectVisibilityChoice.PUBLIC:
+                visibility = {"public": True}
+            patch_cache_control(
+                response, max_age=IMMUTABLE_MAX_AGE, immutable=True, **visibility
+            )
+        return response
+
+
+class SearchView(AsyncProjectAccessMixin, View):
+    async def get(self, request, namespace):
+        query = request.GET.get("q", "")
+        ignore_case = request.GET.get("i") == "1"
+        context = {
+            "namespace": namespace,
+            "current_page": "search",
+            "query": query,
+            "ignore_case": ignore_case,
+        }
+
+        repository = request.project.repository
+        if query and repository.is_provisioned and not repository.is_empty:
+            try:
+                results = await run_git(_search, repository, query, ignore_case)
+            except re.error as error:
+                context["error"] = f"Invalid regular expression: {error}"
+            except QueryTooBroad:
+                context["error"] = (
+                    "Search for at least three characters in a row, this "
+                    "pattern would have to read every file."
+                )
+            else:
+                if results is None:
+                    await sync_to_async(_queue_search_indexing)(repository)
+                    context["indexing"] = True
+                else:
+                    refs = await run_git(getattr, repository, "refs")
+                    tip = refs["branches"].get(request.project.default_git_branch)
+                    context["results"] = results
+                    context["behind"] = tip is not None and tip != results["commit"]
+
+        return render(request, "projects/search.html", context)
+
+
+class CommitsView(AsyncProjectAccessMixin, View):
+    async def get(self, request, **kwargs):
+        commits, has_next = await GitCommit.ahistory_page(
+            request.project,
+            after=request.GET.get("after"),
+            limit=settings.GIT_COMMIT_PAGE_SIZE,
+        )
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "commits",
+            "commits": commits,
+            "next_cursor": commits[-1].sha if has_next else None,
+        }
         return render(request, "projects/commits.html", context)
 
 
-class BranchesView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {"namespace": kwargs["namespace"], "current_page": "branches"}
+class BranchesView(AsyncProjectAccessMixin, View):
+    async def get(self, request, **kwargs):
+        query = request.GET.get("q", "").strip()
+        sort = request.GET.get("sort", "name")
+
+        branches = GitRef.objects.filter(
+            project=request.project, ref_type=GitRefTypeChoice.BRANCH
+        )
+        if query:
+            branches = branches.filter(short_name__startswith=query)
+
+        if sort == "updated":
+            branches = branches.order_by(F("target_committed_at").desc(nulls_last=True))
+        else:
+            branches = branches.order_by("short_name")
+
+        page = await AsyncPaginator(branches, settings.GIT_REF_PAGE_SIZE).aget_page(
+            request.GET.get("page")
+        )
+        # Templates cannot await, so the page is read here
+        context = {
+            "namespace": kwargs["namespace"],
+            "current_page": "branches",
+            "query": query,
+            "sort": sort,
+            "branches": await page.aget_object_list(),
+            "previous_page": (
+                await page.aprevious_page_number()
+                if await page.ahas_previous()
+                else None
+            ),
+            "next_page": (
+                await page.anext_page_number() if await page.ahas_next() else None
+            ),
+        }
         return render(request, "projects/branches.html", context)
 
 
-class SettingsGeneralView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
+class SettingsGeneralView(AsyncProjectAccessMixin, View):
+    async def get(self, request, **kwargs):
         context = {
             "namespace": kwargs["namespace"],
             "current_page": "settings",
@@ -32,8 +637,8 @@ class SettingsGeneralView(ProjectAccessMixin, View):
         return render(request, "projects/settings/general.html", context)
 
 
-class SettingsCollaboratorsView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
+class SettingsCollaboratorsView(AsyncProjectAccessMixin, View):
+    async def get(self, request, **kwargs):
         context = {
             "namespace": kwargs["namespace"],
             "current_page": "settings",
@@ -42,41 +647,155 @@ class SettingsCollaboratorsView(ProjectAccessMixin, View):
         return render(request, "projects/settings/collaborators.html", context)
 
 
-class SettingsBranchesView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
+class SettingsEnvironmentsView(AsyncProjectAccessMixin, View):
+    async def get(self, request, **kwargs):
         context = {
             "namespace": kwargs["namespace"],
             "current_page": "settings",
-            "current_settings_page": "branches",
+            "current_settings_page": "environments",
         }
-        return render(request, "projects/settings/branches.html", context)
+        return render(request, "projects/settings/environments.html", context)
 
 
-class SettingsRulesView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
-        context = {
-            "namespace": kwargs["namespace"],
-            "current_page": "settings",
-            "current_settings_page": "rules",
-        }
-        return render(request, "projects/settings/rules.html", context)
+class ProtectionRulesView(AsyncProjectAccessMixin, View):
+    """Lists, adds and deletes the protection rules of one ref type."""
 
+    ref_type = None
+    settings_page = None
 
-class SettingsEnvironmentsView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
+    async def render_page(self, request, namespace, error=None):
+        rules = ProtectionRule.objects.filter(
+            project=request.project, ref_type=self.ref_type
+        ).order_by("pattern")
         context = {
-            "namespace": kwargs["namespace"],
+            "namespace": namespace,
             "current_page": "settings",
-            "current_settings_page": "environments",
+            "current_settings_page": self.settings_page,
+            "rules": [rule async for rule in rules],
+            "error": error,
         }
-        return render(request, "projects/settings/environments.html", context)
+        return render(request, f"projects/settings/{self.settings_page}.html", context)
+
+    async def get(self, request, **kwargs):
+        if not can_manage(request):
+            return HttpResponseForbidden()
+        return await self.render_page(request, kwargs["namespace"])
+
+    async def post(self, request, **kwargs):
+        if not can_manage(request):
+            return HttpResponseForbidden()
+
+        action = request.POST.get("action")
+        if action == "create":
+            pattern = request.POST.get("pattern", "").strip()
+            max_length = ProtectionRule._meta.get_field("pattern").max_length
+            if len(pattern) > max_length or not PROTECTION_PATTERN_RE.match(pattern):
+                return await self.render_page(
+                    request, kwargs["namespace"], error="Enter a ref name or glob."
+                )
+            await ProtectionRule.objects.aupdate_or_create(
+                project=request.project,
+                ref_type=self.ref_type,
+                pattern=pattern,
+                defaults={
+                    field: field in request.POST
+                    for field in (
+                        "restrict_pushes",
+                        "allow_force_pushes",
+                        "allow_deletions",
+                        "require_linear_history",
+                    )
+                },
+            )
+        elif action == "delete":
+            # Deleted one by one, so the signal handlers see each rule
+            async for rule in ProtectionRule.objects.filter(
+                project=request.project, pk=request.POST.get("rule_id")
+            ):
+                await rule.adelete()
+        return redirect(f"settings_{self.settings_page}", namespace=kwargs["namespace"])
+
+
+class SettingsBranchesView(ProtectionRulesView):
+    ref_type = GitRefTypeChoice.BRANCH
+    settings_page = "branches"
+
 
+class SettingsRulesView(ProtectionRulesView):
+    ref_type = GitRefTypeChoice.TAG
+    settings_page = "rules"
 
-class SettingsWebhooksView(ProjectAccessMixin, View):
-    def get(self, request, **kwargs):
+
+def _is_local_url(url):
+    # Only catches addresses spelled out: delivery checks what names
+    # resolve to, as they can change
+    host = urlsplit(url).hostname or ""
+    try:
+        return not is_public_address(host)
+    except ValueError:
+        return host == "localhost" or host.endswith(".localhost")
+
+
+class SettingsWebhooksView(AsyncProjectAccessMixin, View):
+    async def render_page(self, request, namespace, error=None):
+        deliveries = (
+            WebhookDelivery.objects.filter(webhook__project=request.project)
+            .select_related("webhook", "payload")
+            .defer("payload__body")
+            .order_by("-created_at")[: settings.WEBHOOK_DELIVERY_PAGE_SIZE]
+        )
         context = {
-            "namespace": kwargs["namespace"],
+            "namespace": namespace,
             "current_page": "settings",
             "current_settings_page": "webhooks",
+            "webhooks": [
+                webhook
+                async for webhook in request.project.webhooks.order_by("created_at")
+            ],
+            "deliveries": [delivery async for delivery in deliveries],
+            "error": error,
         }
         return render(request, "projects/settings/webhooks.html", context)
+
+    async def get(self, request, **kwargs):
+        if not can_manage(request):
+            return HttpResponseForbidden()
+        return await self.render_page(request, kwargs["namespace"])
+
+    async def post(self, request, **kwargs):
+        if not can_manage(request):
+            return HttpResponseForbidden()
+
+        action = request.POST.get("action")
+        if action == "create":
+            url = request.POST.get("url", "").strip()
+            try:
+                URLValidator(schemes=["http", "https"])(url)
+            except ValidationError:
+                return await self.render_page(
+                    request, kwargs["namespace"], error="Enter an http(s) URL."
+                )
+            if not settings.WEBHOOK_ALLOW_LOCAL_NETWORKS and _is_local_url(url):
+                return await self.render_page(
+                    request,
+                    kwargs["namespace"],
+                    error="Enter a URL outside local networks.",
+                )
+            await Webhook.objects.acreate(
+                project=request.project,
+                url=url,
+                secret=request.POST.get("secret", "").strip(),
+            )
+        else:
+            webhooks = Webhook.objects.filter(
+                project=request.project, pk=request.POST.get("webhook_id")
+            )
+            if action == "delete":
+                await webhooks.adelete()
+            elif action == "toggle":
+                await webhooks.aupdate(
+                    is_active=~F("is_active"),
+                    consecutive_failures=0,
+                    circuit_open_until=None,
+                )
+        return redirect("settings_webhooks", namespace=kwargs["namespace"])
@@ -1,7 +1,75 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
 from django.views import View
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
+from gitsap.git.diffs import DiffCache, normalize_options
+from gitsap.git.objects import OID_RE
 from gitsap.mixins import ProjectAccessMixin
+from gitsap.models import PullRequest
+from gitsap.tasks import compute_pull_request_diff, check_pull_request_merges
+
+# A diff file addressed by its two commits never changes
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def _diff_options(request):
+    return normalize_options(request.GET.get("context"), request.GET.get("w") == "1")
+
+
+def _load_diff(repository, base_oid, head_oid, options):
+    """
+    Returns (diff, manifest). manifest is None while the diff is computed in
+    the background; the first caller to miss schedules that computation.
+    """
+    diff = DiffCache(base_oid, head_oid, options)
+    manifest = diff.get_manifest()
+    if manifest is None and diff.claim():
+        compute_pull_request_diff.delay(repository.pk, base_oid, head_oid, options)
+        manifest = diff.get_manifest()
+    return diff, manifest
+
+
+def _pull_request_diff(request, pr_id):
+    pull_request = get_object_or_404(PullRequest, project=request.project, pk=pr_id)
+    repository = request.project.repository
+
+    base_oid = head_oid = manifest = None
+    options = _diff_options(request)
+    if repository.is_provisioned:
+        base_oid, head_oid = pull_request.tips(repository.refs)
+    if base_oid and head_oid:
+        _, manifest = _load_diff(repository, base_oid, head_oid, options)
+
+    return {
+        "pull_request": pull_request,
+        "base_oid": base_oid,
+        "head_oid": head_oid,
+        "options": options,
+        "manifest": manifest,
+    }
+
+
+def _merge_checking(repository, pull_request, base_oid, head_oid):
+    """
+    True while the merge check of pull_request is behind its current tips.
+    The first caller to notice schedules the check.
+    """
+    if not (base_oid and head_oid):
+        return False
+    if pull_request.merge_checked_for(base_oid, head_oid):
+        return False
+
+    key = f"merge_check:{pull_request.pk}:{base_oid}:{head_oid}"
+    if cache.add(key, 1, timeout=settings.GIT_DIFF_PENDING_TIMEOUT):
+        check_pull_request_merges.delay(repository.pk, [pull_request.source_branch])
+        pull_request.refresh_from_db(fields=PullRequest.MERGE_CHECK_FIELDS)
+    return not pull_request.merge_checked_for(base_oid, head_oid)
 
 
 class PullRequestListView(ProjectAccessMixin, View):
@@ -13,9 +81,68 @@ class PullRequestListView(ProjectAccessMixin, View):
 class PullRequestDetailView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
         context = {"namespace": kwargs["namespace"], "current_page": "pull_requests"}
+        context.update(_pull_request_diff(request, kwargs["pr_id"]))
         return render(request, "pull_requests/pull_request_detail.html", context)
 
 
+class PullRequestFileView(ProjectAccessMixin, View):
+    """
+    Hunks of one file of a pull request diff. Addressed by the two commit
+    OIDs, so the response is immutable; 202 while the diff is computed.
+    """
+
+    def get(self, request, **kwargs):
+        pull_request = get_object_or_404(
+            PullRequest, project=request.project, pk=kwargs["pr_id"]
+        )
+        base_oid = request.GET.get("base", "")
+        head_oid = request.GET.get("head", "")
+        if not (OID_RE.match(base_oid) and OID_RE.match(head_oid)):
+            raise Http404("No such diff.")
+
+        diff = DiffCache(base_oid, head_oid, _diff_options(request))
+        index = kwargs["index"]
+
+        etag = quote_etag(hashlib.sha1(f"{diff.key}:{index}".encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            # The diff cache is shared by all projects, only serve diffs
+            # between commits of this one
+            repository = request.project.repository
+            with repository.open() as repo:
+                if not (repo.odb.exists(base_oid) and repo.odb.exists(head_oid)):
+                    raise Http404("No such diff.")
+
+            hunks = diff.get_file(index)
+            if hunks is None:
+                _, manifest = _load_diff(repository, base_oid, head_oid, diff.options)
+                if manifest is not None and index >= len(manifest["files"]):
+                    raise Http404("No such file.")
+                hunks = diff.get_file(index)
+                if hunks is None and manifest is not None and diff.claim():
+                    # The file was evicted while its manifest was not, store
+                    # the diff again or the page would poll forever
+                    compute_pull_request_diff.delay(
+                        repository.pk, base_oid, head_oid, diff.options
+                    )
+                    hunks = diff.get_file(index)
+
+            if hunks is None:
+                response = HttpResponse(status=202)
+                response["Retry-After"] = "1"
+                patch_cache_control(response, no_store=True)
+                return response
+
+            context = {"pull_request": pull_request, "hunks": hunks}
+            response = render(request, "pull_requests/partials/diff_file.html", context)
+
+        response["ETag"] = etag
+        patch_cache_control(
+            response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+        return response
+
+
 class PullRequestCreateView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
         context = {"namespace": kwargs["namespace"], "current_page": "pull_requests"}
@@ -25,4 +152,11 @@ class PullRequestCreateView(ProjectAccessMixin, View):
 class PullRequestConfirmView(ProjectAccessMixin, View):
     def get(self, request, **kwargs):
         context = {"namespace": kwargs["namespace"], "current_page": "pull_requests"}
+        context.update(_pull_request_diff(request, kwargs["pr_id"]))
+        context["merge_checking"] = _merge_checking(
+            request.project.repository,
+            context["pull_request"],
+            context["base_oid"],
+            context["head_oid"],
+        )
         return render(request, "pull_requests/pull_request_confirm.html", context)
@@ -0,0 +1,500 @@
+"""
+Webhook delivery.
+
+A Deliverer runs for up to WEBHOOK_DRAIN_TIME seconds: it claims due
+deliveries from the database, posts them with httpx and records how they
+went, claiming more every CLAIM_INTERVAL seconds while it holds fewer than
+WEBHOOK_MAX_CLAIMED. Any number of them can run, on any number of hosts:
+
+- claims are serialized by a Postgres advisory lock and leased; the
+  deliveries of a lost worker are due again once their lease is past;
+- the deliveries of a webhook are claimed WEBHOOK_ENDPOINT_BATCH_SIZE at
+  most at a time, by one Deliverer at a time, which sends at most
+  WEBHOOK_ENDPOINT_CONCURRENCY requests to it at once;
+- claims take one delivery of each webhook in turn, so a receiver with a
+  backlog of thousands, or a slow one, only ever ties up its own batch
+  while the others keep being served;
+- a failed delivery is retried after an exponential backoff with jitter,
+  or later if the receiver says so with Retry-After, up to
+  WEBHOOK_MAX_ATTEMPTS attempts;
+- WEBHOOK_CIRCUIT_THRESHOLD failures in a row open the circuit of a
+  webhook: its deliveries, the ones already claimed included, wait
+  WEBHOOK_CIRCUIT_COOLDOWN seconds without using up attempts, then a
+  single one probes it, which closes the circuit on success and opens it
+  again on failure.
+
+Connections are pooled per destination host, one httpx.AsyncClient each,
+and the body of a payload is read once whatever the number of webhooks it
+goes to.
+
+Unless WEBHOOK_ALLOW_LOCAL_NETWORKS is set, the host of a webhook is
+resolved before each attempt and the attempt fails when any of its
+addresses is not a public one, e.g. loopback, private or link-local; the
+request then connects to the address checked, so the host cannot resolve
+to another one in between.
+"""
+
+import asyncio
+import functools
+import hashlib
+import hmac
+import ipaddress
+import math
+import random
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import httpx
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from gitsap.models import (
+    Webhook,
+    WebhookDelivery,
+    WebhookDeliveryStatusChoice,
+    WebhookPayload,
+)
+
+# pg_advisory_xact_lock key held while claiming
+CLAIM_LOCK_ID = 0x67697473617002
+USER_AGENT = "gitsap-webhooks"
+# Seconds between claims while deliveries are in flight
+CLAIM_INTERVAL = 0.2
+# Payload bodies kept by a Deliverer
+PAYLOAD_CACHE_SIZE = 1000
+# Response bytes read, so the connection can be reused; more closes it
+MAX_RESPONSE_SIZE = 64 * 1024
+# Deliveries stored per UPDATE
+RECORD_BATCH_SIZE = 500
+DEFAULT_PORTS = {"http": 80, "https": 443}
+OUTCOME_FIELDS = [
+    "status",
+    "attempts",
+    "next_attempt_at",
+    "locked_by",
+    "locked_until",
+    "response_status",
+    "error",
+    "duration_ms",
+    "delivered_at",
+]
+
+
+class AddressNotAllowed(Exception):
+    pass
+
+
+def is_public_address(address):
+    """Whether address, an IP address string, is routed on the internet."""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve_public(host, port):
+    """
+    An address of host to connect to. Raises AddressNotAllowed when any of
+    them is not public, and OSError when host does not resolve.
+    """
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addresses = [sockaddr[0] for *_, sockaddr in infos]
+    for address in addresses:
+        if not is_public_address(address):
+            raise AddressNotAllowed(
+                f"{host} resolves to {address}, which is not a public address"
+            )
+    return addresses[0]
+
+
+def backoff(attempts):
+    """Seconds to wait after attempts failed attempts, with jitter."""
+    delay = min(
+        settings.WEBHOOK_RETRY_MAX_DELAY,
+        settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def sign(secret, body):
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def _lease():
+    # Long enough for the last of a batch to wait for the others
+    rounds = math.ceil(
+        settings.WEBHOOK_ENDPOINT_BATCH_SIZE / settings.WEBHOOK_ENDPOINT_CONCURRENCY
+    )
+    return timedelta(seconds=settings.WEBHOOK_TIMEOUT * rounds + 30)
+
+
+def claim(owner, limit):
+    """
+    Leases up to limit due deliveries to owner, within the free batch of
+    every webhook no other owner holds deliveries of, taking one of each
+    in turn. Returns them with their webhooks.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CLAIM_LOCK_ID])
+
+        # Held by a lost worker
+        WebhookDelivery.objects.filter(
+            status=WebhookDeliveryStatusChoice.DELIVERING, locked_until__lt=now
+        ).update(
+            status=WebhookDeliveryStatusChoice.PENDING,
+            next_attempt_at=now,
+            locked_until=None,
+            locked_by="",
+        )
+
+        held = {}
+        taken = set()
+        for webhook_id, locked_by, count in (
+            WebhookDelivery.objects.filter(
+                status=WebhookDeliveryStatusChoice.DELIVERING
+            )
+            .values("webhook_id", "locked_by")
+            .annotate(count=Count("id"))
+            .values_list("webhook_id", "locked_by", "count")
+        ):
+            held[webhook_id] = held.get(webhook_id, 0) + count
+            if locked_by != owner:
+                taken.add(webhook_id)
+
+        batch_size = settings.WEBHOOK_ENDPOINT_BATCH_SIZE
+        # Only the deliveries each webhook could take now, oldest first
+        due = (
+            WebhookDelivery.objects.filter(
+                status=WebhookDeliveryStatusChoice.PENDING,
+                next_attempt_at__lte=now,
+                webhook__is_active=True,
+            )
+            .exclude(webhook__circuit_open_until__gt=now)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=[F("webhook_id")],
+                    order_by=[F("next_attempt_at").asc(), F("id").asc()],
+                )
+            )
+            .filter(rank__lte=batch_size)
+            .order_by("rank", "next_attempt_at")
+            .values_list("id", "webhook_id", "webhook__consecutive_failures")
+        )
+
+        picked = []
+        free = {}
+        for delivery_id, webhook_id, failures in due:
+            if len(picked) >= limit:
+                break
+            if webhook_id in taken:
+                continue
+            if webhook_id not in free:
+                # A circuit past its cooldown lets a single probe through
+                slots = batch_size
+                if failures >= settings.WEBHOOK_CIRCUIT_THRESHOLD:
+                    slots = 1
+                free[webhook_id] = slots - held.get(webhook_id, 0)
+            if free[webhook_id] > 0:
+                free[webhook_id] -= 1
+                picked.append(delivery_id)
+
+        WebhookDelivery.objects.filter(id__in=picked).update(
+            status=WebhookDeliveryStatusChoice.DELIVERING,
+            locked_until=now + _lease(),
+            locked_by=owner,
+        )
+    return list(WebhookDelivery.objects.filter(id__in=picked).select_related("webhook"))
+
+
+def _store_outcomes(deliveries):
+    # One UPDATE from a VALUES list: bulk_update() builds a CASE per field
+    # and row, whose compiling costs far more than running it
+    fields = [WebhookDelivery._meta.get_field(name) for name in OUTCOME_FIELDS]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    assignments = ", ".join(
+        f"{quote(field.column)} = outcome.{quote(field.column)}" for field in fields
+    )
+    casts = ", ".join(f"%s::{field.db_type(connection)}" for field in fields)
+    rows = ", ".join([f"(%s, {casts})"] * len(deliveries))
+    params = []
+    for delivery in deliveries:
+        params.append(delivery.pk)
+        params.extend(
+            field.get_db_prep_save(getattr(delivery, field.attname), connection)
+            for field in fields
+        )
+    table = quote(WebhookDelivery._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {assignments} FROM (VALUES {rows}) "
+            f"AS outcome (id, {columns}) WHERE {table}.id = outcome.id",
+            params,
+        )
+
+
+def record(deliveries, webhooks):
+    """
+    Stores the outcome set on each of deliveries, and the failure counts
+    and circuits of webhooks, {id: (consecutive failures, open until)}.
+    """
+    with transaction.atomic():
+        for start in range(0, len(deliveries), RECORD_BATCH_SIZE):
+            _store_outcomes(deliveries[start : start + RECORD_BATCH_SIZE])
+        for webhook_id, (failures, circuit_open_until) in webhooks.items():
+            Webhook.objects.filter(pk=webhook_id).update(
+                consecutive_failures=failures, circuit_open_until=circuit_open_until
+            )
+
+
+def _retry_after(response):
+    """The delay in seconds a Retry-After header asks for, if any."""
+    try:
+        delay = int(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+    return min(max(delay, 0), settings.WEBHOOK_RETRY_MAX_DELAY)
+
+
+class Deliverer:
+    """
+    Outcomes are kept in memory and stored every CLAIM_INTERVAL, in bulk.
+    A Deliverer is the only one holding deliveries of the webhooks it
+    claimed, so it keeps their failure counts and circuits itself too.
+    """
+
+    def __init__(self):
+        self.owner = uuid.uuid4().hex
+        self.clients = {}
+        self.payloads = OrderedDict()
+        # Per webhook: requests at once, failures in a row and until when
+        # its circuit is open
+        self.endpoints = {}
+        self.failures = {}
+        self.paused = {}
+        self.requests = asyncio.Semaphore(settings.WEBHOOK_MAX_IN_FLIGHT)
+        self.stopping = False
+        self.attempted = 0
+        # Outcomes not stored yet, and the webhooks they changed
+        self.finished = []
+        self.changed = set()
+        # The ORM is synchronous: one thread, so one connection, runs it
+        self.database = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="webhooks-db"
+        )
+
+    async def _db(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.database, functools.partial(func, *args))
+
+    def _client(self, url):
+        url = httpx.URL(url)
+        key = (url.scheme, url.host, url.port)
+        client = self.clients.get(key)
+        if client is None:
+            connections = settings.WEBHOOK_HOST_MAX_CONNECTIONS
+            client = self.clients[key] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=connections,
+                    max_keepalive_connections=connections,
+                ),
+                # Waiting for a connection counts against the total timeout
+                timeout=httpx.Timeout(
+                    settings.WEBHOOK_TIMEOUT,
+                    connect=settings.WEBHOOK_CONNECT_TIMEOUT,
+                    pool=None,
+                ),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=False,
+                trust_env=False,
+            )
+        return client
+
+    def _claim(self, limit):
+        """Runs on the database thread: claims and attaches the payloads."""
+        deliveries = claim(self.owner, limit)
+        missing = {d.payload_id for d in deliveries} - self.payloads.keys()
+        for payload_id, event, body in WebhookPayload.objects.filter(
+            id__in=missing
+        ).values_list("id", "event", "body"):
+            self.payloads[payload_id] = (event, bytes(body))
+
+        for delivery in deliveries:
+            self.payloads.move_to_end(delivery.payload_id)
+            delivery.event, delivery.body = self.payloads[delivery.payload_id]
+        while len(self.payloads) > PAYLOAD_CACHE_SIZE:
+            self.payloads.popitem(last=False)
+        return deliveries
+
+    async def _post(self, url, body, headers):
+        """
+        The response status of posting body to url, whether it is a success
+        and the delay its Retry-After asks for.
+        """
+        client = self._client(url)
+        url = httpx.URL(url)
+        extensions = {}
+        if not settings.WEBHOOK_ALLOW_LOCAL_NETWORKS:
+            address = await resolve_public(
+                url.host, url.port or DEFAULT_PORTS[url.scheme]
+            )
+            # Connects to the address checked; the host still names the
+            # receiver in the Host header and to TLS
+            headers = {**headers, "Host": url.netloc.decode("ascii")}
+            if url.scheme == "https":
+                extensions["sni_hostname"] = url.host
+            url = url.copy_with(host=address)
+
+        request = client.stream(
+            "POST", url, content=body, headers=headers, extensions=extensions
+        )
+        async with request as response:
+            size = 0
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+                if size > MAX_RESPONSE_SIZE:
+                    break
+            return response.status_code, response.is_success, _retry_after(response)
+
+    def _release(self, delivery, next_attempt_at):
+        """Gives back a claimed delivery unattempted, due at next_attempt_at."""
+        delivery.status = WebhookDeliveryStatusChoice.PENDING
+        delivery.next_attempt_at = next_attempt_at
+        delivery.locked_by = ""
+        delivery.locked_until = None
+        self.finished.append(delivery)
+
+    def _record(self, delivery, response_status, error, duration_ms, retry_after):
+        """Sets how an attempt went on delivery, and on its webhook."""
+        now = timezone.now()
+        webhook_id = delivery.webhook_id
+        delivery.attempts += 1
+        delivery.response_status = response_status
+        delivery.error = error
+        delivery.duration_ms = duration_ms
+        delivery.locked_by = ""
+        delivery.locked_until = None
+        self.finished.append(delivery)
+        self.changed.add(webhook_id)
+
+        if not error:
+            delivery.status = WebhookDeliveryStatusChoice.SUCCESS
+            delivery.delivered_at = now
+            self.failures[webhook_id] = 0
+            self.paused.pop(webhook_id, None)
+            return
+
+        if delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            delivery.status = WebhookDeliveryStatusChoice.FAILED
+        else:
+            delay = max(backoff(delivery.attempts), retry_after or 0)
+            delivery.status = WebhookDeliveryStatusChoice.PENDING
+            delivery.next_attempt_at = now + timedelta(seconds=delay)
+
+        # Opens the circuit at the threshold, or again after a failed probe
+        failures = self.failures.get(webhook_id, delivery.webhook.consecutive_failures)
+        self.failures[webhook_id] = failures + 1
+        if failures + 1 >= settings.WEBHOOK_CIRCUIT_THRESHOLD:
+            cooldown = timedelta(seconds=settings.WEBHOOK_CIRCUIT_COOLDOWN)
+            self.paused[webhook_id] = now + cooldown
+
+    async def _store(self):
+        if not self.finished:
+            return
+        deliveries, self.finished = self.finished, []
+        webhooks = {
+            webhook_id: (self.failures[webhook_id], self.paused.get(webhook_id))
+            for webhook_id in self.changed
+        }
+        self.changed = set()
+        await self._db(record, deliveries, webhooks)
+
+    async def _deliver(self, delivery):
+        webhook_id = delivery.webhook_id
+        endpoint = self.endpoints.get(webhook_id)
+        if endpoint is None:
+            endpoint = self.endpoints[webhook_id] = asyncio.Semaphore(
+                settings.WEBHOOK_ENDPOINT_CONCURRENCY
+            )
+        async with endpoint:
+            paused_until = self.paused.get(webhook_id)
+            if paused_until is not None and paused_until > timezone.now():
+                return self._release(delivery, paused_until)
+            if self.stopping:
+                return self._release(delivery, timezone.now())
+            async with self.requests:
+                attempt = await self._attempt(delivery.webhook, delivery)
+            self._record(delivery, *attempt)
+
+    async def _attempt(self, webhook, delivery):
+        """Posts delivery. Returns the arguments of record() past it."""
+        headers = {
+            "Content-Type": "application/json",
+            "X-Gitsap-Event": delivery.event,
+            "X-Gitsap-Delivery": delivery.pk,
+        }
+        if webhook.secret:
+            headers["X-Gitsap-Signature-256"] = sign(webhook.secret, delivery.body)
+
+        response_status, error, retry_after = None, "", None
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(settings.WEBHOOK_TIMEOUT):
+                response_status, success, retry_after = await self._post(
+                    webhook.url, delivery.body, headers
+                )
+            if not success:
+                error = f"HTTP {response_status}"
+        except TimeoutError:
+            error = f"Timed out after {settings.WEBHOOK_TIMEOUT}s"
+        except (httpx.HTTPError, httpx.InvalidURL, AddressNotAllowed, OSError) as exc:
+            error = str(exc) or type(exc).__name__
+        self.attempted += 1
+        duration_ms = int((time.monotonic() - started) * 1000)
+        return response_status, error, duration_ms, retry_after
+
+    async def run(self, duration):
+        """
+        Delivers what is due for up to duration seconds, then waits for the
+        requests in flight and gives back the deliveries not yet attempted.
+        Returns the number of attempts made.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + duration
+        claimed = set()
+        try:
+            while True:
+                await self._store()
+                free = settings.WEBHOOK_MAX_CLAIMED - len(claimed)
+                if free > 0 and loop.time() < deadline:
+                    for delivery in await self._db(self._claim, free):
+                        claimed.add(asyncio.create_task(self._deliver(delivery)))
+                elif loop.time() >= deadline:
+                    self.stopping = True
+                if not claimed:
+                    break
+                done, claimed = await asyncio.wait(claimed, timeout=CLAIM_INTERVAL)
+                for task in done:
+                    task.result()
+        finally:
+            for task in claimed:
+                task.cancel()
+            await self._store()
+            for client in self.clients.values():
+                await client.aclose()
+            # The connection of the database thread goes with it
+            await self._db(connections.close_all)
+            self.database.shutdown()
+        return self.attempted
@@ -0,0 +1,58 @@
+"""
+Webhook events. Each event is serialized once into a WebhookPayload, and
+gets one pending WebhookDelivery per active webhook of its project.
+"""
+
+import json
+
+from gitsap.models import Repository, Webhook, WebhookDelivery, WebhookPayload
+
+
+def queue_event(project, event, bodies, webhooks=None):
+    """
+    Queues the events of kind event with each of bodies for every active
+    webhook of project, or of webhooks. Returns the number of deliveries
+    queued.
+    """
+    if webhooks is None:
+        webhooks = Webhook.objects.filter(project=project)
+    webhook_ids = list(webhooks.filter(is_active=True).values_list("id", flat=True))
+    if not webhook_ids:
+        return 0
+
+    payloads = WebhookPayload.objects.bulk_create(
+        [
+            WebhookPayload(
+                project=project,
+                event=event,
+                body=json.dumps(body, separators=(",", ":")).encode(),
+            )
+            for body in bodies
+        ]
+    )
+    deliveries = WebhookDelivery.objects.bulk_create(
+        [
+            WebhookDelivery(webhook_id=webhook_id, payload=payload)
+            for payload in payloads
+            for webhook_id in webhook_ids
+        ]
+    )
+    return len(deliveries)
+
+
+def queue_push(repository, updates):
+    """A push event per ref the push updated."""
+    project = repository.project
+    bodies = [
+        {
+            "event": "push",
+            "project": {"id": project.pk, "namespace": project.namespace},
+            "ref": ref_name,
+            "before": old,
+            "after": new,
+            "created": old == Repository.ZERO_OID,
+            "deleted": new == Repository.ZERO_OID,
+        }
+        for old, new, ref_name in updates
+    ]
+    return queue_event(project, "push", bodies)